@@ -0,0 +1,140 @@
+# account_service.py
+"""
+Inicio de sesión y gestión de usuarios, sin Streamlit.
+
+sign_in retorna el RequestContext de la sesión; auth y user_service son los
+adaptadores de Streamlit (guardan el contexto en st.session_state y muestran
+los errores). Ver request_context.py.
+"""
+from request_context import AlreadyExists, InvalidCredentials, RateLimited, RequestContext, ServiceError
+from storage import StorageError, get_backend
+
+USER_SELECT = "id,username,email,phone_number,roles(role_name),branches(name)"
+USER_COLUMNS = ['id', 'username', 'email', 'role_name', 'branch_name', 'phone_number']
+PROFILE_PAGE = 1000  # max-rows por defecto de PostgREST en Supabase
+
+
+def sign_in(email: str, password: str) -> RequestContext:
+    """Autentica con el backend configurado y carga el perfil (rol y sucursal)."""
+    backend = get_backend()
+    try:
+        auth_data = backend.sign_in(email, password)
+        token = auth_data['access_token']
+        user_id = auth_data['user']['id']
+        profile_data, _ = backend.select('profiles', '*,roles(role_name)', [('id', f"eq.{user_id}")], token=token)
+    except StorageError as err:
+        if err.status == 400:
+            raise InvalidCredentials("Credenciales inválidas. Revise su email y contraseña.") from err
+        raise ServiceError(f"Error de conexión o autenticación: {err}") from err
+
+    if not profile_data:
+        raise ServiceError("Su cuenta no tiene un perfil asignado. Contacte al administrador.")
+    profile = profile_data[0]
+    return RequestContext(
+        token=token,
+        user_id=user_id,
+        role=profile['roles']['role_name'],
+        branch_id=profile['branch_id'],
+        username=profile['username'],
+        email=auth_data['user'].get('email', email),
+    )
+
+
+def flatten_user(row: dict) -> dict:
+    """Fila de profiles con los embeds de rol y sucursal aplanados (columnas USER_COLUMNS)."""
+    roles, branches = row.get('roles'), row.get('branches')
+    return {
+        'id': row['id'],
+        'username': row.get('username'),
+        'email': row.get('email'),
+        'role_name': roles['role_name'] if isinstance(roles, dict) and roles else None,
+        'branch_name': branches['name'] if isinstance(branches, dict) and branches else 'N/A',
+        'phone_number': row.get('phone_number'),
+    }
+
+
+def list_users(ctx: RequestContext):
+    """Todos los usuarios con su rol y sucursal."""
+    try:
+        data, _ = get_backend().select('profiles', USER_SELECT, token=ctx.token, cache=True)
+    except Exception as e:
+        raise ServiceError(f"Error al obtener usuarios. Asegúrese de tener el perfil Admin configurado. Error: {e}") from e
+    return [flatten_user(row) for row in data]
+
+
+def create_user(ctx: RequestContext, email: str, username: str, password: str, role_id: int,
+                branch_id: int = None, phone_number: str = None) -> str:
+    """Registra el usuario en Auth con la contraseña indicada y crea su perfil; retorna el ID."""
+    ctx.require_auth()
+    try:
+        # 1. Registrar usuario en Auth (en Supabase, /signup usa la clave anónima)
+        user_id = get_backend().sign_up(email, password).get('id')
+        if not user_id:
+            raise ServiceError("Error inesperado al crear usuario: no se pudo obtener el ID del usuario recién creado.")
+
+        # 2. Crear el perfil en 'profiles' con el token del Admin
+        get_backend().insert('profiles', [{
+            'id': user_id,
+            'email': email,
+            'username': username,
+            'role_id': role_id,
+            'branch_id': branch_id,
+        }], token=ctx.token)
+        return user_id
+    except StorageError as err:
+        if 'email address is already taken' in err.message or 'already registered' in err.message:
+            raise AlreadyExists("Error: Este correo electrónico ya está registrado.") from err
+        raise ServiceError(f"Error al crear usuario: {err.message}") from err
+
+
+def profile_emails(ctx: RequestContext) -> set:
+    """
+    Correos con perfil, en minúsculas. Se leen todos (la tabla es chica) para
+    compararlos sin distinguir mayúsculas: un filtro in.(...) sí las distingue.
+    """
+    ctx.require_auth()
+    emails, offset = set(), 0
+    try:
+        while True:
+            rows, _ = get_backend().select('profiles', 'email', order='id.asc', limit=PROFILE_PAGE, offset=offset,
+                                           token=ctx.token)
+            emails.update(row['email'].lower() for row in rows if row.get('email'))
+            if len(rows) < PROFILE_PAGE:
+                return emails
+            offset += PROFILE_PAGE
+    except StorageError as err:
+        raise ServiceError(f"Error al consultar los perfiles existentes: {err.message}") from err
+
+
+def sign_up_or_resume(email: str, password: str, throttle=None):
+    """
+    Registra el usuario en Auth y retorna (user_id, reanudado). Si el correo ya estaba
+    registrado (un alta anterior falló antes de crear el perfil), recupera el ID iniciando
+    sesión con la misma contraseña. `throttle()` se llama antes de cada petición a Auth.
+    Lanza AlreadyExists si el correo tiene otra contraseña y RateLimited ante un 429 persistente.
+    """
+    backend = get_backend()
+    throttle = throttle or (lambda: None)
+    try:
+        throttle()
+        try:
+            user_id = backend.sign_up(email, password).get('id')
+        except StorageError as err:
+            if 'already' not in err.message.lower():
+                raise
+        else:
+            if not user_id:
+                raise ServiceError("Auth no retornó el ID del usuario.")
+            return user_id, False
+
+        throttle()
+        try:
+            return backend.sign_in(email, password)['user']['id'], True
+        except StorageError as err:
+            if err.status == 400:
+                raise AlreadyExists("El correo ya está registrado con otra contraseña.") from err
+            raise
+    except StorageError as err:
+        if err.status == 429:
+            raise RateLimited(f"Límite de peticiones de Auth: {err.message}") from err
+        raise ServiceError(err.message) from err
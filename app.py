@@ -1,20 +1,12 @@
 # app.py (VERSIÓN CONSOLIDADA Y CORREGIDA FINAL)
 import streamlit as st
 import auth 
-import db_service
-import user_service
-import requests # Cliente HTTP para interactuar con la API de Supabase
-
-# --- Imports para la funcionalidad de QR/PDF ---
-import qrcode 
-from PIL import Image, ImageDraw, ImageFont 
-import uuid
 import os
-from datetime import datetime, timedelta
-import pandas as pd
-from pyzbar.pyzbar import decode
-from fpdf import FPDF 
-from db_config import get_headers 
+import rerun_profiler
+
+# Los módulos pesados (db_service/user_service con requests y pandas, card_render
+# con qrcode/PIL/fpdf) se importan dentro de la página que los usa: un proceso que
+# solo atiende el Dashboard o el enlace del escáner nunca los carga.
 
 # --- CONFIGURACIÓN DE LA PÁGINA ---
 st.set_page_config(page_title="Sistema de QR Novillo Alegre", layout="wide")
@@ -30,112 +22,6 @@ TEMPLATE_PATH_KEY = 'current_template_path'
 if TEMPLATE_PATH_KEY not in st.session_state:
     st.session_state[TEMPLATE_PATH_KEY] = None
 
-# 9cm x 5cm en mm = 90mm x 50mm
-CARD_WIDTH_MM = 90
-CARD_HEIGHT_MM = 50
-QR_SIZE_MM = 25 
-
-
-# ----------------------------------------
-# FUNCIONES AUXILIARES (QR y PDF)
-# ----------------------------------------
-
-def create_qr_card(data_to_encode: str, output_path: str, description: str, expiration: str, consecutive: str):
-    """
-    Genera una imagen de tarjeta (9cm ANCHO x 5cm ALTO @ 300DPI) con el QR y el consecutivo.
-    (Basado en la versión original que dibujaba el QR, solo se ajusta el lienzo.)
-    """
-    if not os.path.exists('generated_qrs'):
-        os.makedirs('generated_qrs')
-        
-    # CORRECCIÓN FINAL DE DIMENSIONES: 9cm ANCHO (1063px) x 5cm ALTO (591px)
-    # Al ser el ANCHO mayor que el ALTO, se respeta la orientación horizontal 5x9 cm.
-    card_width, card_height = 1063, 591 
-    bg_color, text_color = (255, 255, 255), (0, 0, 0)
-    
-    # 1. INICIALIZACIÓN DEL LIENZO Y DRAW
-    card_img = Image.new('RGB', (card_width, card_height), bg_color)
-    draw = ImageDraw.Draw(card_img) 
-
-    # 2. CONFIGURACIÓN DE FUENTES Y DIBUJO DE ENCABEZADO
-    draw.rectangle([0, 0, card_width, 80], fill=(191, 2, 2))
-    
-    try:
-        title_font = ImageFont.truetype("arialbd.ttf", size=32)
-        main_font = ImageFont.truetype("arial.ttf", size=30)
-        consecutive_font = ImageFont.truetype("arialbd.ttf", size=40)
-    except IOError:
-        default_font = ImageFont.load_default()
-        title_font = default_font 
-        main_font = default_font
-        consecutive_font = default_font
-        
-    draw.text((30, 25), "TARJETA DE REGALO NOVILLO ALEGRE", fill=(255,255,255), font=title_font)
-
-    # 3. GENERACIÓN DEL QR
-    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=8, border=2)
-    qr.add_data(data_to_encode)
-    qr.make(fit=True)
-    # Importante: Aseguramos el color negro para el relleno
-    qr_img = qr.make_image(fill_color="black", back_color="white").convert('RGB')
-    
-    # 4. POSICIONES Y DIBUJO DE CONTENIDO
-    QR_SIZE_PIXELS = 250
-    
-    # Posiciones basadas en el código que funcionaba, ajustadas al lienzo 1063x591
-    QR_POSITION = (763, 130)       
-    CONSECUTIVE_POSITION = (50, 450)
-    EXPIRATION_POSITION = (50, 220) 
-    
-    # Dibujar Promoción
-    draw.text((50, 150), description, fill=text_color, font=main_font)
-    
-    # Dibujar Válido hasta
-    draw.text(EXPIRATION_POSITION, f"Válido hasta: {expiration}", fill=(100, 100, 100), font=main_font)
-
-    # Dibujar Consecutivo
-    draw.text(CONSECUTIVE_POSITION, f"CONSECUTIVO: {consecutive}", fill=(0, 0, 0), font=consecutive_font)
-
-    # 5. PEGAR EL QR (Lógica del código original)
-    qr_scaled = qr_img.resize((QR_SIZE_PIXELS, QR_SIZE_PIXELS))
-    card_img.paste(qr_scaled, QR_POSITION)
-    
-    card_img.save(output_path)
-    return output_path
-    
-def generate_pdf_from_images(image_paths, output_filename):
-    """Crea un PDF a partir de una lista de imágenes en formato 9x5 cm."""
-    pdf = FPDF(orientation='L', unit='mm', format=(CARD_WIDTH_MM, CARD_HEIGHT_MM))
-    
-    for image_path in image_paths:
-        pdf.add_page()
-        pdf.image(image_path, x=0, y=0, w=CARD_WIDTH_MM, h=CARD_HEIGHT_MM) 
-        
-    pdf.output(output_filename)
-    return output_filename
-
-def generate_design_template(output_filename):
-    """Genera una plantilla de PDF con espacio blanco para el arte, QR y consecutivo (9x5 cm)."""
-    pdf = FPDF(orientation='L', unit='mm', format=(CARD_WIDTH_MM, CARD_HEIGHT_MM))
-    pdf.add_page()
-    
-    pdf.set_font("Arial", "B", 8)
-    pdf.cell(CARD_WIDTH_MM, 5, "PLANTILLA DE DISEÑO (9x5 CM)", 0, 1, 'C')
-    
-    QR_POS_X_MM = 65 
-    QR_POS_Y_MM = 15 
-    
-    pdf.set_fill_color(255, 255, 255)
-    pdf.rect(QR_POS_X_MM, QR_POS_Y_MM, QR_SIZE_MM, QR_SIZE_MM, 'F') 
-    
-    pdf.set_text_color(150, 150, 150)
-    pdf.set_font("Arial", "", 6)
-    pdf.set_xy(QR_POS_X_MM, QR_POS_Y_MM + 1)
-    pdf.multi_cell(QR_SIZE_MM, 2.5, "ESPACIO QR\n2.5x2.5 cm", 0, 'C')
-    
-    pdf.output(output_filename)
-
-
 # ----------------------------------------
 # LÓGICA DE INICIALIZACIÓN Y CONTROL DE ACCESO
 # ----------------------------------------
@@ -180,7 +66,7 @@ with st.sidebar:
         menu_options = ["🏠 Dashboard"]
         
         if user_role == 'Admin':
-            menu_options.extend(["🔑 Gestión de Usuarios (Admin)", "⚙️ Configuración (Admin)", "📊 Reportes (Admin)"])
+            menu_options.extend(["🔑 Gestión de Usuarios (Admin)", "⚙️ Configuración (Admin)", "📦 Lotes (Admin)", "📊 Reportes (Admin)", "🗃️ Cola de Escritura (Admin)", "🩺 Diagnóstico (Admin)"])
         
         if user_role in ['Admin', 'Creator']:
             menu_options.append("🛠️ Creador de QRs")
@@ -203,222 +89,324 @@ with st.sidebar:
 # RENDERIZACIÓN DE MÓDULOS
 # ----------------------------------------
 
-if app_mode == "🏠 Dashboard":
-    st.header("Bienvenido al Sistema Novillo Alegre")
-    st.info(f"Su rol actual es **{user_role}**. Utilice el menú de la izquierda para navegar.")
+# El perfilador (rerun_profiler) solo actúa si un Admin lo activó en 🩺 Diagnóstico.
+with rerun_profiler.profile(app_mode):
+    if app_mode == "🏠 Dashboard":
+        st.header("Bienvenido al Sistema Novillo Alegre")
+        st.info(f"Su rol actual es **{user_role}**. Utilice el menú de la izquierda para navegar.")
+
+    elif app_mode == "🔑 Gestión de Usuarios (Admin)":
+        import user_service
+        user_service.render_user_management() 
 
-elif app_mode == "🔑 Gestión de Usuarios (Admin)":
-    user_service.render_user_management() 
+    elif app_mode == "⚙️ Configuración (Admin)":
+        import db_service
+        db_service.render_config_management()
 
-elif app_mode == "⚙️ Configuración (Admin)":
-    db_service.render_config_management()
+    elif app_mode == "📦 Lotes (Admin)":
+        import db_service
+        db_service.render_batch_management()
+
+    elif app_mode == "🗃️ Cola de Escritura (Admin)":
+        import write_outbox
+        write_outbox.render_outbox_page()
+
+    elif app_mode == "🩺 Diagnóstico (Admin)":
+        import memory_budget
+        rerun_profiler.render_diagnostics_page()
+        memory_budget.render_memory_section()
     
-# --- MÓDULO CREADOR DE QRS (MIGRADO A SUPABASE) ---
+    # --- MÓDULO CREADOR DE QRS (MIGRADO A SUPABASE) ---
 
-elif app_mode == "🛠️ Creador de QRs":
+    elif app_mode == "🛠️ Creador de QRs":
+        import db_service
+        import qr_signing
+        from card_render import (DEFAULT_EXPORT_PROFILE, EXPORT_PROFILES, card_filename, create_qr_card,
+                                 generate_design_template, generate_pdf_from_images)
     
-    promos = db_service.get_promos()
-    branches = db_service.get_branches()
-    issuers = db_service.get_issuers()
+        promos = db_service.get_promos()
+        branches = db_service.get_branches()
+        issuers = db_service.get_issuers()
 
-    promo_options = {p['type_name']: p for p in promos}
-    branch_options = [b['name'] for b in branches]
-    issuer_options = {i['issuer_name']: i['id'] for i in issuers}
+        promo_options = {p['type_name']: p for p in promos}
+        branch_options = [b['name'] for b in branches]
+        issuer_options = {i['issuer_name']: i['id'] for i in issuers}
     
-    # --- Interfaz de Pestañas ---
-    tab_creator, tab_template = st.tabs(["Generador de Lote", "Gestión de Plantilla"])
+        # --- Interfaz de Pestañas ---
+        tab_creator, tab_instant, tab_template = st.tabs(["Generador de Lote", "⚡ Emisión Inmediata", "Gestión de Plantilla"])
     
-    with tab_creator:
-        st.header("Módulo de Creación de Tarjetas QR")
+        with tab_creator:
+            st.header("Módulo de Creación de Tarjetas QR")
         
-        with st.form("qr_creator_form"):
-            st.subheader("Configuración de la Tarjeta")
+            with st.form("qr_creator_form"):
+                st.subheader("Configuración de la Tarjeta")
             
-            col1, col2 = st.columns(2)
-            with col1:
-                selected_promo_name = st.selectbox("Seleccionar Promoción/Diseño", options=list(promo_options.keys()))
-                selected_promo = promo_options.get(selected_promo_name)
+                col1, col2 = st.columns(2)
+                with col1:
+                    selected_promo_name = st.selectbox("Seleccionar Promoción/Diseño", options=list(promo_options.keys()))
+                    selected_promo = promo_options.get(selected_promo_name)
                 
-                st.caption(f"Descripción: {selected_promo['description']}")
-                value_crc = st.number_input("Valor de Referencia (Colones)", value=selected_promo['value'], min_value=0.0, format="%.2f")
-                value_usd = st.number_input("Valor de Referencia (Dólares)", value=round(selected_promo['value'] / 590, 2), min_value=0.0, format="%.2f")
+                    st.caption(f"Descripción: {selected_promo['description']}")
+                    value_crc = st.number_input("Valor de Referencia (Colones)", value=selected_promo['value'], min_value=0.0, format="%.2f")
+                    value_usd = st.number_input("Valor de Referencia (Dólares)", value=round(selected_promo['value'] / 590, 2), min_value=0.0, format="%.2f")
             
-            with col2:
-                valid_days = st.number_input("Días de vigencia", min_value=1, max_value=365, value=30)
-                allowed_branches = st.multiselect("Sucursales permitidas (dejar vacío para todas)", options=branch_options)
-                selected_issuer_name = st.selectbox("Emisor/Campaña", options=list(issuer_options.keys()))
-                count = st.number_input("Cantidad de tarjetas a generar (lote)", min_value=1, max_value=100, value=1)
+                with col2:
+                    valid_days = st.number_input("Días de vigencia", min_value=1, max_value=365, value=30)
+                    allowed_branches = st.multiselect("Sucursales permitidas (dejar vacío para todas)", options=branch_options)
+                    selected_issuer_name = st.selectbox("Emisor/Campaña", options=list(issuer_options.keys()))
+                    count = st.number_input("Cantidad de tarjetas a generar (lote)", min_value=1, max_value=100, value=1)
+                    export_profile = st.selectbox(
+                        "Perfil de exportación", options=list(EXPORT_PROFILES.keys()),
+                        index=list(EXPORT_PROFILES.keys()).index(DEFAULT_EXPORT_PROFILE),
+                        format_func=lambda key: EXPORT_PROFILES[key]['label'],
+                    )
+                    sign_qrs = False
+                    if qr_signing.signing_enabled():
+                        sign_qrs = st.checkbox("Firmar QRs (validación sin conexión de autenticidad y vigencia)", value=True)
                 
-            submitted = st.form_submit_button("🚀 Generar Tarjetas", type="primary")
+                submitted = st.form_submit_button("🚀 Generar Tarjetas", type="primary")
 
-        if submitted:
-            issuer_id = issuer_options.get(selected_issuer_name)
-            user_id = st.session_state.get('user_id')
+            if submitted:
+                issuer_id = issuer_options.get(selected_issuer_name)
+                user_id = st.session_state.get('user_id')
             
-            if not selected_promo or not issuer_id or not user_id:
-                st.error("Faltan datos de configuración (Promoción o Emisor).")
-            else:
-                st.success(f"Generando {count} tarjeta(s)...")
+                if not selected_promo or not issuer_id or not user_id:
+                    st.error("Faltan datos de configuración (Promoción o Emisor).")
+                else:
+                    st.success(f"Generando {count} tarjeta(s)...")
                 
-                coupon_entries = db_service.create_coupon_batch(
-                    count=count,
-                    description=selected_promo['description'],
-                    promo_id=selected_promo['id'],
-                    value_crc=value_crc,
-                    value_usd=value_usd,
-                    issuer_id=issuer_id,
-                    valid_days=valid_days,
-                    branch_names=allowed_branches,
-                    user_id=user_id,
-                    batch_name_prefix=selected_promo_name
-                )
+                    coupon_entries = db_service.create_coupon_batch(
+                        count=count,
+                        description=selected_promo['description'],
+                        promo_id=selected_promo['id'],
+                        value_crc=value_crc,
+                        value_usd=value_usd,
+                        issuer_id=issuer_id,
+                        valid_days=valid_days,
+                        branch_names=allowed_branches,
+                        user_id=user_id,
+                        batch_name_prefix=selected_promo_name,
+                        signed=sign_qrs
+                    )
                 
-                if coupon_entries:
-                    st.balloons()
-                    generated_image_paths = []
+                    if coupon_entries:
+                        st.balloons()
+                        generated_image_paths = []
                     
-                    for entry in coupon_entries:
-                        unique_id = entry['id']
-                        consecutive = str(entry['consecutive']).zfill(4) 
-                        expiration = entry['expiration_date']
+                        for entry in coupon_entries:
+                            unique_id = entry['id']
+                            consecutive = str(entry['consecutive']).zfill(4) 
+                            expiration = entry['expiration_date']
                         
-                        output_path = os.path.join('generated_qrs', f"{unique_id}.png")
+                            output_path = os.path.join('generated_qrs', card_filename(unique_id, export_profile))
                         
-                        # LLAMADA CORREGIDA CON 5 ARGUMENTOS
-                        create_qr_card(unique_id, output_path, selected_promo['description'], expiration, consecutive)
-                        generated_image_paths.append(output_path)
+                            # El QR lleva el payload firmado o el código compacto (alfanumérico, versión fija)
+                            qr_data = entry.get('qr_payload') or entry['code']
+                            create_qr_card(qr_data, output_path, selected_promo['description'], expiration, consecutive, export_profile)
+                            generated_image_paths.append(output_path)
                         
-                    # Sección de Descarga de Lote PDF
-                    st.subheader("⬇️ Descargar Lote Completo")
-                    pdf_path = generate_pdf_from_images(generated_image_paths, f"lote_tarjetas_{coupon_entries[0]['batch_id']}.pdf")
+                        # Sección de Descarga de Lote PDF
+                        st.subheader("⬇️ Descargar Lote Completo")
+                        pdf_path = generate_pdf_from_images(generated_image_paths, f"lote_tarjetas_{coupon_entries[0]['batch_id']}.pdf", export_profile)
 
-                    with open(pdf_path, "rb") as pdf_file:
+                        # El PDF se lee del disco al descargarlo: no queda en la memoria de la sesión
+                        import memory_budget
                         st.download_button(
                             label="Descargar PDF con todas las tarjetas",
-                            data=pdf_file,
+                            data=memory_budget.file_data(pdf_path),
                             file_name=os.path.basename(pdf_path),
                             mime="application/pdf"
                         )
 
-    # ----------------------------------------
-    # GESTIÓN Y DESCARGA DE PLANTILLAS DE DISEÑO
-    # ----------------------------------------
-    with tab_template:
-        st.header("Gestión de Plantilla para Arte y Diseño")
+        # ----------------------------------------
+        # EMISIÓN INMEDIATA DESDE LA RESERVA
+        # ----------------------------------------
+        with tab_instant:
+            import warm_pool
+            warm_pool.render_instant_issue_tab(promos, issuers, branch_options)
+
+        # ----------------------------------------
+        # GESTIÓN Y DESCARGA DE PLANTILLAS DE DISEÑO
+        # ----------------------------------------
+        with tab_template:
+            st.header("Gestión de Plantilla para Arte y Diseño")
         
-        # 1. DESCARGA DE LA GUÍA DE ESPACIOS
-        st.subheader("1. Guía de Espacios (Para el Diseñador)")
-        st.markdown("Use esta guía para crear su arte y dejar el espacio libre para el QR y el consecutivo.")
+            # 1. DESCARGA DE LA GUÍA DE ESPACIOS
+            st.subheader("1. Guía de Espacios (Para el Diseñador)")
+            st.markdown("Use esta guía para crear su arte y dejar el espacio libre para el QR y el consecutivo.")
         
-        BLANK_PDF_PATH = os.path.join(TEMPLATE_DIR, "plantilla_guia_9x5.pdf")
-        if st.button("Descargar Guía PDF (9x5 cm)", key="download_guide"):
-            generate_design_template(BLANK_PDF_PATH)
-            with open(BLANK_PDF_PATH, "rb") as pdf_file:
-                st.download_button(
-                    label="Descargar Guía de Diseño (PDF)",
-                    data=pdf_file,
-                    file_name=BLANK_PDF_PATH,
-                    mime="application/pdf"
-                )
-    
-        st.markdown("---")
+            BLANK_PDF_PATH = os.path.join(TEMPLATE_DIR, "plantilla_guia_9x5.pdf")
+            if st.button("Descargar Guía PDF (9x5 cm)", key="download_guide"):
+                generate_design_template(BLANK_PDF_PATH)
+                with open(BLANK_PDF_PATH, "rb") as pdf_file:
+                    st.download_button(
+                        label="Descargar Guía de Diseño (PDF)",
+                        data=pdf_file,
+                        file_name=BLANK_PDF_PATH,
+                        mime="application/pdf"
+                    )
+    
+            st.markdown("---")
         
-        # 2. CARGA DE LA PLANTILLA DE ARTE (PDF)
-        st.subheader("2. Subir Plantilla de Arte (PDF Terminado)")
+            # 2. CARGA DE LA PLANTILLA DE ARTE (PDF)
+            st.subheader("2. Subir Plantilla de Arte (PDF Terminado)")
         
-        uploaded_file = st.file_uploader(
-            "Suba el PDF de Diseño (Arte Terminado, 9x5cm) para usar como fondo", 
-            type="pdf", 
-            key="template_uploader"
-        )
+            uploaded_file = st.file_uploader(
+                "Suba el PDF de Diseño (Arte Terminado, 9x5cm) para usar como fondo", 
+                type="pdf", 
+                key="template_uploader"
+            )
         
-        if uploaded_file is not None:
-            template_filename = "plantilla_arte_activa.pdf"
-            save_path = os.path.join(TEMPLATE_DIR, template_filename)
+            if uploaded_file is not None:
+                template_filename = "plantilla_arte_activa.pdf"
+                save_path = os.path.join(TEMPLATE_DIR, template_filename)
             
-            with open(save_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
+                with open(save_path, "wb") as f:
+                    f.write(uploaded_file.getbuffer())
             
-            st.session_state[TEMPLATE_PATH_KEY] = save_path
-            st.success(f"Plantilla de Arte cargada exitosamente: {uploaded_file.name}")
+                st.session_state[TEMPLATE_PATH_KEY] = save_path
+                st.success(f"Plantilla de Arte cargada exitosamente: {uploaded_file.name}")
             
-        if st.session_state[TEMPLATE_PATH_KEY]:
-            st.info(f"🎨 **Plantilla Actual:** {os.path.basename(st.session_state[TEMPLATE_PATH_KEY])} (Lista para usar en el Generador de Lote).")
-        else:
-            st.warning("No hay ninguna plantilla de diseño cargada actualmente. Se usará fondo blanco.")
+            if st.session_state[TEMPLATE_PATH_KEY]:
+                st.info(f"🎨 **Plantilla Actual:** {os.path.basename(st.session_state[TEMPLATE_PATH_KEY])} (Lista para usar en el Generador de Lote).")
+            else:
+                st.warning("No hay ninguna plantilla de diseño cargada actualmente. Se usará fondo blanco.")
 
 
 
-elif app_mode == "📲 Escáner (Cajero)":
-    # Usar el módulo de HTML/PWA
-    st.warning("Módulo de escáner migrado a PWA. Presione el botón para abrir la aplicación de canje móvil.")
+    elif app_mode == "📲 Escáner (Cajero)":
+        # Usar el módulo de HTML/PWA
+        st.warning("Módulo de escáner migrado a PWA. Presione el botón para abrir la aplicación de canje móvil.")
     
-    st.info("Debe configurar la URL del escáner PWA en la sección de código.")
+        st.info("Debe configurar la URL del escáner PWA en la sección de código.")
     
-    # URL de ejemplo (DEBE SER CAMBIADA POR TU URL ALOJADA)
-    PWA_BASE_URL = "https://tudominio.com/scanner.html" 
-    st.link_button("Abrir Escáner de Canje", url=PWA_BASE_URL, type="primary")
+        # URL de ejemplo (DEBE SER CAMBIADA POR TU URL ALOJADA)
+        PWA_BASE_URL = "https://tudominio.com/scanner.html" 
+        st.link_button("Abrir Escáner de Canje", url=PWA_BASE_URL, type="primary")
 
+        # Respaldo sin la PWA: validar una tarjeta desde una foto (el canje sigue en la PWA)
+        st.subheader("📷 Validar desde una foto")
+        photo = st.file_uploader("Foto de la tarjeta", type=["jpg", "jpeg", "png", "webp"], key="scan_photo")
+        if photo:
+            import db_service
+            import qr_decoder
 
-elif app_mode == "📊 Reportes (Admin)":
-    
-    if user_role != 'Admin':
-        st.error("Acceso denegado. Solo administradores pueden ver reportes.")
-        st.stop()
+            result = qr_decoder.decode(photo.getvalue())
+            if result is None:
+                st.error("No se pudo leer el QR. Intente con una foto más cercana, enfocada y con buena luz.")
+            else:
+                coupon, message = db_service.get_coupon_for_scan(result.text)
+                if coupon is None:
+                    st.error(message)
+                else:
+                    status = db_service.coupon_status(coupon)
+                    allowed = coupon.get('branch_permissions') or []
+                    st.metric("Estado", db_service.STATUS_LABELS.get(status, status))
+                    st.write(f"**Consecutivo:** {str(coupon['consecutive']).zfill(4)} · "
+                             f"**Válido hasta:** {str(coupon['expiration_date'])[:10]}")
+                    if allowed and st.session_state.get('branch_id') not in allowed:
+                        st.error("La tarjeta no es válida en esta sucursal.")
+                    elif status == 'active':
+                        st.success("Tarjeta válida. Registre el canje en el escáner PWA.")
+                    else:
+                        st.warning(f"La tarjeta no se puede canjear: {db_service.STATUS_LABELS.get(status, status)}.")
+                st.caption(f"Leído en {result.elapsed_ms:.0f} ms (etapa: {result.stage}).")
+
+
+    elif app_mode == "📊 Reportes (Admin)":
+    
+        if user_role != 'Admin':
+            st.error("Acceso denegado. Solo administradores pueden ver reportes.")
+            st.stop()
         
-    st.header("Módulo de Reportes de Actividad")
-    
-    st.sidebar.header("Filtros de Reporte")
-    
-    # --- OBTENER DATOS DE SUPABASE ---
-    branches = db_service.get_branches()
-    branch_names = [b['name'] for b in branches]
-    
-    selected_status = st.sidebar.selectbox("Estado", ["Todos", "Canjeados", "No Canjeados"])
-    start_date = st.sidebar.date_input("Fecha de creación (desde)", value=None)
-    end_date = st.sidebar.date_input("Fecha de creación (hasta)", value=None)
-
-    # Lógica para construir el filtro de PostgREST
-    filters = []
-    if selected_status == "Canjeados":
-        filters.append("is_redeemed=eq.true")
-    elif selected_status == "No Canjeados":
-        filters.append("is_redeemed=eq.false")
+        import coupon_archiver
+        import db_service
+        import expiration_sweeper
+        import pandas as pd
+
+        st.header("Módulo de Reportes de Actividad")
+
+        # Marca los vencidos antes de filtrar por estado (como mucho una vez por intervalo)
+        try:
+            expiration_sweeper.maybe_sweep(st.session_state.get('token'))
+        except Exception as e:
+            st.warning(f"No se pudo ejecutar el barrido de vencidos: {e}")
+        # Mueve al archivo los canjeados y vencidos de hace tiempo, en segundo plano
+        coupon_archiver.maybe_archive(st.session_state.get('token'))
+
+        with st.expander("🔎 Búsqueda rápida de cupón", expanded=True):
+            db_service.render_coupon_lookup()
+    
+        st.sidebar.header("Filtros de Reporte")
+    
+        # --- OBTENER DATOS DE SUPABASE ---
+        branches = db_service.get_branches()
+        branch_names = [b['name'] for b in branches]
+    
+        selected_status = st.sidebar.selectbox("Estado", ["Todos", "Activos", "Canjeados", "No Canjeados", "Expirados", "Anulados"])
+        start_date = st.sidebar.date_input("Fecha de creación (desde)", value=None)
+        end_date = st.sidebar.date_input("Fecha de creación (hasta)", value=None)
+
+        # Lógica para construir el filtro de PostgREST
+        # Igualdad sobre la columna status (indexada), sin comparar fechas
+        status_filters = {
+            "Activos": "status=eq.active",
+            "Canjeados": "status=eq.redeemed",
+            "No Canjeados": "status=neq.redeemed",
+            "Expirados": "status=eq.expired",
+            "Anulados": "status=eq.void",
+        }
+        filters = []
+        if selected_status in status_filters:
+            filters.append(status_filters[selected_status])
         
-    if start_date:
-        filters.append(f"creation_date=gte.{start_date}")
-    if end_date:
-        filters.append(f"creation_date=lte.{end_date}")
-    
-    df = pd.DataFrame() 
-    
-    filter_string = "&".join(filters)
-    
-    # LLAMADA MIGRADA A SUPABASE
-    report_data = db_service.get_activity_report(filter_string)
-    
-    # Reasignar 'df' solo si los datos son válidos
-    df = pd.DataFrame() 
-    
-    # Si report_data es un DataFrame válido (no None y no está vacío), lo asignamos a df.
-    if isinstance(report_data, pd.DataFrame) and not report_data.empty:
-        df = report_data
-    
-    st.subheader("Datos Completos")
-    st.dataframe(df, width='stretch')
-
-    # Métricas
-    if not df.empty:
-        # Aseguramos que la columna sea numérica si no lo es (para el .sum())
-        df['is_redeemed'] = pd.to_numeric(df['is_redeemed'], errors='coerce').fillna(0)
+        if start_date:
+            filters.append(f"creation_date=gte.{start_date}")
+        if end_date:
+            filters.append(f"creation_date=lte.{end_date}")
+    
+        df = pd.DataFrame() 
+    
+        filter_string = "&".join(filters)
+
+        # Sin fecha "desde" (o con una posterior al archivo) el reporte consulta solo los cupones vigentes
+        newest_archived, includes_archive = db_service.get_archive_status(filter_string)
+        if includes_archive:
+            st.sidebar.caption("🗄️ El reporte incluye cupones archivados.")
+        elif newest_archived:
+            st.sidebar.caption(
+                f"🗄️ Los cupones canjeados o vencidos hace más de {coupon_archiver.ARCHIVE_AFTER_DAYS} días "
+                f"(creados hasta el {str(newest_archived)[:10]}) están archivados. "
+                "Elija una fecha de creación 'desde' anterior para incluirlos."
+            )
+    
+        # LLAMADA MIGRADA A SUPABASE
+        report_data = db_service.get_activity_report(filter_string)
+    
+        # Reasignar 'df' solo si los datos son válidos
+        df = pd.DataFrame() 
+    
+        # Si report_data es un DataFrame válido (no None y no está vacío), lo asignamos a df.
+        if isinstance(report_data, pd.DataFrame) and not report_data.empty:
+            df = report_data
+    
+        st.subheader("Datos Completos")
+        st.dataframe(df, width='stretch')
+
+        # Métricas
+        if not df.empty:
+            # Aseguramos que la columna sea numérica si no lo es (para el .sum())
+            df['is_redeemed'] = pd.to_numeric(df['is_redeemed'], errors='coerce').fillna(0)
         
-        total_qrs = len(df)
-        redeemed_qrs = df['is_redeemed'].sum()
-        not_redeemed_qrs = total_qrs - redeemed_qrs
-    else:
-        total_qrs = redeemed_qrs = not_redeemed_qrs = 0
+            total_qrs = len(df)
+            redeemed_qrs = df['is_redeemed'].sum()
+            expired_qrs = int((df['status'] == 'expired').sum())
+            not_redeemed_qrs = int((df['status'] == 'active').sum())
+        else:
+            total_qrs = redeemed_qrs = not_redeemed_qrs = expired_qrs = 0
 
-    col1, col2, col3 = st.columns(3)
-    col1.metric("Total de QRs en Filtro", f"{total_qrs} 🎟️")
-    col2.metric("Total Canjeados", f"{redeemed_qrs} ✅")
-    col3.metric("Pendientes de Canje", f"{not_redeemed_qrs} ⏳")
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Total de QRs en Filtro", f"{total_qrs} 🎟️")
+        col2.metric("Total Canjeados", f"{redeemed_qrs} ✅")
+        col3.metric("Pendientes de Canje", f"{not_redeemed_qrs} ⏳")
+        col4.metric("Expirados", f"{expired_qrs} ⌛")
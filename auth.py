@@ -1,64 +1,44 @@
-# auth.py (ACTUALIZADO para usar requests)
-import requests
+# auth.py (ACTUALIZADO para usar el backend de almacenamiento, ver storage.py)
 import streamlit as st
-from db_config import AUTH_ENDPOINT, POSTGREST_ENDPOINT, SUPABASE_KEY, get_headers
 
 def sign_in(email, password):
     """
-    Intenta iniciar sesión usando Supabase Auth a través de llamadas requests.
+    Intenta iniciar sesión con el backend configurado (Supabase Auth o SQLite local).
     """
-    url = f"{AUTH_ENDPOINT}/token?grant_type=password"
-    payload = {"email": email, "password": password}
-    
-    try:
-        response = requests.post(url, headers=get_headers(), json=payload)
-        response.raise_for_status() # Lanza un error para códigos 4xx/5xx
+    # Diferido: la página de login no necesita el backend (ni requests) hasta el envío
+    import account_service
+    from request_context import ServiceError
 
-        auth_data = response.json()
-        token = auth_data['access_token']
-        user_id = auth_data['user']['id']
-        
-        # 1. Guardar token y datos básicos en la sesión
-        st.session_state['logged_in'] = True
-        st.session_state['token'] = token
-        st.session_state['user_id'] = user_id
-        st.session_state['user'] = auth_data['user']
-        
-        # 2. Consultar el perfil (rol y sucursal) usando el token
-        profile_response = requests.get(
-    # Faltaba asegurar el uso del token en esta llamada.
-            f"{POSTGREST_ENDPOINT}/profiles?id=eq.{user_id}&select=*,roles(role_name)", 
-            headers=get_headers(token)
-        )
-        profile_response.raise_for_status()
-
-        profile_data = profile_response.json()
-        
-        if profile_data:
-            profile = profile_data[0]
-            
-            # 3. Guardar estado completo en la sesión
-            st.session_state['user_role'] = profile['roles']['role_name']
-            st.session_state['branch_id'] = profile['branch_id']
-            st.session_state['username'] = profile['username']
-            
-            st.success(f"Bienvenido, {profile['username']} ({profile['roles']['role_name']}).")
-            st.rerun() 
-        else:
-            st.error("Su cuenta no tiene un perfil asignado. Contacte al administrador.")
-            sign_out() # Forzar logout
-            
-    except requests.exceptions.HTTPError as err:
-        if err.response.status_code == 400:
-             st.error("Credenciales inválidas. Revise su email y contraseña.")
-        else:
-            st.error(f"Error de conexión o autenticación: {err}")
+    try:
+        ctx = account_service.sign_in(email, password)
+    except ServiceError as e:
+        st.error(e.message)
+        return
     except Exception as e:
         st.error(f"Error inesperado durante el login: {e}")
+        return
+
+    # Guardar el contexto en la sesión (request_context.from_session lo reconstruye)
+    st.session_state['logged_in'] = True
+    st.session_state['token'] = ctx.token
+    st.session_state['user_id'] = ctx.user_id
+    st.session_state['user'] = {'id': ctx.user_id, 'email': ctx.email}
+    st.session_state['user_role'] = ctx.role
+    st.session_state['branch_id'] = ctx.branch_id
+    st.session_state['username'] = ctx.username
+
+    # La memoria retenida a nombre del token se muestra con el usuario en 🩺 Diagnóstico
+    import memory_budget
+    memory_budget.set_label(ctx.token, ctx.username)
+
+    st.success(f"Bienvenido, {ctx.username} ({ctx.role}).")
+    st.rerun()
 
 
 def sign_out():
     """Cierra la sesión limpiando el estado (no requiere llamada a la API en este modelo)."""
+    import memory_budget
+    memory_budget.drop_owner(st.session_state.get('token'))
     st.session_state.clear()
     st.session_state['logged_in'] = False
     st.rerun()
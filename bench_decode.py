@@ -0,0 +1,219 @@
+# bench_decode.py
+"""
+Benchmark de lectura de QRs desde fotos (qr_decoder).
+
+Genera un corpus de "fotos de celular" de tarjetas reales (card_render, con
+códigos compactos y, si se pide, payloads firmados): la tarjeta sobre un fondo,
+en perspectiva, girada, desenfocada, con ruido, sombra y compresión JPEG. Cada
+imagen se decodifica desde sus bytes JPEG, como llegaría del navegador.
+
+Para cada tipo de distorsión reporta la tasa de lectura correcta (el texto leído
+debe coincidir con el del QR), los ms por imagen (media y p95) y qué etapa de la
+cascada la leyó. --stages compara contra una sola etapa (p. ej. solo pyzbar).
+
+Uso:
+    python bench_decode.py
+    python bench_decode.py --images 50 --photo-size 3024x4032
+    python bench_decode.py --stages zbar            # solo la primera etapa
+    python bench_decode.py --save-dir corpus/       # guarda las fotos generadas
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+
+import cv2
+import numpy as np
+from PIL import Image
+
+DISTORTIONS = ('limpia', 'perspectiva', 'desenfoque', 'movimiento', 'ruido_jpeg', 'sombra', 'combinada')
+DEFAULT_IMAGES = 20
+DEFAULT_PHOTO_SIZE = '3000x4000'
+
+
+def _card(rng: random.Random, signed: bool) -> tuple:
+    """(tarjeta RGB como arreglo, texto del QR) con un código real."""
+    from card_render import compose_card, make_qr_image
+    from coupon_codes import encode_coupon_id
+
+    coupon_id = uuid.UUID(int=rng.getrandbits(128))
+    text = encode_coupon_id(coupon_id)
+    if signed:
+        import qr_signing
+        text = qr_signing.sign_payload(str(coupon_id), str(uuid.UUID(int=rng.getrandbits(128))), '2030-12-31')
+    card = compose_card(make_qr_image(text), 'Beneficio de prueba', '2030-12-31', str(rng.randint(1, 9999)).zfill(4))
+    return np.asarray(card), text
+
+
+def _place(card: np.ndarray, photo_w: int, photo_h: int, rng: random.Random, skew: float, angle: float) -> np.ndarray:
+    """Pone la tarjeta sobre un fondo (mesa) en perspectiva: esquinas desplazadas hasta `skew` y giro de hasta `angle`°."""
+    h, w = card.shape[:2]
+    width = photo_w * rng.uniform(0.45, 0.8)
+    height = width * h / w
+    cx, cy = photo_w * rng.uniform(0.4, 0.6), photo_h * rng.uniform(0.4, 0.6)
+    theta = np.radians(rng.uniform(-angle, angle))
+    corners = []
+    for dx, dy in ((-1, -1), (1, -1), (1, 1), (-1, 1)):
+        x = dx * width / 2 + rng.uniform(-skew, skew) * width
+        y = dy * height / 2 + rng.uniform(-skew, skew) * height
+        corners.append((cx + x * np.cos(theta) - y * np.sin(theta), cy + x * np.sin(theta) + y * np.cos(theta)))
+    matrix = cv2.getPerspectiveTransform(np.float32([(0, 0), (w, 0), (w, h), (0, h)]), np.float32(corners))
+    background = tuple(int(c) for c in rng.choice([(120, 100, 80), (200, 200, 195), (60, 60, 65), (160, 130, 90)]))
+    return cv2.warpPerspective(card, matrix, (photo_w, photo_h), flags=cv2.INTER_LINEAR,
+                               borderMode=cv2.BORDER_CONSTANT, borderValue=background)
+
+
+def _blur(photo, rng, strength):
+    sigma = strength * min(photo.shape[:2]) / 1000
+    return cv2.GaussianBlur(photo, (0, 0), sigma)
+
+
+def _motion(photo, rng, strength):
+    length = max(3, int(strength * min(photo.shape[:2]) / 100)) | 1
+    kernel = np.zeros((length, length), np.float32)
+    kernel[length // 2, :] = 1 / length
+    center = (length / 2, length / 2)
+    kernel = cv2.warpAffine(kernel, cv2.getRotationMatrix2D(center, rng.uniform(0, 180), 1), (length, length))
+    return cv2.filter2D(photo, -1, kernel / kernel.sum())
+
+
+def _noise(photo, rng, sigma):
+    noise = np.random.default_rng(rng.getrandbits(32)).normal(0, sigma, photo.shape)
+    return np.clip(photo + noise, 0, 255).astype(np.uint8)
+
+
+def _shadow(photo, rng, depth):
+    """Gradiente de luz (sombra de la mano o del celular) y menos contraste."""
+    h, w = photo.shape[:2]
+    ramp = np.linspace(1 - depth, 1, w if rng.random() < 0.5 else h, dtype=np.float32)
+    ramp = ramp[::-1] if rng.random() < 0.5 else ramp
+    light = ramp[None, :, None] if ramp.size == w else ramp[:, None, None]
+    return np.clip(photo * light * 0.8 + 25, 0, 255).astype(np.uint8)
+
+
+def make_photo(card: np.ndarray, distortion: str, photo_size: tuple, rng: random.Random) -> bytes:
+    """Foto JPEG de la tarjeta con la distorsión indicada."""
+    photo_w, photo_h = photo_size
+    quality = 90
+    if distortion == 'limpia':
+        photo = _place(card, photo_w, photo_h, rng, skew=0.0, angle=3)
+    elif distortion == 'perspectiva':
+        photo = _place(card, photo_w, photo_h, rng, skew=0.12, angle=30)
+    elif distortion == 'desenfoque':
+        photo = _blur(_place(card, photo_w, photo_h, rng, 0.02, 8), rng, strength=rng.uniform(1, 3.5))
+    elif distortion == 'movimiento':
+        photo = _motion(_place(card, photo_w, photo_h, rng, 0.02, 8), rng, strength=rng.uniform(0.3, 1.0))
+    elif distortion == 'ruido_jpeg':
+        photo, quality = _noise(_place(card, photo_w, photo_h, rng, 0.02, 8), rng, sigma=18), 30
+    elif distortion == 'sombra':
+        photo = _shadow(_place(card, photo_w, photo_h, rng, 0.02, 8), rng, depth=rng.uniform(0.6, 0.8))
+    else:  # combinada
+        photo = _place(card, photo_w, photo_h, rng, skew=0.08, angle=20)
+        photo = _shadow(_noise(_blur(photo, rng, 1.5), rng, 8), rng, depth=0.5)
+        quality = 60
+    buffer = io.BytesIO()
+    Image.fromarray(photo).save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def build_corpus(images: int, photo_size: tuple, seed: int, signed: bool) -> dict:
+    """{distorsión: [(bytes JPEG, texto esperado), ...]}."""
+    rng = random.Random(seed)
+    corpus = {}
+    for distortion in DISTORTIONS:
+        corpus[distortion] = []
+        for i in range(images):
+            card, text = _card(rng, signed=signed and i % 2 == 1)
+            corpus[distortion].append((make_photo(card, distortion, photo_size, rng), text))
+    return corpus
+
+
+def bench(corpus: dict, stages: list = None) -> dict:
+    """Por distorsión: tasa de lectura correcta, ms por imagen (media, p95, máx) y etapas ganadoras."""
+    import qr_decoder
+
+    results = {}
+    for distortion, samples in corpus.items():
+        times, correct, wrong, by_stage = [], 0, 0, Counter()
+        for data, expected in samples:
+            start = time.perf_counter()
+            result = qr_decoder.decode(data, stages=stages)
+            times.append((time.perf_counter() - start) * 1000)
+            if result and result.text == expected:
+                correct += 1
+                by_stage[result.stage] += 1
+            elif result:
+                wrong += 1
+        times.sort()
+        results[distortion] = {
+            'images': len(samples),
+            'decode_rate': correct / len(samples),
+            'wrong': wrong,
+            'mean_ms': sum(times) / len(times),
+            'p95_ms': times[min(len(times) - 1, int(len(times) * 0.95))],
+            'max_ms': times[-1],
+            'stages': dict(by_stage),
+        }
+        print_row(distortion, results[distortion])
+    return results
+
+
+def print_header():
+    print(f"{'distorsión':<13}{'n':>5}{'lectura':>9}{'errón.':>8}{'media ms':>10}{'p95 ms':>9}{'máx ms':>9}  etapas")
+
+
+def print_row(name: str, r: dict):
+    stages = ', '.join(f"{stage} {count}" for stage, count in sorted(r['stages'].items(), key=lambda i: -i[1]))
+    print(f"{name:<13}{r['images']:>5}{r['decode_rate']:>9.0%}{r['wrong']:>8}{r['mean_ms']:>10.1f}"
+          f"{r['p95_ms']:>9.1f}{r['max_ms']:>9.1f}  {stages}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de lectura de QRs desde fotos distorsionadas.')
+    parser.add_argument('--images', type=int, default=DEFAULT_IMAGES, help='Fotos por tipo de distorsión')
+    parser.add_argument('--photo-size', default=DEFAULT_PHOTO_SIZE, help='Tamaño de la foto (ancho x alto)')
+    parser.add_argument('--seed', type=int, default=7, help='Semilla del corpus (mismo corpus entre corridas)')
+    parser.add_argument('--signed', action='store_true', help='La mitad de los QRs con payload firmado (requiere QR_SIGNING_KEY)')
+    parser.add_argument('--stages', default=None, help='Etapas de qr_decoder separadas por coma (por defecto, todas)')
+    parser.add_argument('--save-dir', default=None, help='Guarda las fotos generadas en esta carpeta')
+    args = parser.parse_args()
+
+    import qr_decoder
+
+    photo_size = tuple(int(v) for v in args.photo_size.lower().split('x'))
+    stages = [s for s in args.stages.split(',') if s] if args.stages else None
+    available = qr_decoder.available_stages()
+    missing = [s for s in (stages or []) if s not in available]
+    if missing:
+        parser.error(f"Etapas no disponibles aquí: {', '.join(missing)} (disponibles: {', '.join(available)}).")
+    if args.signed:
+        import qr_signing
+        if not qr_signing.signing_enabled():
+            parser.error('--signed requiere la variable de entorno QR_SIGNING_KEY.')
+
+    start = time.perf_counter()
+    corpus = build_corpus(args.images, photo_size, args.seed, args.signed)
+    print(f"Corpus: {args.images} fotos x {len(DISTORTIONS)} distorsiones de {photo_size[0]}x{photo_size[1]} "
+          f"({time.perf_counter() - start:.1f} s). Etapas: {', '.join(stages or available)}.\n")
+    if args.save_dir:
+        os.makedirs(args.save_dir, exist_ok=True)
+        for distortion, samples in corpus.items():
+            for i, (data, _) in enumerate(samples):
+                with open(os.path.join(args.save_dir, f'{distortion}_{i:03d}.jpg'), 'wb') as f:
+                    f.write(data)
+
+    print_header()
+    results = bench(corpus, stages)
+    total = sum(r['images'] for r in results.values())
+    read = sum(r['decode_rate'] * r['images'] for r in results.values())
+    mean_ms = sum(r['mean_ms'] * r['images'] for r in results.values()) / total
+    print(f"\nTotal: {read / total:.0%} leídas correctamente, {mean_ms:.1f} ms por imagen de media.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
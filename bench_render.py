@@ -0,0 +1,271 @@
+# bench_render.py
+"""
+Micro-benchmark del pipeline de tarjetas (card_render / qr_utils).
+
+Mide por separado la codificación QR, la composición de la tarjeta, la
+codificación PNG y el ensamblado del PDF para varios tamaños de lote, y
+registra tarjetas/segundo y el pico de memoria (RSS). Cada tamaño corre en
+un proceso nuevo para que el pico de RSS sea el de ese lote.
+
+Compara contra una línea base guardada y termina con código 1 si alguna
+métrica empeora más que el umbral configurado. Sin línea base termina con
+código 2 (salvo con --update-baseline): una comparación sin referencia no
+puede fallar. La línea base depende de la máquina, así que no se versiona:
+se genera en la máquina de referencia (o el runner de CI) y se conserva ahí,
+o se indica otra ruta con --baseline.
+
+Uso:
+    python bench_render.py                       # compara contra la línea base
+    python bench_render.py --sizes 1,10,100,1000,10000
+    python bench_render.py --update-baseline     # guarda los resultados como nueva línea base
+    python bench_render.py --profiles all        # tamaño de archivo y tiempo de codificación por perfil de exportación
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+DEFAULT_SIZES = '1,10,100,1000'
+DEFAULT_BASELINE = 'bench_render_baseline.json'
+DEFAULT_THRESHOLD = 0.15
+MISSING_BASELINE_EXIT = 2
+PROFILE_CARDS = 20
+
+STAGES = ('qr_encode', 'compose', 'png_encode', 'pdf_assembly')
+
+# Métricas comparadas: (nombre, True si "más alto es mejor")
+COMPARED_METRICS = [('cards_per_s', True), ('peak_rss_mb', False)] + [
+    (f'{stage}_ms_per_card', False) for stage in STAGES
+]
+
+
+def _peak_rss_mb() -> float:
+    """Pico de RSS del proceso actual en MB (ru_maxrss está en KB en Linux, bytes en macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _run_batch(size: int, workdir: str) -> dict:
+    """Genera `size` tarjetas y el PDF del lote, acumulando el tiempo por etapa."""
+    from card_render import compose_card, generate_pdf_from_images, make_qr_image, save_card
+    from coupon_codes import encode_coupon_id
+
+    totals = dict.fromkeys(STAGES, 0.0)
+    paths = []
+    for i in range(size):
+        start = time.perf_counter()
+        qr_img = make_qr_image(encode_coupon_id(uuid.uuid4()))
+        after_qr = time.perf_counter()
+        card_img = compose_card(qr_img, 'Beneficio de prueba', '2030-12-31', str(i + 1).zfill(4))
+        after_compose = time.perf_counter()
+        path = os.path.join(workdir, f'{i}.png')
+        save_card(card_img, path)
+        after_png = time.perf_counter()
+        totals['qr_encode'] += after_qr - start
+        totals['compose'] += after_compose - after_qr
+        totals['png_encode'] += after_png - after_compose
+        paths.append(path)
+
+    start = time.perf_counter()
+    generate_pdf_from_images(paths, os.path.join(workdir, 'lote.pdf'))
+    totals['pdf_assembly'] = time.perf_counter() - start
+    for path in paths:
+        os.remove(path)
+    return totals
+
+
+def bench_size(size: int) -> dict:
+    """Ejecuta el benchmark de un tamaño de lote (en el proceso hijo)."""
+    from card_render import generate_design_template
+    import qr_utils
+
+    # Los lotes pequeños se repiten para reducir el ruido; se toma la mejor corrida.
+    repeats = max(1, 100 // size)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)  # create_qr_card crea 'generated_qrs' en el directorio actual
+        best = None
+        for _ in range(repeats):
+            totals = _run_batch(size, workdir)
+            if best is None or sum(totals.values()) < sum(best.values()):
+                best = totals
+
+        start = time.perf_counter()
+        generate_design_template(os.path.join(workdir, 'plantilla.pdf'))
+        template_ms = (time.perf_counter() - start) * 1000
+
+        # Variante de qr_utils (tarjeta 875x500), medida de punta a punta.
+        legacy_cards = min(size, 100)
+        start = time.perf_counter()
+        for i in range(legacy_cards):
+            qr_utils.create_qr_card(str(uuid.uuid4()), os.path.join(workdir, 'legacy.png'), 'Beneficio', '2030-12-31')
+        legacy_ms = (time.perf_counter() - start) * 1000 / legacy_cards
+
+    total_s = sum(best.values())
+    result = {
+        'size': size,
+        'total_s': total_s,
+        'cards_per_s': size / total_s if total_s else 0.0,
+        'peak_rss_mb': _peak_rss_mb(),
+        'design_template_ms': template_ms,
+        'qr_utils_card_ms': legacy_ms,
+    }
+    for stage in STAGES:
+        result[f'{stage}_ms_per_card'] = best[stage] * 1000 / size
+    return result
+
+
+def bench_profiles(profile_names: list, cards: int = PROFILE_CARDS) -> dict:
+    """Por perfil: composición y codificación (ms/tarjeta), tamaño medio de la tarjeta y del PDF del lote."""
+    from card_render import EXPORT_PROFILES, card_filename, compose_card, generate_pdf_from_images, make_qr_image, save_card
+    from coupon_codes import encode_coupon_id
+
+    qr_images = [make_qr_image(encode_coupon_id(uuid.uuid4())) for _ in range(cards)]
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in profile_names:
+            profile = EXPORT_PROFILES[name]
+            compose_s = encode_s = 0.0
+            paths = []
+            for i, qr_img in enumerate(qr_images):
+                start = time.perf_counter()
+                card_img = compose_card(qr_img, 'Beneficio de prueba', '2030-12-31', str(i + 1).zfill(4), dpi=profile['dpi'])
+                after_compose = time.perf_counter()
+                path = os.path.join(workdir, card_filename(f'{name}_{i}', profile))
+                save_card(card_img, path, profile)
+                encode_s += time.perf_counter() - after_compose
+                compose_s += after_compose - start
+                paths.append(path)
+
+            pdf_path = os.path.join(workdir, f'{name}.pdf')
+            start = time.perf_counter()
+            generate_pdf_from_images(paths, pdf_path, profile)
+            pdf_s = time.perf_counter() - start
+
+            results[name] = {
+                'dpi': profile['dpi'],
+                'card_px': '{}x{}'.format(*card_img.size),
+                'compose_ms_per_card': compose_s * 1000 / cards,
+                'encode_ms_per_card': encode_s * 1000 / cards,
+                'card_kb': sum(os.path.getsize(p) for p in paths) / cards / 1024,
+                'pdf_ms_per_card': pdf_s * 1000 / cards,
+                'pdf_kb_per_card': os.path.getsize(pdf_path) / cards / 1024,
+            }
+            print_profile_row(name, results[name])
+    return results
+
+
+def run_benchmarks(sizes: list) -> dict:
+    results = {}
+    ctx = get_context('spawn')
+    for size in sizes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            results[str(size)] = pool.submit(bench_size, size).result()
+        print_row(results[str(size)])
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Retorna la lista de regresiones (texto) frente a la línea base."""
+    regressions = []
+    for size, current in results.items():
+        reference = baseline.get(size)
+        if not reference:
+            print(f'AVISO: la línea base no tiene el lote {size}; no se compara.', file=sys.stderr)
+            continue
+        for metric, higher_is_better in COMPARED_METRICS:
+            old, new = reference.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            if worse > threshold:
+                regressions.append(
+                    f'lote {size}: {metric} {old:.2f} -> {new:.2f} ({change:+.1%}, umbral {threshold:.0%})'
+                )
+    return regressions
+
+
+def print_header():
+    print(f"{'lote':>6}{'tarj/s':>9}{'qr ms':>8}{'comp ms':>9}{'png ms':>8}{'pdf ms':>8}{'RSS MB':>8}")
+
+
+def print_row(r: dict):
+    print(
+        f"{r['size']:>6}{r['cards_per_s']:>9.1f}{r['qr_encode_ms_per_card']:>8.2f}{r['compose_ms_per_card']:>9.2f}"
+        f"{r['png_encode_ms_per_card']:>8.2f}{r['pdf_assembly_ms_per_card']:>8.2f}{r['peak_rss_mb']:>8.1f}"
+    )
+
+
+def print_profile_header():
+    print(f"{'perfil':<15}{'DPI':>5}{'px':>11}{'comp ms':>9}{'cod ms':>8}{'KB':>8}{'pdf ms':>8}{'pdf KB':>8}")
+
+
+def print_profile_row(name: str, r: dict):
+    print(
+        f"{name:<15}{r['dpi']:>5}{r['card_px']:>11}{r['compose_ms_per_card']:>9.2f}{r['encode_ms_per_card']:>8.2f}"
+        f"{r['card_kb']:>8.1f}{r['pdf_ms_per_card']:>8.2f}{r['pdf_kb_per_card']:>8.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del pipeline de renderizado de tarjetas.')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Tamaños de lote separados por coma (1 a 10000)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Archivo JSON de línea base')
+    parser.add_argument('--threshold', type=float, default=None,
+                        help=f'Regresión máxima permitida (fracción). Por defecto la de la línea base o {DEFAULT_THRESHOLD}')
+    parser.add_argument('--update-baseline', action='store_true', help='Guarda los resultados como línea base')
+    parser.add_argument('--profiles', default=None,
+                        help="Compara perfiles de exportación ('all' o nombres separados por coma) en lugar del pipeline")
+    parser.add_argument('--cards', type=int, default=PROFILE_CARDS, help='Tarjetas por perfil con --profiles')
+    args = parser.parse_args()
+
+    if args.profiles:
+        from card_render import EXPORT_PROFILES
+        names = list(EXPORT_PROFILES) if args.profiles == 'all' else [p for p in args.profiles.split(',') if p]
+        print_profile_header()
+        bench_profiles(names, args.cards)
+        return 0
+
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    baseline_dir = os.path.dirname(os.path.abspath(__file__))
+    baseline_path = os.path.join(baseline_dir, args.baseline)
+
+    stored = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path, encoding='utf-8') as f:
+            stored = json.load(f)
+    elif not args.update_baseline:
+        # Antes de medir: sin referencia la comparación no puede fallar
+        print(f'ERROR: no existe la línea base {baseline_path}.\n'
+              f'Genérela en la máquina de referencia con --update-baseline o indique otra con --baseline.',
+              file=sys.stderr)
+        return MISSING_BASELINE_EXIT
+    threshold = args.threshold if args.threshold is not None else stored.get('threshold', DEFAULT_THRESHOLD)
+
+    print_header()
+    results = run_benchmarks(sizes)
+
+    if args.update_baseline:
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump({'threshold': threshold, 'results': results}, f, indent=2)
+        print(f'\nLínea base guardada en {baseline_path}')
+        return 0
+
+    regressions = compare(results, stored.get('results', {}), threshold)
+    if regressions:
+        print('\nREGRESIONES DETECTADAS:')
+        for line in regressions:
+            print(f'  - {line}')
+        return 1
+    print(f'\nSin regresiones frente a la línea base (umbral {threshold:.0%}).')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
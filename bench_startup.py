@@ -0,0 +1,130 @@
+# bench_startup.py
+"""
+Benchmark de arranque en frío por rol.
+
+Cada escenario corre en un proceso nuevo: ejecuta app.py con el AppTest de
+Streamlit (sesión ya autenticada contra fake_supabase), primero el Dashboard
+y luego la página indicada, y mide el tiempo de la primera ejecución, el RSS
+agregado y qué dependencias pesadas quedaron cargadas.
+
+Uso:
+    python bench_startup.py
+    python bench_startup.py --roles Cashier,Creator
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ('requests', 'pandas', 'PIL', 'qrcode', 'fpdf', 'pyzbar', 'cv2')
+
+# Páginas visibles por rol (mismo orden que el menú de app.py).
+ROLE_PAGES = {
+    'Cashier': ["🏠 Dashboard", "📲 Escáner (Cajero)"],
+    'Creator': ["🏠 Dashboard", "🛠️ Creador de QRs"],
+    'Admin': [
+        "🏠 Dashboard", "🔑 Gestión de Usuarios (Admin)", "⚙️ Configuración (Admin)", "📦 Lotes (Admin)",
+        "📊 Reportes (Admin)", "🗃️ Cola de Escritura (Admin)", "🛠️ Creador de QRs",
+    ],
+}
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+
+def _rss_mb() -> float:
+    """RSS actual en MB (Linux); en otros sistemas, el pico de RSS."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _loaded_heavy() -> list:
+    return [m for m in HEAVY_MODULES if m in sys.modules]
+
+
+def run_scenario(role: str, page: str) -> dict:
+    """Ejecuta un escenario en el proceso actual (llamado desde el proceso hijo)."""
+    import logging
+    logging.disable(logging.WARNING)
+
+    from fake_supabase import FakeSupabaseServer
+    from streamlit.testing.v1 import AppTest
+
+    server = FakeSupabaseServer().start()
+    os.environ['SUPABASE_URL'] = server.url
+    server.db.seed()
+    email = f'{role.lower()}1@example.com'
+    auth_data = server.db.sign_in(email, 'password')
+    profile = next(p for p in server.db.tables['profiles'] if p['email'] == email)
+
+    base_rss = _rss_mb()
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    at.session_state['logged_in'] = True
+    at.session_state['token'] = auth_data['access_token']
+    at.session_state['user_id'] = auth_data['user']['id']
+    at.session_state['user'] = auth_data['user']
+    at.session_state['user_role'] = role
+    at.session_state['branch_id'] = profile['branch_id']
+    at.session_state['username'] = profile['username']
+
+    start = time.perf_counter()
+    at.run()
+    dashboard_ms = (time.perf_counter() - start) * 1000
+    dashboard_rss = _rss_mb()
+    dashboard_modules = _loaded_heavy()
+
+    page_ms = 0.0
+    if page != ROLE_PAGES[role][0]:
+        start = time.perf_counter()
+        at.sidebar.radio[0].set_value(page).run()
+        page_ms = (time.perf_counter() - start) * 1000
+
+    server.stop()
+    return {
+        'role': role,
+        'page': page,
+        'dashboard_ms': dashboard_ms,
+        'dashboard_rss_mb': dashboard_rss - base_rss,
+        'dashboard_modules': dashboard_modules,
+        'page_ms': page_ms,
+        'page_rss_mb': _rss_mb() - base_rss,
+        'page_modules': _loaded_heavy(),
+        'exceptions': [str(e.value) for e in at.exception],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tiempo de arranque en frío y RSS por rol y página.')
+    parser.add_argument('--roles', default=','.join(ROLE_PAGES), help='Roles a medir, separados por coma')
+    parser.add_argument('--child', nargs=2, metavar=('ROL', 'PAGINA'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scenario(*args.child)))
+        return 0
+
+    print(f"{'rol':<9}{'página':<32}{'dash ms':>9}{'dash MB':>9}{'pág ms':>9}{'pág MB':>9}  módulos cargados")
+    for role in args.roles.split(','):
+        for page in ROLE_PAGES[role]:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child', role, page],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            r = json.loads(output.strip().splitlines()[-1])
+            print(
+                f"{role:<9}{page:<32}{r['dashboard_ms']:>9.0f}{r['dashboard_rss_mb']:>9.1f}"
+                f"{r['page_ms']:>9.0f}{r['page_rss_mb']:>9.1f}  {', '.join(r['page_modules']) or '-'}"
+            )
+            for error in r['exceptions']:
+                print(f"    ! {error}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
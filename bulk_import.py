@@ -0,0 +1,219 @@
+# bulk_import.py
+"""
+Importación masiva (CSV) de sucursales, emisores y promociones.
+
+El archivo se valida completo antes de enviar nada; luego las filas válidas
+se envían en bloques como upserts de PostgREST (on_conflict sobre la clave
+natural de cada tabla), así cientos de registros cuestan unas pocas
+peticiones. Cada fila del CSV recibe su resultado: creado, actualizado o error.
+Requiere los índices únicos de migrations/002_master_data_unique_keys.sql.
+"""
+import csv
+import io
+import unicodedata
+
+import streamlit as st
+
+import db_service
+
+CHUNK_SIZE = 500
+
+PROMO_TYPES = {
+    'porcentaje': (True, False, False),
+    'valor fijo': (False, True, False),
+    'producto de regalo': (False, False, True),
+    'producto': (False, False, True),
+}
+
+# Por tabla: columna clave (on_conflict), columnas aceptadas (con alias en español) y obligatorias.
+IMPORT_SPECS = {
+    'branches': {
+        'label': 'Sucursales',
+        'key': 'name',
+        'columns': {'name': ('nombre', 'sucursal'), 'address': ('direccion',)},
+        'required': ('name',),
+    },
+    'issuers': {
+        'label': 'Emisores',
+        'key': 'issuer_name',
+        'columns': {'issuer_name': ('nombre', 'emisor')},
+        'required': ('issuer_name',),
+    },
+    'promos': {
+        'label': 'Promociones',
+        'key': 'type_name',
+        'columns': {
+            'type_name': ('nombre', 'promocion'),
+            'description': ('descripcion',),
+            'value': ('valor',),
+            'value_type': ('tipo', 'tipo de valor'),
+        },
+        'required': ('type_name', 'description', 'value', 'value_type'),
+    },
+}
+
+
+def _normalize_header(text: str) -> str:
+    text = unicodedata.normalize('NFKD', text.strip().lower())
+    return ''.join(ch for ch in text if not unicodedata.combining(ch)).replace('_', ' ').strip()
+
+
+def map_headers(headers: list, spec: dict) -> dict:
+    """Encabezado del CSV -> columna de la tabla (acepta nombres en inglés o en español)."""
+    aliases = {}
+    for column, names in spec['columns'].items():
+        aliases[_normalize_header(column)] = column
+        for name in names:
+            aliases[_normalize_header(name)] = column
+    return {h: aliases[_normalize_header(h)] for h in headers if _normalize_header(h) in aliases}
+
+
+def read_csv(data: bytes):
+    """Decodifica (UTF-8 con o sin BOM, o Latin-1) y detecta el delimitador (',', ';' o tab)."""
+    try:
+        text = data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        text = data.decode('latin-1')
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    return list(csv.DictReader(io.StringIO(text), dialect=dialect))
+
+
+def _build_row(table: str, values: dict):
+    """Convierte una fila del CSV al payload de la tabla. Lanza ValueError si no es válida."""
+    spec = IMPORT_SPECS[table]
+    missing = [c for c in spec['required'] if not values.get(c)]
+    if missing:
+        raise ValueError(f"Faltan columnas obligatorias: {', '.join(missing)}")
+
+    if table == 'branches':
+        return {'name': values['name'], 'address': values.get('address') or None}
+    if table == 'issuers':
+        return {'issuer_name': values['issuer_name']}
+
+    try:
+        value = float(values['value'].replace(',', '.'))
+    except ValueError:
+        raise ValueError(f"Valor numérico inválido: {values['value']}")
+    if value < 0:
+        raise ValueError("El valor no puede ser negativo.")
+    value_type = PROMO_TYPES.get(_normalize_header(values['value_type']))
+    if value_type is None:
+        raise ValueError("Tipo de valor inválido (use Porcentaje, Valor Fijo o Producto de Regalo).")
+    is_percentage, is_cash_value, is_product = value_type
+    return {
+        'type_name': values['type_name'],
+        'is_percentage': is_percentage,
+        'is_cash_value': is_cash_value,
+        'is_product': is_product,
+        'value': value,
+        'description': values['description'],
+    }
+
+
+def validate_rows(table: str, records: list):
+    """
+    Valida todo el archivo de una vez.
+    Retorna (filas_válidas, reporte) donde filas_válidas es [(número_de_fila, payload)].
+    """
+    spec = IMPORT_SPECS[table]
+    header_map = map_headers(list(records[0].keys()) if records else [], spec)
+    valid, report, seen = [], [], {}
+
+    for line, record in enumerate(records, start=2):  # la fila 1 es el encabezado
+        values = {
+            header_map[h]: (v or '').strip()
+            for h, v in record.items() if h in header_map and isinstance(v, str)
+        }
+        key = values.get(spec['key'], '')
+        try:
+            payload = _build_row(table, values)
+            if key in seen:
+                raise ValueError(f"Clave duplicada en el archivo (ver fila {seen[key]}).")
+            seen[key] = line
+            valid.append((line, payload))
+        except ValueError as e:
+            report.append({'Fila': line, 'Clave': key, 'Resultado': 'Error', 'Detalle': str(e)})
+    return valid, report
+
+
+def import_rows(table: str, valid_rows: list, chunk_size: int = CHUNK_SIZE, progress=None):
+    """Envía las filas válidas en bloques de upsert y retorna el reporte por fila."""
+    key = IMPORT_SPECS[table]['key']
+    report = []
+    for start in range(0, len(valid_rows), chunk_size):
+        chunk = valid_rows[start:start + chunk_size]
+        payloads = [payload for _, payload in chunk]
+        try:
+            existing = db_service.get_existing_keys(table, key, [p[key] for p in payloads])
+        except Exception:
+            existing = None  # Solo afecta la distinción creado/actualizado
+
+        ok, message = db_service.upsert_entries(table, payloads, on_conflict=key)
+        for line, payload in chunk:
+            if not ok:
+                result, detail = 'Error', message
+            elif existing is None:
+                result, detail = 'Guardado', ''
+            else:
+                result, detail = ('Actualizado' if payload[key] in existing else 'Creado'), ''
+            report.append({'Fila': line, 'Clave': payload[key], 'Resultado': result, 'Detalle': detail})
+        if progress:
+            progress(min(start + chunk_size, len(valid_rows)) / len(valid_rows))
+    return report
+
+
+def csv_template(table: str) -> str:
+    """Encabezado (y una fila de ejemplo) del CSV esperado para la tabla."""
+    examples = {
+        'branches': 'name,address\nSucursal Centro,"Avenida 2, San José"\n',
+        'issuers': 'issuer_name\nMarketing\n',
+        'promos': 'type_name,description,value,value_type\n20% Bebidas,20% de descuento en bebidas,20,Porcentaje\n',
+    }
+    return examples[table]
+
+
+def render_bulk_import():
+    """Pestaña de importación masiva dentro de Configuración (Solo Admin)."""
+    import pandas as pd
+
+    st.subheader("Importación Masiva desde CSV")
+    st.caption("Las filas cuya clave ya existe se actualizan; las demás se crean.")
+
+    table = st.selectbox(
+        "Tabla destino", options=list(IMPORT_SPECS),
+        format_func=lambda t: f"{IMPORT_SPECS[t]['label']} (clave: {IMPORT_SPECS[t]['key']})",
+        key="bulk_import_table",
+    )
+    st.download_button(
+        "Descargar plantilla CSV", data=csv_template(table),
+        file_name=f"plantilla_{table}.csv", mime="text/csv", key="bulk_import_template",
+    )
+
+    uploaded = st.file_uploader("Archivo CSV", type=["csv"], key=f"bulk_import_file_{table}")
+    if uploaded is None:
+        return
+
+    records = read_csv(uploaded.getvalue())
+    if not records:
+        st.warning("El archivo no contiene filas.")
+        return
+
+    valid_rows, errors = validate_rows(table, records)
+    st.info(f"{len(records)} filas leídas: {len(valid_rows)} válidas, {len(errors)} con errores.")
+    if errors:
+        st.dataframe(pd.DataFrame(errors), width='stretch')
+
+    if valid_rows and st.button(f"Importar {len(valid_rows)} filas válidas", type="primary", key="bulk_import_run"):
+        progress_bar = st.progress(0.0)
+        report = import_rows(table, valid_rows, progress=progress_bar.progress)
+        report = sorted(report + errors, key=lambda r: r['Fila'])
+        summary = pd.DataFrame(report)['Resultado'].value_counts().to_dict()
+        st.success("Importación finalizada: " + ", ".join(f"{k}: {v}" for k, v in summary.items()))
+        st.dataframe(pd.DataFrame(report), width='stretch')
+        st.download_button(
+            "Descargar reporte", data=pd.DataFrame(report).to_csv(index=False),
+            file_name=f"reporte_importacion_{table}.csv", mime="text/csv", key="bulk_import_report",
+        )
@@ -0,0 +1,254 @@
+# card_render.py
+"""
+Generación de tarjetas QR y PDFs usada por el Creador de QRs (app.py).
+
+Está separado de app.py para poder importarlo sin ejecutar el script de
+Streamlit (benchmarks, procesos en lote). El flujo se divide en etapas
+(codificación QR, composición de la tarjeta, codificación PNG) para poder
+medirlas por separado.
+
+Perfiles de exportación (EXPORT_PROFILES): la tarjeta se compone a la
+resolución del perfil (misma geometría de 9x5 cm, escalada desde 300 DPI) y
+se guarda cuantizada a paleta o a 1 bit, ya que es casi todo color plano.
+El perfil también fija el formato (PNG con nivel de compresión o WebP sin
+pérdida) y el filtro de imágenes del PDF.
+"""
+import qrcode
+from PIL import Image, ImageDraw, ImageFont
+import os
+from fpdf import FPDF
+import coupon_codes
+import qr_signing
+
+# 9cm x 5cm en mm = 90mm x 50mm
+CARD_WIDTH_MM = 90
+CARD_HEIGHT_MM = 50
+QR_SIZE_MM = 25
+
+# CORRECCIÓN FINAL DE DIMENSIONES: 9cm ANCHO (1063px) x 5cm ALTO (591px)
+# Al ser el ANCHO mayor que el ALTO, se respeta la orientación horizontal 5x9 cm.
+CARD_WIDTH_PX, CARD_HEIGHT_PX = 1063, 591
+
+QR_SIZE_PIXELS = 250
+# Posiciones basadas en el código que funcionaba, ajustadas al lienzo 1063x591
+QR_POSITION = (763, 130)
+CONSECUTIVE_POSITION = (50, 450)
+EXPIRATION_POSITION = (50, 220)
+
+# Los códigos compactos (coupon_codes, 27 caracteres alfanuméricos) caben en la
+# versión 2 con corrección Q (capacidad 29), así que no se busca versión por tarjeta.
+COMPACT_QR_VERSION = 2
+COMPACT_QR_ERROR_CORRECTION = qrcode.constants.ERROR_CORRECT_Q
+# Los payloads firmados (qr_signing, 83 caracteres alfanuméricos) caben en la versión 4 M (capacidad 90).
+SIGNED_QR_VERSION = 4
+SIGNED_QR_ERROR_CORRECTION = qrcode.constants.ERROR_CORRECT_M
+
+# --- Perfiles de exportación ---
+# dpi: resolución de la tarjeta (300 = 1063x591, la geometría de referencia).
+# colors: 'rgb' (sin cuantizar), 'palette' (paleta de `palette_colors` sin tramado) o '1bit' (blanco y negro).
+# format / save_options: formato de PIL y sus opciones (nivel de compresión PNG, WebP sin pérdida).
+# pdf_image_filter: filtro de fpdf2 ('AUTO' usa CCITT G4 para 1 bit; 'FlateDecode' conserva la paleta).
+# 'DCTDecode' (JPEG) no conviene: con colores planos el PDF resulta más grande y con bordes sucios.
+BASE_DPI = 300
+EXPORT_PROFILES = {
+    'pantalla': {
+        'label': 'Vista previa en pantalla (96 DPI, WebP)',
+        'dpi': 96, 'colors': 'palette', 'palette_colors': 32,
+        'format': 'WEBP', 'save_options': {'lossless': True, 'method': 4},
+        'pdf_image_filter': 'FlateDecode',
+    },
+    'oficina': {
+        'label': 'Impresión de oficina (150 DPI, PNG paleta)',
+        'dpi': 150, 'colors': 'palette', 'palette_colors': 16,
+        'format': 'PNG', 'save_options': {'compress_level': 9},
+        'pdf_image_filter': 'FlateDecode',
+    },
+    'imprenta_300': {
+        'label': 'Imprenta 300 DPI (PNG paleta)',
+        'dpi': 300, 'colors': 'palette', 'palette_colors': 16,
+        'format': 'PNG', 'save_options': {'compress_level': 9},
+        'pdf_image_filter': 'FlateDecode',
+    },
+    'imprenta_600': {
+        'label': 'Imprenta 600 DPI (PNG paleta)',
+        'dpi': 600, 'colors': 'palette', 'palette_colors': 16,
+        'format': 'PNG', 'save_options': {'compress_level': 9},
+        'pdf_image_filter': 'FlateDecode',
+    },
+    'monocromo_600': {
+        'label': 'Láser blanco y negro 600 DPI (1 bit)',
+        'dpi': 600, 'colors': '1bit',
+        'format': 'PNG', 'save_options': {'compress_level': 9},
+        'pdf_image_filter': 'AUTO',
+    },
+    'rgb_300': {
+        'label': 'RGB sin cuantizar 300 DPI (formato anterior)',
+        'dpi': 300, 'colors': 'rgb',
+        'format': 'PNG', 'save_options': {},
+        'pdf_image_filter': 'FlateDecode',
+    },
+}
+DEFAULT_EXPORT_PROFILE = 'imprenta_300'
+FILE_EXTENSIONS = {'PNG': 'png', 'WEBP': 'webp'}
+
+
+def get_export_profile(profile) -> dict:
+    """Acepta el nombre de un perfil o el dict del perfil; None usa el perfil por defecto."""
+    if isinstance(profile, dict):
+        return profile
+    return EXPORT_PROFILES[profile or DEFAULT_EXPORT_PROFILE]
+
+
+def card_filename(stem: str, profile=None) -> str:
+    """Nombre de archivo de la tarjeta con la extensión del formato del perfil."""
+    return f"{stem}.{FILE_EXTENSIONS[get_export_profile(profile)['format']]}"
+
+
+def load_fonts(scale: float = 1.0):
+    """Retorna (title_font, main_font, consecutive_font) escaladas, con la fuente por defecto como respaldo."""
+    try:
+        title_font = ImageFont.truetype("arialbd.ttf", size=round(32 * scale))
+        main_font = ImageFont.truetype("arial.ttf", size=round(30 * scale))
+        consecutive_font = ImageFont.truetype("arialbd.ttf", size=round(40 * scale))
+    except IOError:
+        default_font = ImageFont.load_default() if scale == 1 else ImageFont.load_default(size=max(6, round(10 * scale)))
+        title_font = default_font
+        main_font = default_font
+        consecutive_font = default_font
+    return title_font, main_font, consecutive_font
+
+
+def make_qr_image(data_to_encode: str):
+    """
+    Etapa 1: codifica el dato en una imagen QR (RGB).
+    Los códigos compactos y los payloads firmados usan versión y corrección fijas;
+    cualquier otro dato (p. ej. UUIDs de lotes antiguos) busca la versión mínima como antes.
+    """
+    if len(data_to_encode) == coupon_codes.CODE_LENGTH and coupon_codes.is_valid_code(data_to_encode):
+        qr = qrcode.QRCode(version=COMPACT_QR_VERSION, error_correction=COMPACT_QR_ERROR_CORRECTION, box_size=8, border=2)
+        qr.add_data(data_to_encode)
+        qr.make(fit=False)
+    elif qr_signing.is_signed_payload(data_to_encode):
+        qr = qrcode.QRCode(version=SIGNED_QR_VERSION, error_correction=SIGNED_QR_ERROR_CORRECTION, box_size=8, border=2)
+        qr.add_data(data_to_encode)
+        qr.make(fit=False)
+    else:
+        qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=8, border=2)
+        qr.add_data(data_to_encode)
+        qr.make(fit=True)
+    # Importante: Aseguramos el color negro para el relleno
+    return qr.make_image(fill_color="black", back_color="white").convert('RGB')
+
+
+def compose_card(qr_img, description: str, expiration: str, consecutive: str, dpi: int = BASE_DPI):
+    """
+    Etapa 2: dibuja la tarjeta (9cm ANCHO x 5cm ALTO) y pega el QR.
+    Las posiciones están definidas a 300 DPI y se escalan a `dpi`.
+    """
+    bg_color, text_color = (255, 255, 255), (0, 0, 0)
+    scale = dpi / BASE_DPI
+
+    def px(value):
+        return round(value * scale)
+
+    def at(position):
+        return px(position[0]), px(position[1])
+
+    # 1. INICIALIZACIÓN DEL LIENZO Y DRAW
+    card_width, card_height = px(CARD_WIDTH_PX), px(CARD_HEIGHT_PX)
+    card_img = Image.new('RGB', (card_width, card_height), bg_color)
+    draw = ImageDraw.Draw(card_img)
+
+    # 2. CONFIGURACIÓN DE FUENTES Y DIBUJO DE ENCABEZADO
+    draw.rectangle([0, 0, card_width, px(80)], fill=(191, 2, 2))
+    title_font, main_font, consecutive_font = load_fonts(scale)
+    draw.text(at((30, 25)), "TARJETA DE REGALO NOVILLO ALEGRE", fill=(255, 255, 255), font=title_font)
+
+    # 3. DIBUJO DE CONTENIDO
+    # Dibujar Promoción
+    draw.text(at((50, 150)), description, fill=text_color, font=main_font)
+
+    # Dibujar Válido hasta
+    draw.text(at(EXPIRATION_POSITION), f"Válido hasta: {expiration}", fill=(100, 100, 100), font=main_font)
+
+    # Dibujar Consecutivo (las tarjetas sin consecutivo, p. ej. de qr_utils, lo omiten)
+    if consecutive:
+        draw.text(at(CONSECUTIVE_POSITION), f"CONSECUTIVO: {consecutive}", fill=(0, 0, 0), font=consecutive_font)
+
+    # 4. PEGAR EL QR
+    # NEAREST conserva los módulos nítidos (sin grises en los bordes que ensucien la paleta o el 1 bit)
+    qr_scaled = qr_img.resize((px(QR_SIZE_PIXELS), px(QR_SIZE_PIXELS)), Image.NEAREST)
+    card_img.paste(qr_scaled, at(QR_POSITION))
+    return card_img
+
+
+def prepare_for_export(card_img, profile=None):
+    """Reduce la tarjeta RGB al modo de color del perfil (paleta sin tramado o 1 bit)."""
+    profile = get_export_profile(profile)
+    if profile['colors'] == 'palette':
+        return card_img.quantize(colors=profile['palette_colors'], method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+    if profile['colors'] == '1bit':
+        # Umbral fijo: el encabezado rojo y el texto gris quedan en negro, el título en blanco
+        return card_img.convert('L').convert('1', dither=Image.Dither.NONE)
+    return card_img
+
+
+def save_card(card_img, output_path, profile=None):
+    """Etapa 3: cuantiza y codifica la tarjeta según el perfil (ruta o archivo abierto)."""
+    profile = get_export_profile(profile)
+    image = prepare_for_export(card_img, profile)
+    image.save(output_path, format=profile['format'], dpi=(profile['dpi'], profile['dpi']), **profile['save_options'])
+    return output_path
+
+
+def create_qr_card(data_to_encode: str, output_path: str, description: str, expiration: str, consecutive: str,
+                   profile=None):
+    """
+    Genera una imagen de tarjeta (9cm ANCHO x 5cm ALTO) con el QR y el consecutivo,
+    a la resolución y en el formato del perfil de exportación (por defecto imprenta 300 DPI).
+    """
+    if not os.path.exists('generated_qrs'):
+        os.makedirs('generated_qrs')
+
+    profile = get_export_profile(profile)
+    qr_img = make_qr_image(data_to_encode)
+    card_img = compose_card(qr_img, description, expiration, consecutive, dpi=profile['dpi'])
+    return save_card(card_img, output_path, profile)
+
+
+def generate_pdf_from_images(image_paths, output_filename, profile=None):
+    """
+    Crea un PDF a partir de una lista de imágenes en formato 9x5 cm (filtro de imagen según el perfil).
+    Acepta rutas, archivos abiertos o imágenes PIL.
+    """
+    pdf = FPDF(orientation='L', unit='mm', format=(CARD_WIDTH_MM, CARD_HEIGHT_MM))
+    pdf.set_image_filter(get_export_profile(profile)['pdf_image_filter'])
+
+    for image_path in image_paths:
+        pdf.add_page()
+        pdf.image(image_path, x=0, y=0, w=CARD_WIDTH_MM, h=CARD_HEIGHT_MM)
+
+    pdf.output(output_filename)
+    return output_filename
+
+
+def generate_design_template(output_filename):
+    """Genera una plantilla de PDF con espacio blanco para el arte, QR y consecutivo (9x5 cm)."""
+    pdf = FPDF(orientation='L', unit='mm', format=(CARD_WIDTH_MM, CARD_HEIGHT_MM))
+    pdf.add_page()
+
+    pdf.set_font("Arial", "B", 8)
+    pdf.cell(CARD_WIDTH_MM, 5, "PLANTILLA DE DISEÑO (9x5 CM)", 0, 1, 'C')
+
+    QR_POS_X_MM = 65
+    QR_POS_Y_MM = 15
+
+    pdf.set_fill_color(255, 255, 255)
+    pdf.rect(QR_POS_X_MM, QR_POS_Y_MM, QR_SIZE_MM, QR_SIZE_MM, 'F')
+
+    pdf.set_text_color(150, 150, 150)
+    pdf.set_font("Arial", "", 6)
+    pdf.set_xy(QR_POS_X_MM, QR_POS_Y_MM + 1)
+    pdf.multi_cell(QR_SIZE_MM, 2.5, "ESPACIO QR\n2.5x2.5 cm", 0, 'C')
+
+    pdf.output(output_filename)
@@ -0,0 +1,108 @@
+# coupon_archiver.py
+"""
+Archivo de cupones canjeados y vencidos de hace tiempo.
+
+Mueve de COUPONS a COUPONS_ARCHIVE los cupones canjeados o vencidos hace más
+de ARCHIVE_AFTER_DAYS días (180 por defecto) con archive_coupons() (ver
+migrations/008_coupon_archive.sql). Cada llamada mueve como mucho
+ARCHIVE_BATCH_SIZE cupones en una transacción corta; archive() repite hasta que
+no queden candidatos (o hasta ARCHIVE_MAX_BATCHES), con una pausa de
+ARCHIVE_PAUSE_SECONDS entre bloques para no competir con los canjes.
+
+Formas de ejecutarlo:
+
+- pg_cron en Supabase (ver el final de la migración 008).
+- python coupon_archiver.py --email ... --password ...  (cron / Programador de tareas).
+- Desde la app: maybe_archive() en la página de Reportes, en un hilo de fondo y
+  como mucho una vez cada ARCHIVE_INTERVAL_SECONDS por proceso, con el token del Admin.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+from storage import StorageError, get_backend
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 180))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 5000))
+ARCHIVE_MAX_BATCHES = int(os.environ.get('ARCHIVE_MAX_BATCHES', 200))
+ARCHIVE_PAUSE_SECONDS = float(os.environ.get('ARCHIVE_PAUSE_SECONDS', 0.5))
+ARCHIVE_INTERVAL_SECONDS = float(os.environ.get('ARCHIVE_INTERVAL_SECONDS', 86400))
+
+_last_archive = {'at': None, 'coupons': None, 'error': None}
+_lock = threading.Lock()
+_thread = None
+
+
+def archive(token: str = None, after_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE,
+            max_batches: int = ARCHIVE_MAX_BATCHES, pause: float = ARCHIVE_PAUSE_SECONDS, progress=None) -> int:
+    """Archiva por bloques y retorna la cantidad de cupones movidos (lanza StorageError si falla)."""
+    total = 0
+    for batch in range(max_batches):
+        moved = get_backend().rpc('archive_coupons', {'p_after_days': after_days, 'p_limit': batch_size},
+                                  token=token)
+        total += moved
+        if progress:
+            progress(batch + 1, total)
+        if moved < batch_size:
+            break
+        time.sleep(pause)
+    with _lock:
+        _last_archive.update(at=time.time(), coupons=total, error=None)
+    return total
+
+
+def _run(token: str, last):
+    try:
+        archive(token)
+    except Exception as e:
+        with _lock:
+            _last_archive.update(at=last, error=str(e))  # Reintentar en la próxima visita
+
+
+def maybe_archive(token: str = None) -> bool:
+    """Inicia el archivo en un hilo de fondo si pasó el intervalo; retorna True si lo inició."""
+    global _thread
+    with _lock:
+        last = _last_archive['at']
+        if (_thread is not None and _thread.is_alive()) or (
+                last is not None and time.time() - last < ARCHIVE_INTERVAL_SECONDS):
+            return False
+        _last_archive['at'] = time.time()  # Evita que dos sesiones lo inicien a la vez
+        _thread = threading.Thread(target=_run, args=(token, last), name='coupon-archiver', daemon=True)
+        _thread.start()
+    return True
+
+
+def last_archive() -> dict:
+    """{'at': epoch o None, 'coupons': movidos en la última ejecución, 'error': texto o None}."""
+    with _lock:
+        return dict(_last_archive)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mueve al archivo los cupones canjeados o vencidos de hace tiempo.')
+    parser.add_argument('--email', default=os.environ.get('SWEEPER_EMAIL'), help='Usuario Admin (o SWEEPER_EMAIL)')
+    parser.add_argument('--password', default=os.environ.get('SWEEPER_PASSWORD'), help='Contraseña (o SWEEPER_PASSWORD)')
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS, help='Antigüedad mínima (días desde el canje o vencimiento)')
+    parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, help='Cupones por transacción')
+    parser.add_argument('--max-batches', type=int, default=ARCHIVE_MAX_BATCHES, help='Bloques como máximo en esta ejecución')
+    parser.add_argument('--pause', type=float, default=ARCHIVE_PAUSE_SECONDS, help='Segundos entre bloques')
+    args = parser.parse_args()
+    if not args.email or not args.password:
+        parser.error('Se requieren --email y --password (o SWEEPER_EMAIL / SWEEPER_PASSWORD).')
+
+    try:
+        token = get_backend().sign_in(args.email, args.password)['access_token']
+        moved = archive(token, args.days, args.batch_size, args.max_batches, args.pause,
+                        progress=lambda batch, total: print(f'Bloque {batch}: {total} cupón(es) archivados'))
+    except StorageError as err:
+        print(f'Error al archivar: {err.message}', file=sys.stderr)
+        return 1
+    print(f'{moved} cupón(es) movidos al archivo.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+# coupon_codes.py
+"""
+Código compacto de cupón: el UUID del cupón (128 bits) en base32 Crockford,
+mayúsculas, más un dígito verificador Luhn mod 32. Resultado: 27 caracteres.
+
+Todos los símbolos pertenecen al modo alfanumérico de QR, así que el código
+cabe en un QR versión 2 con corrección Q (ver card_render), en lugar del QR
+versión 3 en modo byte que requiere el UUID de 36 caracteres en minúsculas.
+El alfabeto Crockford omite I, L, O y U para evitar confusiones al teclearlo.
+"""
+import uuid
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+_INDEX = {ch: i for i, ch in enumerate(ALPHABET)}
+# Sustituciones de Crockford para entradas tecleadas a mano.
+_ALIASES = {'I': '1', 'L': '1', 'O': '0'}
+
+BODY_LENGTH = 26   # ceil(128 / 5)
+CODE_LENGTH = BODY_LENGTH + 1
+
+
+def _check_char(body: str) -> str:
+    """Dígito verificador Luhn mod 32 sobre el cuerpo del código."""
+    factor, total = 2, 0
+    for ch in reversed(body):
+        addend = factor * _INDEX[ch]
+        factor = 1 if factor == 2 else 2
+        total += addend // 32 + addend % 32
+    return ALPHABET[(32 - total % 32) % 32]
+
+
+def encode_uuid(value) -> str:
+    """UUID -> 26 símbolos base32 Crockford (sin verificador)."""
+    number = uuid.UUID(str(value)).int
+    return ''.join(ALPHABET[(number >> (5 * i)) & 31] for i in reversed(range(BODY_LENGTH)))
+
+
+def decode_uuid(body: str) -> str:
+    """26 símbolos base32 Crockford -> UUID (texto). Lanza ValueError si no es válido."""
+    if len(body) != BODY_LENGTH or any(ch not in _INDEX for ch in body):
+        raise ValueError("Identificador base32 mal formado.")
+    number = 0
+    for ch in body:
+        number = (number << 5) | _INDEX[ch]
+    if number >> 128:
+        raise ValueError("El código no corresponde a un UUID.")
+    return str(uuid.UUID(int=number))
+
+
+def encode_coupon_id(coupon_id) -> str:
+    """Convierte el UUID de un cupón en su código compacto de 27 caracteres."""
+    body = encode_uuid(coupon_id)
+    return body + _check_char(body)
+
+
+def normalize_code(code: str) -> str:
+    """Mayúsculas, sin espacios ni guiones y con los alias de Crockford aplicados."""
+    cleaned = str(code).strip().upper().replace('-', '').replace(' ', '')
+    return ''.join(_ALIASES.get(ch, ch) for ch in cleaned)
+
+
+def decode_coupon_code(code: str) -> str:
+    """
+    Retorna el UUID (texto) codificado en `code`.
+    Lanza ValueError si el código está mal formado o el verificador no coincide.
+    """
+    normalized = normalize_code(code)
+    if len(normalized) != CODE_LENGTH:
+        raise ValueError(f"El código debe tener {CODE_LENGTH} caracteres.")
+    body, check = normalized[:-1], normalized[-1]
+    if any(ch not in _INDEX for ch in normalized):
+        raise ValueError("El código contiene caracteres no válidos.")
+    if _check_char(body) != check:
+        raise ValueError("Dígito verificador inválido.")
+    return decode_uuid(body)
+
+
+def is_valid_code(code: str) -> bool:
+    """True si `code` es un código compacto bien formado."""
+    try:
+        decode_coupon_code(code)
+        return True
+    except ValueError:
+        return False
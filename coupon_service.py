@@ -0,0 +1,620 @@
+# coupon_service.py
+"""
+Servicios de datos maestros, lotes, cupones y reportes, sin Streamlit.
+
+Cada función recibe un RequestContext (token, usuario, sucursal) y lanza
+ServiceError con un mensaje apto para mostrar; no lee st.session_state ni
+escribe en la página. db_service es el adaptador de Streamlit sobre este
+módulo; los CLIs, los hilos de fondo y load_test lo usan directamente, así
+que puede correr en pools de hilos o procesos.
+"""
+import heapq
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import coupon_codes
+import qr_signing
+import write_outbox
+from request_context import AlreadyExists, RequestContext, ServiceError
+from storage import StorageError, get_backend, parse_filters
+
+
+@contextmanager
+def _errors(message: str, unexpected: str = None):
+    """Traduce errores del backend a ServiceError con el prefijo indicado."""
+    try:
+        yield
+    except ServiceError:
+        raise
+    except StorageError as err:
+        raise ServiceError(f"{message}: {err.message}") from err
+    except Exception as e:
+        raise ServiceError(f"{unexpected or message}: {e}") from e
+
+
+# =================================================================
+# 1. LECTURA Y CRUD GENÉRICO
+# =================================================================
+
+def list_table(ctx: RequestContext, table_name: str, select_params: str = '*'):
+    """Filas de una tabla (select_params admite filtros extra: '*&id=eq.5'). Solo lectura: puede venir de la caché."""
+    select, _, extra = select_params.partition('&')
+    with _errors(f"Error al cargar datos de {table_name}"):
+        # Revalidación por ETag: si no cambió, el backend reutiliza el resultado anterior (solo lectura)
+        rows, _ = get_backend().select(table_name, select, parse_filters(extra), token=ctx.token, cache=True)
+    return rows
+
+
+PAGE_SIZE = 25
+
+def _search_filter(search: str, search_columns: tuple):
+    """Construye el filtro ilike (una columna) u or=(...) (varias), como par (clave, valor)."""
+    if len(search_columns) == 1:
+        return search_columns[0], f"ilike.*{search}*"
+    # Dentro de or=(...) el valor va entre comillas para tolerar comas y paréntesis.
+    value = search.replace('\\', '\\\\').replace('"', '\\"')
+    conditions = ",".join(f'{col}.ilike."*{value}*"' for col in search_columns)
+    return 'or', f"({conditions})"
+
+def get_page(ctx: RequestContext, table_name: str, select_params: str = '*', search: str = None,
+             search_columns: tuple = (), page: int = 1, page_size: int = PAGE_SIZE, order: str = 'id.asc',
+             filters: str = None):
+    """Una página con búsqueda ilike del lado del servidor (limit/offset con conteo exacto); retorna (filas, total)."""
+    query = parse_filters(filters)
+    if search and search_columns:
+        query.append(_search_filter(search, search_columns))
+    offset = (max(page, 1) - 1) * page_size
+    with _errors(f"Error al cargar datos de {table_name}"):
+        return get_backend().select(table_name, select_params, query, order=order, limit=page_size,
+                                    offset=offset, count=True, token=ctx.token)
+
+
+def create_entry(ctx: RequestContext, table_name: str, payload: dict) -> bool:
+    """Crea una fila. Retorna True si quedó en la cola local (se sincroniza en segundo plano)."""
+    ctx.require_auth()
+    if write_outbox.enabled():
+        _check_not_exists(ctx, table_name, payload)
+        write_outbox.enqueue_insert(table_name, [payload], ctx.token)
+        return True
+    with _errors(f"Error al crear en {table_name}", "Error inesperado al crear"):
+        get_backend().insert(table_name, [payload], token=ctx.token)
+    return False
+
+
+def _check_not_exists(ctx: RequestContext, table_name: str, payload: dict):
+    """Con la cola activa, rechaza de inmediato un dato maestro cuyo nombre ya existe (o ya está en cola)."""
+    if table_name not in write_outbox.NATURAL_KEY_TABLES:
+        return
+    column = write_outbox.CONFLICT_COLUMNS[table_name]
+    value = payload.get(column)
+    if value is None:
+        return
+    exists = write_outbox.is_pending(table_name, column, value)
+    # Con una eliminación en cola el servidor aún ve la fila: el envío decide si es duplicado
+    if not exists and not write_outbox.has_pending_delete(table_name):
+        try:
+            exists = bool(get_existing_keys(ctx, table_name, column, [value]))
+        except ServiceError:
+            pass  # Sin conexión: al enviarse, el duplicado queda fallido en la cola
+    if exists:
+        raise AlreadyExists(f"Error al crear en {table_name}: ya existe un registro con {column} '{value}'.")
+
+
+def update_entry(ctx: RequestContext, table_name: str, id_value, payload: dict, id_column: str = 'id') -> bool:
+    """Actualiza una fila por ID. Retorna True si quedó en la cola local."""
+    ctx.require_auth()
+    if write_outbox.enabled():
+        write_outbox.enqueue_update(table_name, f"{id_column}=eq.{id_value}", payload, ctx.token)
+        return True
+    with _errors(f"Error al actualizar en {table_name}"):
+        get_backend().update(table_name, [(id_column, f"eq.{id_value}")], payload, token=ctx.token)
+    return False
+
+
+def delete_entry(ctx: RequestContext, table_name: str, id_value, id_column: str = 'id') -> bool:
+    """Elimina una fila por ID. Retorna True si quedó en la cola local (en orden con las altas y ediciones)."""
+    ctx.require_auth()
+    if write_outbox.enabled():
+        write_outbox.enqueue_delete(table_name, f"{id_column}=eq.{id_value}", ctx.token)
+        return True
+    with _errors(f"Error al eliminar en {table_name}"):
+        get_backend().delete(table_name, [(id_column, f"eq.{id_value}")], token=ctx.token)
+    return False
+
+
+def _quote_list(values):
+    """Lista para filtros in.(...), con cada valor entre comillas."""
+    quoted = ",".join('"' + str(v).replace('\\', '\\\\').replace('"', '\\"') + '"' for v in values)
+    return f"({quoted})"
+
+def get_existing_keys(ctx: RequestContext, table_name: str, key_column: str, values: list):
+    """Retorna el subconjunto de `values` que ya existe en `key_column`."""
+    if not values:
+        return set()
+    with _errors(f"Error al consultar {table_name}"):
+        rows, _ = get_backend().select(table_name, key_column, [(key_column, f"in.{_quote_list(values)}")],
+                                       token=ctx.token)
+    return {row[key_column] for row in rows}
+
+
+def upsert_entries(ctx: RequestContext, table_name: str, rows: list, on_conflict: str,
+                   resolution: str = 'merge-duplicates'):
+    """
+    Inserta o actualiza varias filas en una sola petición (merge-duplicates sobre
+    la columna única `on_conflict`; con 'ignore-duplicates' las existentes no cambian).
+    """
+    ctx.require_auth()
+    with _errors(f"Error al guardar en {table_name}"):
+        get_backend().insert(table_name, rows, on_conflict=on_conflict, resolution=resolution, token=ctx.token)
+
+
+# --- ARCHIVO DE CUPONES ---
+# migrations/008_coupon_archive.sql mueve los canjeados y vencidos de hace tiempo a
+# COUPONS_ARCHIVE (ver coupon_archiver.py). Las lecturas van a COUPONS y consultan
+# el archivo solo cuando lo necesitan; sin la migración el archivo se ignora.
+
+ARCHIVE_TABLE = 'coupons_archive'
+
+def _select_archive(ctx: RequestContext, select: str, filters, **kwargs) -> list:
+    """El mismo select sobre el archivo; [] si la tabla no existe (migración 008 no aplicada)."""
+    try:
+        rows, _ = get_backend().select(ARCHIVE_TABLE, select, filters, token=ctx.token, **kwargs)
+    except StorageError as err:
+        if err.status == 404:
+            return []
+        raise
+    return rows
+
+def archive_watermark(ctx: RequestContext):
+    """creation_date del cupón archivado más reciente (None si el archivo está vacío)."""
+    with _errors("Error al consultar el archivo de cupones"):
+        rows = _select_archive(ctx, 'creation_date', [], order='creation_date.desc', limit=1, cache=True)
+    return rows[0]['creation_date'] if rows else None
+
+
+# =================================================================
+# 2. LOTES Y CUPONES
+# =================================================================
+
+def next_consecutive(ctx: RequestContext) -> int:
+    """Siguiente consecutivo libre (considera los cupones aún en la cola local)."""
+    # Sin respaldo al consecutivo 1: tras los reintentos del backend un fallo
+    # aquí es real, y numerar desde 1 duplicaría consecutivos ya impresos.
+    with _errors("Error al obtener consecutivo. Asegure que la tabla 'coupons' exista. Error"):
+        data, _ = get_backend().select('coupons', 'consecutive', order='consecutive.desc.nullslast', limit=1,
+                                       token=ctx.token)
+        # Un consecutivo archivado tampoco se reutiliza
+        archived = _select_archive(ctx, 'consecutive', [], order='consecutive.desc.nullslast', limit=1)
+    last_consecutive = max(data[0]['consecutive'] if data else 0, (archived[0]['consecutive'] or 0) if archived else 0)
+    if write_outbox.enabled():
+        last_consecutive = max(last_consecutive, write_outbox.pending_max('coupons', 'consecutive') or 0)
+    return last_consecutive + 1
+
+
+# --- ATRIBUTOS DEL LOTE ---
+# Desde migrations/007_batch_attributes.sql la promoción, los valores base, las
+# sucursales y el vencimiento se guardan una vez en BATCHES. En COUPONS esas
+# columnas quedan en NULL salvo que una operación por rango (o la emisión
+# inmediata) le dé a un cupón un valor propio, que tiene prioridad.
+
+BATCH_ATTRIBUTES = {  # columna de COUPONS -> columna de BATCHES
+    'promo_type_id': 'promo_type_id',
+    'branch_permissions': 'branch_ids',
+    'base_value_colones': 'base_value_colones',
+    'base_value_dolares': 'base_value_dolares',
+    'expiration_date': 'expiration_date',
+}
+BATCH_ATTRIBUTES_SELECT = ','.join(BATCH_ATTRIBUTES.values())
+
+def resolve_batch_attributes(coupon: dict, batch: dict) -> dict:
+    """Completa (en el mismo dict) los atributos en NULL del cupón con los de su lote."""
+    batch = batch or {}
+    for coupon_column, batch_column in BATCH_ATTRIBUTES.items():
+        if coupon.get(coupon_column) is None:
+            coupon[coupon_column] = batch.get(batch_column)
+    return coupon
+
+
+def build_coupon_rows(batch_id: str, start_consecutive: int, count: int, ids: list = None):
+    """Filas de COUPONS de un lote (id aleatorio, o los de `ids`, y código compacto derivado del id)."""
+    rows = []
+    for i in range(count):
+        coupon_uuid = ids[i] if ids else str(uuid.uuid4())
+        rows.append({
+            'id': coupon_uuid,
+            'code': coupon_codes.encode_coupon_id(coupon_uuid),
+            'batch_id': batch_id,
+            'consecutive': start_consecutive + i,
+        })
+    return rows
+
+
+# Cuando los cupones se envían desde la app (cola local o base sin la migración 006),
+# van en bloques: un lote de 100.000 no cabe en una sola petición razonable. Cada
+# bloque es un upsert sobre el id (generado aquí) que ignora duplicados, así que
+# http_client puede reintentarlo sin crear filas repetidas.
+COUPON_INSERT_CHUNK = 1000
+
+def _create_batch_in_database(ctx: RequestContext, count: int, description: str, promo_id: int, value_crc: float,
+                              value_usd: float, issuer_id: int, branch_ids: list, user_id: str,
+                              batch_name_prefix: str, expiration_date: str):
+    """
+    Lote y cupones con una sola llamada a create_coupon_batch() (migrations/006 y 007): la
+    petición lleva solo los parámetros del lote y la respuesta solo los ids en orden
+    de consecutivo. Lanza StorageError 404 si la función no existe.
+    No se reintenta (idempotent=False): cada llamada que llega a la base crea un lote nuevo.
+    """
+    try:
+        result = call_rpc(ctx, 'create_coupon_batch', {
+            'p_count': count,
+            'p_promo_id': promo_id,
+            'p_issuer_id': issuer_id,
+            'p_branch_ids': branch_ids,
+            'p_value_colones': value_crc,
+            'p_value_dolares': value_usd,
+            'p_expiration_date': expiration_date,
+            'p_batch_name_prefix': batch_name_prefix,
+            'p_description': description,
+            'p_created_by': user_id,
+        })
+    except StorageError as e:
+        if e.status is None:  # Sin respuesta (p. ej. tiempo agotado): la función pudo terminar en la base
+            raise StorageError(f"{e.message}. El lote pudo haberse creado: revíselo en 📦 Lotes antes de reintentar.") from e
+        raise
+    return build_coupon_rows(result['batch_id'], result['consecutive_start'], count, ids=result['ids'])
+
+
+def _create_batch_from_app(ctx: RequestContext, count: int, description: str, promo_id: int, value_crc: float,
+                           value_usd: float, issuer_id: int, branch_ids: list, user_id: str, batch_name_prefix: str,
+                           expiration_date: str, progress=None):
+    """Arma las filas en la app y las envía (o las encola) en bloques."""
+    start_consecutive = next_consecutive(ctx)
+    batch_uuid = str(uuid.uuid4())
+
+    # 1. Insertar Lote (BATCHES)
+    create_entry(ctx, 'batches', {
+        'id': batch_uuid,
+        'batch_name': f"{batch_name_prefix}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{batch_uuid[:4]}",
+        'json_qrs': {'count': count, 'promo_description': description},
+        'consecutive_start': start_consecutive,
+        'consecutive_end': start_consecutive + count - 1,
+        'branch_ids': branch_ids,
+        'expiration_date': expiration_date,
+        'issuer_id': issuer_id,
+        'created_by_user_id': user_id,
+        'promo_type_id': promo_id,
+        'base_value_colones': value_crc,
+        'base_value_dolares': value_usd,
+    })
+
+    # 2. Preparar e Insertar Cupones (COUPONS)
+    coupon_entries = build_coupon_rows(batch_uuid, start_consecutive, count)
+    if write_outbox.enabled():
+        write_outbox.enqueue_insert('coupons', coupon_entries, ctx.token)
+        return coupon_entries
+    for start in range(0, count, COUPON_INSERT_CHUNK):
+        get_backend().insert('coupons', coupon_entries[start:start + COUPON_INSERT_CHUNK], on_conflict='id',
+                             resolution='ignore-duplicates', token=ctx.token)
+        if progress:
+            progress(min(start + COUPON_INSERT_CHUNK, count), count)
+    return coupon_entries
+
+
+def create_coupon_batch(ctx: RequestContext, count: int, description: str, promo_id: int, value_crc: float,
+                        value_usd: float, issuer_id: int, valid_days: int, branch_names: list, user_id: str = None,
+                        batch_name_prefix: str = 'LOTE', signed: bool = False, progress=None):
+    """
+    Crea el lote (BATCHES) y sus cupones (COUPONS); retorna las filas de cupones.
+    Con signed=True cada cupón retornado incluye 'qr_payload' (ver qr_signing).
+    progress(insertados, total) informa el avance.
+    """
+    ctx.require_auth("Se requiere autenticación para crear el lote.")
+    with _errors("Error al generar lote", "Error inesperado en la creación del lote"):
+        # Preparar datos maestros
+        branch_options = {b['name']: b['id'] for b in list_table(ctx, 'branches')}
+        allowed_branch_ids = [branch_options[name] for name in branch_names if name in branch_options]
+        expiration_date = (datetime.now() + timedelta(days=valid_days)).strftime("%Y-%m-%d")
+        args = (ctx, count, description, promo_id, value_crc, value_usd, issuer_id, allowed_branch_ids,
+                user_id or ctx.user_id, batch_name_prefix, expiration_date)
+
+        # La cola local no puede ejecutar funciones de la base: ahí las filas se arman en la app
+        coupon_entries = None
+        if not write_outbox.enabled():
+            try:
+                coupon_entries = _create_batch_in_database(*args)
+                if progress:
+                    progress(count, count)
+            except StorageError as err:
+                if err.status != 404:
+                    raise  # 404: la migración 006 no está aplicada
+        if coupon_entries is None:
+            coupon_entries = _create_batch_from_app(*args, progress=progress)
+
+    # Las filas retornadas (para imprimir) llevan los atributos del lote aunque no se guarden por cupón
+    batch_attributes = {
+        'promo_type_id': promo_id,
+        'branch_permissions': allowed_branch_ids,
+        'base_value_colones': value_crc,
+        'base_value_dolares': value_usd,
+        'expiration_date': expiration_date,
+    }
+    coupon_entries = [{**entry, **batch_attributes} for entry in coupon_entries]
+
+    # Payload firmado para el QR (no se guarda: se deriva de id, lote y vencimiento)
+    if signed:
+        for entry in coupon_entries:
+            entry['qr_payload'] = qr_signing.sign_payload(entry['id'], entry['batch_id'], expiration_date)
+    return coupon_entries
+
+
+def get_batch(ctx: RequestContext, batch_id: str):
+    """Fila del lote (BATCHES) o None si no existe."""
+    with _errors("Error al cargar el lote"):
+        rows, _ = get_backend().select('batches', '*', [('id', f"eq.{batch_id}")], limit=1, token=ctx.token)
+    return rows[0] if rows else None
+
+
+def get_coupon(ctx: RequestContext, coupon_id: str, select: str = '*'):
+    """Fila de COUPONS o None si no existe (o ya pasó al archivo)."""
+    with _errors("Error al cargar el cupón"):
+        rows, _ = get_backend().select('coupons', select, [('id', f"eq.{coupon_id}")], limit=1, token=ctx.token)
+    return rows[0] if rows else None
+
+
+def iter_batch_coupons(ctx: RequestContext, batch_id: str, page_size: int = COUPON_INSERT_CHUNK):
+    """
+    Recorre los cupones del lote en orden de consecutivo, por páginas (keyset sobre
+    el consecutivo, sin offset), con el vencimiento ya resuelto contra el lote.
+    """
+    batch = get_batch(ctx, batch_id)
+    last = None
+    while True:
+        filters = [('batch_id', f"eq.{batch_id}")]
+        if last is not None:
+            filters.append(('consecutive', f"gt.{last}"))
+        with _errors("Error al cargar los cupones del lote"):
+            rows, _ = get_backend().select('coupons', 'id,code,batch_id,consecutive,expiration_date', filters,
+                                           order='consecutive.asc', limit=page_size, token=ctx.token)
+        for row in rows:
+            if row.get('expiration_date') is None:
+                row['expiration_date'] = (batch or {}).get('expiration_date')
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last = rows[-1]['consecutive']
+
+
+# --- ESTADO DEL CUPÓN ---
+# Columna precalculada (migrations/005_coupon_status.sql): los filtros de reportes y
+# la validación usan una igualdad indexada en lugar de comparar fechas por fila.
+
+STATUS_LABELS = {
+    'active': "⏳ Pendiente",
+    'redeemed': "✅ Canjeado",
+    'expired': "⌛ Expirado",
+    'void': "🚫 Anulado",
+}
+
+def coupon_status(coupon: dict) -> str:
+    """Estado del cupón; un activo ya vencido cuenta como expirado aunque el barrido no haya corrido."""
+    status = coupon.get('status') or (
+        'void' if coupon.get('is_void') else 'redeemed' if coupon.get('is_redeemed') else 'active'
+    )
+    expiration = str(coupon.get('expiration_date') or '')[:10]
+    if status == 'active' and expiration and expiration < datetime.now().date().isoformat():
+        return 'expired'
+    return status
+
+
+def coupon_for_scan(ctx: RequestContext, scanned_text: str):
+    """
+    Resuelve el texto leído de un QR al cupón correspondiente.
+    La firma de los payloads firmados se verifica localmente antes de consultar el
+    backend, así que los códigos falsos no generan tráfico. El vencimiento se decide
+    con la fila: el impreso en el QR queda viejo si el lote se extiende.
+    Retorna (cupón o None, mensaje): un cupón inválido no es un error del servicio.
+    """
+    text = scanned_text.strip()
+
+    if qr_signing.is_signed_payload(text.upper()):
+        if not qr_signing.signing_enabled():
+            return None, "QR firmado, pero QR_SIGNING_KEY no está configurada."
+        try:
+            coupon_id = qr_signing.verify_payload(text, check_expiry=False).coupon_id
+        except qr_signing.InvalidPayload as e:
+            return None, str(e)
+    elif coupon_codes.is_valid_code(text):
+        coupon_id = coupon_codes.decode_coupon_code(text)
+    else:
+        try:
+            coupon_id = str(uuid.UUID(text))  # QRs anteriores con el UUID
+        except ValueError:
+            return None, "Código QR no reconocido."
+
+    select, filters = f"*,batch:batch_id({BATCH_ATTRIBUTES_SELECT})", [('id', f"eq.{coupon_id}")]
+    try:
+        data, _ = get_backend().select('coupons', select, filters, limit=1, token=ctx.token)
+        if not data:
+            data = _select_archive(ctx, select, filters, limit=1)  # Canjeado o vencido hace tiempo
+    except Exception as e:
+        return None, f"Error al consultar el cupón: {e}"
+    if not data:
+        return None, "El cupón no existe."
+    resolve_batch_attributes(data[0], data[0].pop('batch'))
+    status = coupon_status(data[0])
+    if status == 'void':
+        return None, "El cupón fue anulado."
+    if status == 'expired':
+        return None, f"El cupón venció el {str(data[0]['expiration_date'])[:10]}."
+    return data[0], "OK"
+
+
+# --- OPERACIONES POR LOTE ---
+# PostgREST no puede actualizar COUPONS y BATCHES en un mismo PATCH, así que cada
+# operación es una función de Postgres (migrations/003_batch_operations.sql): un solo
+# UPDATE filtrado por batch_id (y rango de consecutivos) más la fila del lote, en una
+# transacción. Anular 50.000 tarjetas cuesta una petición. Los cupones ya canjeados o
+# anulados no se modifican.
+
+def call_rpc(ctx: RequestContext, function_name: str, params: dict, idempotent: bool = False):
+    """
+    Ejecuta una función de base de datos y retorna su resultado (lanza StorageError si falla).
+    idempotent=True permite reintentarla (solo para funciones convergentes, como las de lote).
+    """
+    return get_backend().rpc(function_name, params, token=ctx.token, idempotent=idempotent)
+
+def _batch_operation(ctx: RequestContext, function_name: str, batch_id: str, params: dict,
+                     consecutive_from: int = None, consecutive_to: int = None) -> int:
+    """Retorna la cantidad de cupones afectados."""
+    payload = {'p_batch_id': batch_id, 'p_consecutive_from': consecutive_from, 'p_consecutive_to': consecutive_to, **params}
+    with _errors("Error en la operación del lote", "Error inesperado en la operación del lote"):
+        return call_rpc(ctx, function_name, payload, idempotent=True)
+
+def void_batch(ctx: RequestContext, batch_id: str, consecutive_from: int = None, consecutive_to: int = None):
+    """Anula los cupones pendientes del lote (o del rango de consecutivos)."""
+    return _batch_operation(ctx, 'batch_void', batch_id, {}, consecutive_from, consecutive_to)
+
+def extend_batch_expiration(ctx: RequestContext, batch_id: str, new_expiration_date,
+                            consecutive_from: int = None, consecutive_to: int = None):
+    """Cambia la fecha de vencimiento de los cupones pendientes del lote (o del rango)."""
+    params = {'p_expiration_date': str(new_expiration_date)[:10]}
+    return _batch_operation(ctx, 'batch_extend', batch_id, params, consecutive_from, consecutive_to)
+
+def set_batch_branches(ctx: RequestContext, batch_id: str, branch_ids: list,
+                       consecutive_from: int = None, consecutive_to: int = None):
+    """Reemplaza las sucursales permitidas de los cupones pendientes del lote (o del rango)."""
+    params = {'p_branch_ids': [int(b) for b in branch_ids]}
+    return _batch_operation(ctx, 'batch_set_branches', batch_id, params, consecutive_from, consecutive_to)
+
+
+# =================================================================
+# 3. REPORTES
+# =================================================================
+
+# --- BÚSQUEDA RÁPIDA DE CUPONES ---
+# Cada criterio se traduce a una condición que usa un índice (ver
+# migrations/004_coupon_lookup_indexes.sql) y todas van en un solo or=(...), así
+# que la consulta no recorre la tabla aunque tenga millones de cupones.
+
+LOOKUP_LIMIT = 20
+LOOKUP_MIN_PREFIX = 6
+LOOKUP_SELECT = (
+    "id,code,consecutive,status,is_redeemed,is_void,redemption_date,invoice_number,expiration_date,"
+    "base_value_colones,base_value_dolares,"
+    f"batch:batch_id(batch_name,{BATCH_ATTRIBUTES_SELECT},issuer:issuers(issuer_name),promo:promo_type_id(type_name)),"
+    "promo:promo_type_id(type_name),"
+    "branch:redemption_branch_id(name),"
+    "cashier:redeemed_by_user_id(username)"
+)
+_HEX_DIGITS = set('0123456789abcdef')
+_MAX_CONSECUTIVE = 2 ** 31 - 1  # coupons.consecutive es integer: un número mayor haría fallar la consulta (400)
+
+def _uuid_prefix_range(prefix: str):
+    """'3f2a9c' -> ('3f2a9c00-0000-...', '3f2a9cff-ffff-...'): rango sobre la llave primaria."""
+    def as_uuid(hex_text):
+        return f"{hex_text[:8]}-{hex_text[8:12]}-{hex_text[12:16]}-{hex_text[16:20]}-{hex_text[20:]}"
+    return as_uuid(prefix.ljust(32, '0')), as_uuid(prefix.ljust(32, 'f'))
+
+def _lookup_conditions(query: str):
+    """Condiciones de PostgREST (para or=(...)) que corresponden al texto buscado."""
+    text = query.strip()
+    conditions = [f'invoice_number.eq."{text.replace(chr(34), "")}"']
+    if text.isascii() and text.isdigit() and int(text) <= _MAX_CONSECUTIVE:
+        # Un número puede ser el consecutivo impreso; también se busca como factura y como prefijo de ID o código
+        conditions.insert(0, f"consecutive.eq.{int(text)}")
+
+    hex_prefix = text.lower().replace('-', '')
+    if LOOKUP_MIN_PREFIX <= len(hex_prefix) <= 32 and set(hex_prefix) <= _HEX_DIGITS:
+        low, high = _uuid_prefix_range(hex_prefix)
+        conditions.append(f"and(id.gte.{low},id.lte.{high})")
+    code_prefix = coupon_codes.normalize_code(text)
+    if LOOKUP_MIN_PREFIX <= len(code_prefix) <= coupon_codes.CODE_LENGTH and all(ch in coupon_codes.ALPHABET for ch in code_prefix):
+        conditions.append(f"code.like.{code_prefix}*")
+    return conditions
+
+def lookup_coupons(ctx: RequestContext, query: str, limit: int = LOOKUP_LIMIT):
+    """
+    Busca cupones por consecutivo, número de factura, prefijo del ID (UUID) o
+    prefijo del código impreso. Retorna filas con el lote, emisor, promoción y
+    datos de canje ya aplanados.
+    """
+    filters = [('or', f"({','.join(_lookup_conditions(query))})")]
+    with _errors("Error en la búsqueda", "Error inesperado en la búsqueda"):
+        rows, _ = get_backend().select('coupons', LOOKUP_SELECT, filters, order='consecutive.asc', limit=limit,
+                                       token=ctx.token)
+        # El archivo solo se consulta si el cupón no está entre los vigentes
+        archived = not rows
+        if archived:
+            rows = _select_archive(ctx, LOOKUP_SELECT, filters, order='consecutive.asc', limit=limit)
+
+    results = []
+    for row in rows:
+        batch = row.pop('batch') or {}
+        resolve_batch_attributes(row, batch)
+        results.append({
+            **row,
+            'archived': archived,
+            'batch': batch.get('batch_name'),
+            'issuer': (batch.get('issuer') or {}).get('issuer_name'),
+            'promo': (row.pop('promo') or batch.get('promo') or {}).get('type_name'),
+            'branch': (row.pop('branch') or {}).get('name'),
+            'cashier': (row.pop('cashier') or {}).get('username'),
+        })
+    return results
+
+
+REPORT_SELECT = (
+    "id,consecutive,status,is_redeemed,redemption_date,invoice_number,creation_date,"
+    "batch_id(issuer:issuers(issuer_name)),"
+    "redemption_branch_id(name),"
+    "redeemed_by_user_id(username)"
+)
+REPORT_COLUMNS = ['id', 'consecutive', 'status', 'is_redeemed', 'redemption_date', 'invoice_number',
+                  'Redemption Branch', 'Redeemed By', 'Issuer']
+
+def report_needs_archive(ctx: RequestContext, filters: str) -> bool:
+    """
+    True si el filtro puede incluir cupones archivados. El archivo solo tiene
+    canjeados y expirados, todos creados antes de su creation_date más reciente:
+    hace falta con una fecha "desde" (creation_date=gte./gt.) que no sea posterior
+    a esa. Sin fecha "desde" el reporte cubre solo los cupones vigentes.
+    """
+    since = None
+    for column, expression in parse_filters(filters):
+        if column == 'status' and expression in ('eq.active', 'eq.void'):
+            return False
+        if column == 'creation_date' and expression.startswith(('gte.', 'gt.')):
+            since = expression.split('.', 1)[1]
+    if since is None:
+        return False
+    newest = archive_watermark(ctx)
+    return newest is not None and since <= str(newest)
+
+def activity_report(ctx: RequestContext, filters: str):
+    """
+    Filas del reporte de actividad (columnas REPORT_COLUMNS) con los joins ya
+    aplanados, de COUPONS y, si el filtro de fecha lo requiere, del archivo.
+    """
+    query = parse_filters(filters)
+    with _errors("Error al cargar el reporte", "Error inesperado al cargar el reporte"):
+        data, _ = get_backend().select('coupons', REPORT_SELECT, query, order='creation_date.desc',
+                                       token=ctx.token, cache=True)
+        if report_needs_archive(ctx, filters):
+            archived = _select_archive(ctx, REPORT_SELECT, query, order='creation_date.desc', cache=True)
+            data = heapq.merge(data, archived, key=lambda row: row['creation_date'] or '', reverse=True)
+    # Filas nuevas: el resultado del backend puede estar compartido por la caché condicional
+    return [
+        {
+            'id': row['id'],
+            'consecutive': row['consecutive'],
+            'status': row.get('status'),
+            'is_redeemed': bool(row['is_redeemed']),
+            'redemption_date': row['redemption_date'],
+            'invoice_number': row['invoice_number'],
+            'Redemption Branch': (row['redemption_branch_id'] or {}).get('name', 'N/A'),
+            'Redeemed By': (row['redeemed_by_user_id'] or {}).get('username', 'N/A'),
+            'Issuer': ((row['batch_id'] or {}).get('issuer') or {}).get('issuer_name', 'N/A'),
+        }
+        for row in data
+    ]
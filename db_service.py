@@ -1,12 +1,17 @@
 # db_service.py
-import requests
+# Adaptador de Streamlit sobre coupon_service: arma el contexto de la sesión,
+# llama al servicio y muestra sus errores con st.error.
 import streamlit as st
-import pandas as pd
-import json
-import uuid  # <-- ¡CORRECCIÓN FINAL: Importación de UUID para la creación de lotes!
 import auth 
-from db_config import POSTGREST_ENDPOINT, get_headers
-from datetime import datetime, timedelta
+import coupon_service
+import write_outbox
+from coupon_service import (  # noqa: F401  (nombres públicos usados por las páginas)
+    LOOKUP_LIMIT, LOOKUP_MIN_PREFIX, PAGE_SIZE, STATUS_LABELS, coupon_status,
+)
+from request_context import ServiceError, from_session
+
+if write_outbox.enabled():
+    write_outbox.start_flusher()  # Envía lo que haya quedado pendiente de una ejecución anterior
 
 
 # =================================================================
@@ -14,17 +19,11 @@ from datetime import datetime, timedelta
 # =================================================================
 
 def get_data_table(table_name: str, select_params: str = '*'):
-    """Obtiene datos de una tabla específica."""
-    
-    token = st.session_state.get('token')
-    url = f"{POSTGREST_ENDPOINT}/{table_name}?select={select_params}"
-    
+    """Obtiene datos de una tabla específica (select_params admite filtros extra: '*&id=eq.5')."""
     try:
-        response = requests.get(url, headers=get_headers(token))
-        response.raise_for_status() 
-        return response.json()
-    except Exception as e:
-        st.error(f"Error al cargar datos de {table_name}: {e}")
+        return coupon_service.list_table(from_session(), table_name, select_params)
+    except ServiceError as e:
+        st.error(e.message)
         return []
 
 def get_branches():
@@ -44,30 +43,32 @@ def get_promos():
     return get_data_table('promos')
 
 
+# --- LECTURA PAGINADA Y BÚSQUEDA ---
+
+def get_data_page(table_name: str, select_params: str = '*', search: str = None, search_columns: tuple = (),
+                  page: int = 1, page_size: int = PAGE_SIZE, order: str = 'id.asc', filters: str = None):
+    """
+    Obtiene una página de una tabla con búsqueda ilike del lado del servidor
+    (limit/offset con conteo exacto); retorna (filas, total).
+    """
+    try:
+        return coupon_service.get_page(from_session(), table_name, select_params, search, search_columns,
+                                       page, page_size, order, filters)
+    except ServiceError as e:
+        st.error(e.message)
+        return [], 0
+
+
 # --- CREATE ---
 
 def create_entry(table_name: str, payload: dict):
     """Función genérica para crear una entrada en cualquier tabla."""
-    url = f"{POSTGREST_ENDPOINT}/{table_name}"
-    
-    token = st.session_state.get('token') 
-    if not token:
-        st.error("Se requiere autenticación para esta acción.")
-        return False
-        
     try:
-        headers = get_headers(token)
-        headers['Prefer'] = 'return=representation' 
-        
-        response = requests.post(url, headers=headers, data=json.dumps(payload))
-        response.raise_for_status()
-        
+        if coupon_service.create_entry(from_session(), table_name, payload):
+            st.toast("Guardado localmente; se sincronizará en segundo plano.")
         return True
-    except requests.exceptions.HTTPError as err:
-        st.error(f"Error al crear en {table_name}: {err.response.json().get('message', str(err))}")
-        return False
-    except Exception as e:
-        st.error(f"Error inesperado al crear: {e}")
+    except ServiceError as e:
+        st.error(e.message)
         return False
 
 
@@ -100,42 +101,44 @@ def create_promo(type_name: str, is_percentage: bool, is_cash_value: bool, is_pr
         return True
     return False
 
+def get_existing_keys(table_name: str, key_column: str, values: list):
+    """Retorna el subconjunto de `values` que ya existe en `key_column` (lanza ServiceError si falla)."""
+    return coupon_service.get_existing_keys(from_session(), table_name, key_column, values)
+
+def upsert_entries(table_name: str, rows: list, on_conflict: str, resolution: str = 'merge-duplicates'):
+    """
+    Inserta o actualiza varias filas en una sola petición
+    (resolution=merge-duplicates sobre la columna única `on_conflict`;
+    con resolution='ignore-duplicates' las filas existentes no se modifican).
+    Retorna (True, None) o (False, mensaje de error).
+    """
+    try:
+        coupon_service.upsert_entries(from_session(), table_name, rows, on_conflict, resolution)
+        return True, None
+    except ServiceError as e:
+        return False, e.message
+
 # --- UPDATE ---
 
 def update_entry(table_name: str, id_value: any, payload: dict, id_column: str = 'id'):
     """Función genérica para actualizar una entrada por ID."""
-    token = st.session_state.get('token')
-    if not token:
-        st.error("Se requiere autenticación para esta acción.")
-        return False
-
-    url = f"{POSTGREST_ENDPOINT}/{table_name}?{id_column}=eq.{id_value}"
-    
     try:
-        response = requests.patch(url, headers=get_headers(token), data=json.dumps(payload))
-        response.raise_for_status()
+        coupon_service.update_entry(from_session(), table_name, id_value, payload, id_column)
         return True
-    except requests.exceptions.HTTPError as err:
-        st.error(f"Error al actualizar en {table_name}: {err.response.json().get('message', str(err))}")
+    except ServiceError as e:
+        st.error(e.message)
         return False
 
 # --- DELETE ---
 
 def delete_entry(table_name: str, id_value: any, id_column: str = 'id'):
     """Función genérica para eliminar una entrada por ID."""
-    token = st.session_state.get('token')
-    if not token:
-        st.error("Se requiere autenticación para esta acción.")
-        return False
-
-    url = f"{POSTGREST_ENDPOINT}/{table_name}?{id_column}=eq.{id_value}"
-    
     try:
-        response = requests.delete(url, headers=get_headers(token))
-        response.raise_for_status()
+        if coupon_service.delete_entry(from_session(), table_name, id_value, id_column):
+            st.toast("Eliminación registrada localmente; se sincronizará en segundo plano.")
         return True
-    except requests.exceptions.HTTPError as err:
-        st.error(f"Error al eliminar en {table_name}: {err.response.json().get('message', str(err))}")
+    except ServiceError as e:
+        st.error(e.message)
         return False
 
 # =================================================================
@@ -144,145 +147,238 @@ def delete_entry(table_name: str, id_value: any, id_column: str = 'id'):
 
 def get_next_consecutive():
     """Obtiene el último consecutivo usado para los cupones y retorna el siguiente."""
-    token = st.session_state.get('token')
-    
-    # 1. Obtener el último consecutivo usado en la tabla COUPONS
-    url = f"{POSTGREST_ENDPOINT}/coupons?select=consecutive&order=consecutive.desc&limit=1"
-    
     try:
-        response = requests.get(url, headers=get_headers(token))
-        response.raise_for_status()
-        data = response.json()
-        
-        last_consecutive = data[0]['consecutive'] if data else 0
-        return last_consecutive + 1
-    except Exception as e:
-        # st.error(f"Error al obtener consecutivo. Asegure que la tabla 'coupons' exista. Error: {e}")
-        return 1 # Fallback al consecutivo 1
-
-def create_coupon_batch(count: int, description: str, promo_id: int, value_crc: float, value_usd: float, issuer_id: int, valid_days: int, branch_names: list, user_id: str, batch_name_prefix: str):
-    """Genera un lote completo de cupones, insertando en BATCHES y COUPONS."""
-    token = st.session_state.get('token')
-    if not token: 
-        st.error("Se requiere autenticación para crear el lote.")
+        return coupon_service.next_consecutive(from_session())
+    except ServiceError as e:
+        st.error(e.message)
         return None
 
+def create_coupon_batch(count: int, description: str, promo_id: int, value_crc: float, value_usd: float, issuer_id: int, valid_days: int, branch_names: list, user_id: str, batch_name_prefix: str, signed: bool = False):
+    """
+    Genera un lote completo de cupones, insertando en BATCHES y COUPONS.
+    Con signed=True cada cupón retornado incluye 'qr_payload' (ver qr_signing).
+    """
     try:
-        # 1. Preparar datos maestros
-        branches = get_branches()
-        branch_options = {b['name']: b['id'] for b in branches}
-        allowed_branch_ids = [branch_options[name] for name in branch_names if name in branch_options]
-        
-        start_consecutive = get_next_consecutive()
-        end_consecutive = start_consecutive + count - 1
-        batch_uuid = str(uuid.uuid4())
-        expiration_date = (datetime.now() + timedelta(days=valid_days)).strftime("%Y-%m-%d")
-
-        # 2. Insertar Lote (BATCHES)
-        batch_payload = {
-            'id': batch_uuid,
-            'batch_name': f"{batch_name_prefix}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{batch_uuid[:4]}",
-            'json_qrs': {'count': count, 'promo_description': description},
-            'consecutive_start': start_consecutive,
-            'consecutive_end': end_consecutive,
-            'branch_ids': allowed_branch_ids,
-            'expiration_date': expiration_date,
-            'issuer_id': issuer_id,
-            'created_by_user_id': user_id
-        }
-        if not create_entry('batches', batch_payload):
-            raise Exception("Fallo al crear el lote (BATCHES).")
-
-        # 3. Preparar e Insertar Cupones (COUPONS)
-        coupon_entries = []
-        for i in range(count):
-            coupon_uuid = str(uuid.uuid4())
-            consecutive = start_consecutive + i
-            coupon_entries.append({
-                'id': coupon_uuid,
-                'batch_id': batch_uuid,
-                'consecutive': consecutive,
-                'promo_type_id': promo_id,
-                'branch_permissions': allowed_branch_ids,
-                'base_value_colones': value_crc,
-                'base_value_dolares': value_usd,
-                'expiration_date': expiration_date
-            })
-        
-        coupon_url = f"{POSTGREST_ENDPOINT}/coupons"
-        coupon_response = requests.post(coupon_url, headers=get_headers(token), data=json.dumps(coupon_entries))
-        coupon_response.raise_for_status()
+        return coupon_service.create_coupon_batch(
+            from_session(), count, description, promo_id, value_crc, value_usd, issuer_id, valid_days,
+            branch_names, user_id, batch_name_prefix, signed,
+        )
+    except ServiceError as e:
+        st.error(e.message)
+        return None
 
-        return coupon_entries
 
-    except requests.exceptions.HTTPError as err:
-        st.error(f"Error al generar lote: {err.response.json().get('message', str(err))}")
-        return None
-    except Exception as e:
-        st.error(f"Error inesperado en la creación del lote: {e}")
+def get_coupon_for_scan(scanned_text: str):
+    """Resuelve el texto leído de un QR al cupón correspondiente; retorna (cupón o None, mensaje)."""
+    return coupon_service.coupon_for_scan(from_session(), scanned_text)
+
+
+# --- OPERACIONES POR LOTE ---
+# Ver coupon_service: cada operación es una sola llamada a una función de Postgres.
+
+def call_rpc(function_name: str, params: dict, idempotent: bool = False):
+    """Ejecuta una función de base de datos y retorna su resultado (lanza StorageError si falla)."""
+    return coupon_service.call_rpc(from_session(), function_name, params, idempotent=idempotent)
+
+def _batch_operation(operation, *args, **kwargs):
+    """Retorna la cantidad de cupones afectados, o None si la operación falló."""
+    try:
+        return operation(from_session(), *args, **kwargs)
+    except ServiceError as e:
+        st.error(e.message)
         return None
 
+def void_batch(batch_id: str, consecutive_from: int = None, consecutive_to: int = None):
+    """Anula los cupones pendientes del lote (o del rango de consecutivos)."""
+    return _batch_operation(coupon_service.void_batch, batch_id, consecutive_from, consecutive_to)
+
+def extend_batch_expiration(batch_id: str, new_expiration_date, consecutive_from: int = None, consecutive_to: int = None):
+    """Cambia la fecha de vencimiento de los cupones pendientes del lote (o del rango)."""
+    return _batch_operation(coupon_service.extend_batch_expiration, batch_id, new_expiration_date, consecutive_from, consecutive_to)
+
+def set_batch_branches(batch_id: str, branch_ids: list, consecutive_from: int = None, consecutive_to: int = None):
+    """Reemplaza las sucursales permitidas de los cupones pendientes del lote (o del rango)."""
+    return _batch_operation(coupon_service.set_batch_branches, batch_id, branch_ids, consecutive_from, consecutive_to)
+
 
 # =================================================================
 # 3. FUNCIONES DE REPORTES
 # =================================================================
 
-def get_activity_report(filters: str):
-    """Obtiene el reporte de actividad de cupones con joins para mostrar en la tabla."""
-    token = st.session_state.get('token')
-    
-    # Sintaxis de SELECT corregida para evitar errores 400 y de relación.
-    select_params = (
-        "id,consecutive,is_redeemed,redemption_date,invoice_number,creation_date,"
-        "batch_id(issuer:issuers(issuer_name)),"
-        "redemption_branch_id(name),"
-        "redeemed_by_user_id(username)"
-    )
-    
-    select_params = select_params.replace(' ', '')
+def lookup_coupons(query: str, limit: int = LOOKUP_LIMIT):
+    """
+    Busca cupones por consecutivo, número de factura, prefijo del ID (UUID) o
+    prefijo del código impreso (ver coupon_service.lookup_coupons).
+    """
+    try:
+        return coupon_service.lookup_coupons(from_session(), query, limit)
+    except ServiceError as e:
+        st.error(e.message)
+        return []
 
-    url = f"{POSTGREST_ENDPOINT}/coupons?select={select_params}"
 
-    all_params = []
-    if filters:
-        all_params.append(filters)
-        
-    all_params.append("order=creation_date.desc")
+def get_archive_status(filters: str):
+    """(creation_date del cupón archivado más reciente o None, True si el reporte con `filters` incluye el archivo)."""
+    try:
+        ctx = from_session()
+        return coupon_service.archive_watermark(ctx), coupon_service.report_needs_archive(ctx, filters)
+    except ServiceError as e:
+        st.error(e.message)
+        return None, False
 
-    url_final = url + "&" + "&".join(all_params)
 
-    try:
-        response = requests.get(url_final, headers=get_headers(token))
-        response.raise_for_status()
-        data = response.json()
-        
-        if data:
-            df = pd.DataFrame(data)
-            
-            # Aplanamiento de datos
-            df['Redemption Branch'] = df['redemption_branch_id'].apply(lambda x: x['name'] if x else 'N/A')
-            df['Redeemed By'] = df['redeemed_by_user_id'].apply(lambda x: x['username'] if x else 'N/A')
-            df['Issuer'] = df['batch_id'].apply(lambda x: x['issuer']['issuer_name'] if x and x['issuer'] else 'N/A')
-            
-            df['is_redeemed'] = df['is_redeemed'].astype(bool)
+def get_activity_report(filters: str):
+    """Obtiene el reporte de actividad de cupones con joins para mostrar en la tabla."""
+    import pandas as pd  # Diferido: solo el módulo de Reportes lo necesita
 
-            return df[['id', 'consecutive', 'is_redeemed', 'redemption_date', 'invoice_number', 'Redemption Branch', 'Redeemed By', 'Issuer']]
-        
-        return pd.DataFrame()
-        
-    except requests.exceptions.HTTPError as e:
+    try:
+        rows = coupon_service.activity_report(from_session(), filters)
+    except ServiceError as e:
         # Registra el error pero devuelve DataFrame vacío para evitar NameError en app.py
-        # st.error(f"Error al cargar el reporte: {e.response.json().get('message', str(e))}")
-        return pd.DataFrame()
-    except Exception as e:
-        # st.error(f"Error inesperado al cargar el reporte: {e}")
+        st.error(e.message)
         return pd.DataFrame()
+    return pd.DataFrame(rows, columns=coupon_service.REPORT_COLUMNS) if rows else pd.DataFrame()
         
 
 # =================================================================
 # 4. RENDERIZACIÓN DE LA INTERFAZ DE CONFIGURACIÓN (CRUD)
 # =================================================================
 
+def render_search_box(key: str, placeholder: str):
+    """Caja de búsqueda de un listado paginado; retorna (texto, página actual)."""
+    search = st.text_input("Buscar", key=f"{key}_search", placeholder=placeholder).strip()
+    # Una búsqueda nueva vuelve a la primera página
+    if st.session_state.get(f"{key}_last_search") != search:
+        st.session_state[f"{key}_last_search"] = search
+        st.session_state[f"{key}_page"] = 1
+    return search, st.session_state.get(f"{key}_page", 1)
+
+def render_pager(key: str, total: int, page_size: int = PAGE_SIZE):
+    """Controles Anterior/Siguiente para un listado paginado."""
+    pages = max(1, -(-total // page_size))
+    page = min(st.session_state.get(f"{key}_page", 1), pages)
+
+    col_prev, col_info, col_next = st.columns([1, 3, 1])
+    with col_prev:
+        if st.button("◀ Anterior", key=f"{key}_prev", disabled=page <= 1):
+            st.session_state[f"{key}_page"] = page - 1
+            st.rerun()
+    with col_info:
+        st.caption(f"Página {page} de {pages} · {total} registros")
+    with col_next:
+        if st.button("Siguiente ▶", key=f"{key}_next", disabled=page >= pages):
+            st.session_state[f"{key}_page"] = page + 1
+            st.rerun()
+
+def render_coupon_lookup():
+    """Caja de búsqueda de un cupón puntual (consecutivo, factura, ID o código)."""
+    import time
+
+    query = st.text_input(
+        "Buscar cupón", key="coupon_lookup",
+        placeholder=f"Consecutivo, número de factura o los primeros {LOOKUP_MIN_PREFIX}+ caracteres del ID/código",
+    ).strip()
+    if not query:
+        return
+
+    start = time.perf_counter()
+    results = lookup_coupons(query)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if not results:
+        st.info("No se encontraron cupones.")
+        return
+
+    st.caption(f"{len(results)} resultado(s) en {elapsed_ms:.0f} ms" + (" (se muestran los primeros)" if len(results) >= LOOKUP_LIMIT else ""))
+    for coupon in results:
+        status = STATUS_LABELS[coupon_status(coupon)]
+        with st.container(border=True):
+            archived = " · 🗄️ Archivado" if coupon.get('archived') else ""
+            st.markdown(f"**Consecutivo {coupon['consecutive']}** · {status}{archived} · `{coupon.get('code') or coupon['id']}`")
+            col1, col2, col3 = st.columns(3)
+            col1.write(f"**Lote:** {coupon['batch'] or 'N/A'}  \n**Emisor:** {coupon['issuer'] or 'N/A'}  \n**Promoción:** {coupon['promo'] or 'N/A'}")
+            col2.write(f"**Vence:** {coupon.get('expiration_date') or 'N/A'}  \n**Valor:** ₡{coupon.get('base_value_colones') or 0} / ${coupon.get('base_value_dolares') or 0}")
+            col3.write(
+                f"**Factura:** {coupon.get('invoice_number') or 'N/A'}  \n**Sucursal:** {coupon['branch'] or 'N/A'}  \n"
+                f"**Cajero:** {coupon['cashier'] or 'N/A'}  \n**Fecha de canje:** {coupon.get('redemption_date') or 'N/A'}"
+            )
+
+def render_batch_management():
+    """Módulo de Streamlit para anular, extender o cambiar sucursales de lotes (Solo Admin)."""
+    import pandas as pd
+
+    if auth.get_user_role() != 'Admin':
+        st.error("Acceso denegado. Solo los administradores pueden gestionar lotes.")
+        return
+
+    st.header("📦 Gestión de Lotes")
+    st.caption("Las operaciones solo afectan cupones no canjeados ni anulados.")
+
+    search, page = render_search_box("batches", "Nombre del lote")
+    batches, total = get_data_page(
+        'batches',
+        'id,batch_name,consecutive_start,consecutive_end,expiration_date,is_void,branch_ids,issuer:issuers(issuer_name)',
+        search=search, search_columns=('batch_name',), page=page, order='creation_date.desc',
+    )
+    if not batches:
+        st.info("No hay lotes que coincidan con la búsqueda.")
+        return
+
+    df = pd.DataFrame(batches)
+    df['issuer'] = df['issuer'].apply(lambda x: x['issuer_name'] if x else 'N/A')
+    st.dataframe(df.drop(columns=['id']), width='stretch')
+    render_pager("batches", total)
+
+    batch_options = {b['batch_name']: b for b in batches}
+    batch = batch_options[st.selectbox("Lote", options=list(batch_options), key="batch_op_batch")]
+    if batch.get('is_void'):
+        st.warning("Este lote está anulado.")
+
+    branches = get_branches()
+    branch_options = {b['name']: b['id'] for b in branches}
+    branch_names = {b['id']: b['name'] for b in branches}
+
+    with st.form("batch_operation_form"):
+        operation = st.radio("Operación", ["Anular", "Extender vigencia", "Cambiar sucursales"], horizontal=True)
+        whole_batch = st.checkbox("Aplicar al lote completo", value=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            consecutive_from = st.number_input("Consecutivo desde", value=int(batch['consecutive_start']), step=1)
+        with col2:
+            consecutive_to = st.number_input("Consecutivo hasta", value=int(batch['consecutive_end']), step=1)
+        new_expiration = st.date_input("Nuevo vencimiento (Extender vigencia)", value=None)
+        new_branches = st.multiselect(
+            "Sucursales permitidas (Cambiar sucursales)", options=list(branch_options),
+            default=[branch_names[b] for b in (batch.get('branch_ids') or []) if b in branch_names],
+        )
+        confirmed = st.checkbox("Confirmo la operación")
+        submitted = st.form_submit_button("Aplicar")
+
+    if not submitted:
+        return
+    if not confirmed:
+        st.warning("Marque la confirmación para aplicar la operación.")
+        return
+    if not whole_batch and consecutive_from > consecutive_to:
+        st.error("El rango de consecutivos no es válido.")
+        return
+
+    range_args = {} if whole_batch else {'consecutive_from': int(consecutive_from), 'consecutive_to': int(consecutive_to)}
+    if operation == "Anular":
+        affected = void_batch(batch['id'], **range_args)
+    elif operation == "Extender vigencia":
+        if not new_expiration:
+            st.error("Seleccione la nueva fecha de vencimiento.")
+            return
+        affected = extend_batch_expiration(batch['id'], new_expiration, **range_args)
+    else:
+        if not new_branches:
+            st.error("Seleccione al menos una sucursal.")
+            return
+        affected = set_batch_branches(batch['id'], [branch_options[n] for n in new_branches], **range_args)
+
+    if affected is not None:
+        st.success(f"Operación '{operation}' aplicada a {affected} cupones.")
+
 # La función render_config_management debe estar al final del archivo.
 # Nota: La tuve que mover de mi respuesta anterior porque me lo solicitaste en partes.
 
@@ -300,7 +396,7 @@ def render_config_management():
 
     st.header("⚙️ Configuración de Datos Maestros")
     
-    tab_branch, tab_issuer, tab_promo = st.tabs(["Sucursales", "Emisores", "Promociones"])
+    tab_branch, tab_issuer, tab_promo, tab_import = st.tabs(["Sucursales", "Emisores", "Promociones", "Importación CSV"])
 
     # ------------------
     # TABLA SUCURSALES (CRUD)
@@ -308,8 +404,6 @@ def render_config_management():
     with tab_branch:
         st.subheader("Administrar Sucursales")
         
-        branches_data = get_branches()
-        
         col1, col2 = st.columns(2)
         with col1:
             st.markdown("#### Crear Nueva Sucursal")
@@ -325,16 +419,19 @@ def render_config_management():
                     st.warning("El nombre de la sucursal es obligatorio.")
         
         with col2:
-            st.markdown("#### Lista Completa")
+            st.markdown("#### Sucursales Registradas")
+            search, page = render_search_box("branches", "Nombre o dirección")
+            branches_data, branches_total = get_data_page('branches', search=search, search_columns=('name', 'address'), page=page)
             if branches_data:
                 df_branches = pd.DataFrame(branches_data)
                 st.dataframe(df_branches, width='stretch')
             else:
                 st.info("No hay sucursales registradas.")
+            render_pager("branches", branches_total)
 
 
         st.markdown("---")
-        st.markdown("#### Editar / Eliminar Sucursales")
+        st.markdown("#### Editar / Eliminar Sucursales (página actual)")
         
         if branches_data:
             for branch in branches_data:
@@ -385,17 +482,19 @@ def render_config_management():
                     st.warning("El nombre del emisor es obligatorio.")
 
         with col2:
-            st.markdown("#### Lista Completa")
-            issuers_data = get_issuers()
+            st.markdown("#### Emisores Registrados")
+            search, page = render_search_box("issuers", "Nombre del emisor")
+            issuers_data, issuers_total = get_data_page('issuers', search=search, search_columns=('issuer_name',), page=page)
             if issuers_data:
                 df_issuers = pd.DataFrame(issuers_data)
                 df_issuers.rename(columns={'issuer_name': 'Nombre'}, inplace=True)
                 st.dataframe(df_issuers, width='stretch')
             else:
                 st.info("No hay emisores registrados.")
+            render_pager("issuers", issuers_total)
                 
         st.markdown("---")
-        st.markdown("#### Editar / Eliminar Emisores")
+        st.markdown("#### Editar / Eliminar Emisores (página actual)")
         
         if issuers_data:
             for issuer in issuers_data:
@@ -453,15 +552,17 @@ def render_config_management():
 
         st.markdown("---")
         st.markdown("#### Promociones Existentes")
-        promos_data = get_promos()
+        search, page = render_search_box("promos", "Nombre o descripción")
+        promos_data, promos_total = get_data_page('promos', search=search, search_columns=('type_name', 'description'), page=page)
         if promos_data:
             df_promos = pd.DataFrame(promos_data)
             st.dataframe(df_promos, width='stretch')
         else:
             st.info("No hay promociones registradas.")
+        render_pager("promos", promos_total)
             
         st.markdown("---")
-        st.markdown("#### Editar / Eliminar Promociones")
+        st.markdown("#### Editar / Eliminar Promociones (página actual)")
         
         if promos_data:
             for promo in promos_data:
@@ -511,3 +612,10 @@ def render_config_management():
                                 if delete_entry('promos', promo['id']):
                                     st.success("Promoción eliminada.")
                                     st.rerun()
+
+    # ------------------
+    # IMPORTACIÓN MASIVA (CSV)
+    # ------------------
+    with tab_import:
+        import bulk_import
+        bulk_import.render_bulk_import()
@@ -0,0 +1,82 @@
+# expiration_sweeper.py
+"""
+Barrido de cupones vencidos.
+
+Marca como 'expired' todos los cupones activos con expiration_date anterior a
+hoy con una sola llamada a sweep_expired_coupons() (un UPDATE filtrado sobre
+el índice parcial de activos; ver migrations/005_coupon_status.sql). Después
+los reportes filtran por status=eq.expired en lugar de comparar fechas.
+
+Formas de ejecutarlo:
+
+- pg_cron en Supabase (ver el final de la migración 005).
+- python expiration_sweeper.py --email ... --password ...  (cron / Programador de tareas).
+- Desde la app: maybe_sweep() en la página de Reportes, como mucho una vez cada
+  SWEEP_INTERVAL_SECONDS por proceso, con el token del Admin.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import date
+
+from storage import StorageError, get_backend
+
+SWEEP_INTERVAL_SECONDS = float(os.environ.get('SWEEP_INTERVAL_SECONDS', 3600))
+
+_last_sweep = {'at': None, 'coupons': None}
+_lock = threading.Lock()
+
+
+def sweep(token: str = None, today: date = None) -> int:
+    """Ejecuta el barrido y retorna la cantidad de cupones marcados (lanza StorageError si falla)."""
+    today = today or date.today()
+    # Marcar los vencidos es convergente: se puede reintentar
+    affected = get_backend().rpc('sweep_expired_coupons', {'p_today': today.isoformat()}, token=token, idempotent=True)
+    with _lock:
+        _last_sweep.update(at=time.time(), coupons=affected)
+    return affected
+
+
+def maybe_sweep(token: str = None):
+    """Barre si pasó el intervalo desde el último barrido de este proceso; retorna los marcados o None."""
+    with _lock:
+        last = _last_sweep['at']
+        if last is not None and time.time() - last < SWEEP_INTERVAL_SECONDS:
+            return None
+        _last_sweep['at'] = time.time()  # Evita que dos sesiones barran a la vez
+    try:
+        return sweep(token)
+    except Exception:
+        with _lock:
+            _last_sweep['at'] = last  # Reintentar en la próxima visita
+        raise
+
+
+def last_sweep() -> dict:
+    """{'at': epoch o None, 'coupons': marcados en el último barrido}."""
+    with _lock:
+        return dict(_last_sweep)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Marca como expirados los cupones vencidos (una ejecución).')
+    parser.add_argument('--email', default=os.environ.get('SWEEPER_EMAIL'), help='Usuario Admin (o SWEEPER_EMAIL)')
+    parser.add_argument('--password', default=os.environ.get('SWEEPER_PASSWORD'), help='Contraseña (o SWEEPER_PASSWORD)')
+    args = parser.parse_args()
+    if not args.email or not args.password:
+        parser.error('Se requieren --email y --password (o SWEEPER_EMAIL / SWEEPER_PASSWORD).')
+
+    try:
+        token = get_backend().sign_in(args.email, args.password)['access_token']
+        affected = sweep(token)
+    except StorageError as err:
+        print(f'Error en el barrido: {err.message}', file=sys.stderr)
+        return 1
+    print(f'{affected} cupón(es) marcados como expirados.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
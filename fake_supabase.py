@@ -0,0 +1,757 @@
+# fake_supabase.py
+"""
+Sustituto local (en proceso) de los endpoints de Supabase que usa la app:
+/auth/v1 (token, signup) y /rest/v1 (PostgREST).
+
+Implementa el subconjunto de PostgREST que necesitan db_service, auth y
+user_service: select con embeds, filtros por columna, or=(...), order,
+limit/offset, cabeceras Range/Content-Range y Prefer (return, count,
+resolution), y ETag/If-None-Match (304) en las lecturas. Se usa en las pruebas de carga y en desarrollo sin conexión.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit, unquote
+
+import coupon_codes
+
+
+# =================================================================
+# 1. ESQUEMA EN MEMORIA
+# =================================================================
+
+# Por tabla: clave primaria, si es serial, valores por defecto y llaves foráneas.
+SCHEMA = {
+    'roles': {'pk': 'id', 'serial': True, 'defaults': {}, 'fks': {}},
+    'branches': {'pk': 'id', 'serial': True, 'defaults': {'address': None}, 'fks': {}},
+    'issuers': {'pk': 'id', 'serial': True, 'defaults': {}, 'fks': {}},
+    'promos': {'pk': 'id', 'serial': True, 'defaults': {}, 'fks': {}},
+    'profiles': {
+        'pk': 'id', 'serial': False,
+        'defaults': {'branch_id': None, 'phone_number': None},
+        'fks': {'role_id': 'roles', 'branch_id': 'branches'},
+    },
+    'batches': {
+        'pk': 'id', 'serial': False,
+        'defaults': {
+            'creation_date': 'now()', 'is_void': False, 'json_qrs': None,
+            'promo_type_id': None, 'base_value_colones': None, 'base_value_dolares': None,
+        },
+        'fks': {'issuer_id': 'issuers', 'created_by_user_id': 'profiles', 'promo_type_id': 'promos'},
+    },
+    'coupons': {
+        'pk': 'id', 'serial': False,
+        'defaults': {
+            'is_redeemed': False, 'redemption_date': None, 'invoice_number': None,
+            'redemption_branch_id': None, 'redeemed_by_user_id': None,
+            'creation_date': 'now()', 'is_void': False, 'status': 'active',
+            # Atributos del lote (007): NULL = el valor de BATCHES
+            'promo_type_id': None, 'branch_permissions': None, 'base_value_colones': None,
+            'base_value_dolares': None, 'expiration_date': None,
+        },
+        'fks': {
+            'batch_id': 'batches', 'promo_type_id': 'promos',
+            'redemption_branch_id': 'branches', 'redeemed_by_user_id': 'profiles',
+        },
+    },
+}
+# migrations/008_coupon_archive.sql: mismas columnas que coupons más archived_at
+SCHEMA['coupons_archive'] = {**SCHEMA['coupons'], 'defaults': {**SCHEMA['coupons']['defaults'], 'archived_at': 'now()'}}
+
+
+def _sync_coupon_status(row: dict, batch_expiration=None):
+    """Lo que hace el trigger coupons_sync_status (migrations/005 y 007: vencimiento propio o el del lote)."""
+    today = datetime.now().date().isoformat()
+    expiration = row.get('expiration_date') or batch_expiration
+    if row.get('is_void'):
+        row['status'] = 'void'
+    elif row.get('is_redeemed'):
+        row['status'] = 'redeemed'
+    elif not (row.get('status') == 'expired' and str(expiration)[:10] < today):
+        row['status'] = 'active'
+
+
+class PostgrestError(Exception):
+    """Error con el formato de respuesta de PostgREST ({'message': ...})."""
+
+    def __init__(self, status: int, message: str, code: str = 'PGRST000'):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.code = code
+
+
+def _split_top_level(text: str, sep: str = ','):
+    """Divide por `sep` ignorando los separadores dentro de paréntesis o comillas."""
+    parts, depth, current, quoted = [], 0, [], False
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        elif quoted:
+            pass
+        elif ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        if ch == sep and depth == 0 and not quoted:
+            parts.append(''.join(current))
+            current = []
+        else:
+            current.append(ch)
+    if current:
+        parts.append(''.join(current))
+    return [p for p in parts if p != '']
+
+
+def _coerce(raw: str, sample):
+    """Convierte el valor textual del filtro al tipo del valor almacenado."""
+    if raw == 'null':
+        return None
+    if isinstance(sample, bool):
+        return raw.lower() == 'true'
+    if isinstance(sample, int):
+        try:
+            return int(raw)
+        except ValueError:
+            return float(raw)
+    if isinstance(sample, float):
+        return float(raw)
+    return raw
+
+
+def _like_to_regex(pattern: str, ignore_case: bool):
+    regex = '^' + re.escape(pattern).replace(r'\*', '.*').replace('%', '.*').replace('_', '.') + '$'
+    return re.compile(regex, (re.IGNORECASE if ignore_case else 0) | re.DOTALL)
+
+
+def _parse_list(raw: str):
+    """Parsea '(a,b,"c d")' o '{1,2}' a lista de strings."""
+    inner = raw.strip()[1:-1]
+    return [item.strip().strip('"').replace('\\"', '"') for item in _split_top_level(inner) if item.strip() != '']
+
+
+def _compare(op: str, value, raw: str) -> bool:
+    """Evalúa un operador de PostgREST sobre un valor almacenado."""
+    if op == 'is':
+        if raw == 'null':
+            return value is None
+        return value is (raw.lower() == 'true')
+    if op in ('like', 'ilike'):
+        if value is None:
+            return False
+        return bool(_like_to_regex(raw, op == 'ilike').match(str(value)))
+    if op == 'in':
+        options = _parse_list(raw)
+        return value is not None and value in [_coerce(o, value) for o in options]
+    if op in ('cs', 'ov', 'cd'):
+        stored = set(value or [])
+        wanted = {_coerce(o, next(iter(stored), o)) for o in _parse_list(raw)}
+        if op == 'cs':
+            return wanted <= stored
+        if op == 'cd':
+            return stored <= wanted
+        return bool(wanted & stored)
+
+    if value is None:
+        return False
+    target = _coerce(raw, value)
+    if op == 'eq':
+        return value == target
+    if op == 'neq':
+        return value != target
+    if op == 'gt':
+        return value > target
+    if op == 'gte':
+        return value >= target
+    if op == 'lt':
+        return value < target
+    if op == 'lte':
+        return value <= target
+    raise PostgrestError(400, f'operador no soportado: {op}', 'PGRST100')
+
+
+def _row_matches(row: dict, column: str, expression: str) -> bool:
+    negate = False
+    if expression.startswith('not.'):
+        negate, expression = True, expression[4:]
+    op, _, raw = expression.partition('.')
+    result = _compare(op, row.get(column), raw)
+    return not result if negate else result
+
+
+def _or_matches(row: dict, expression: str) -> bool:
+    """Evalúa or=(col.op.val,col.op.val,...)."""
+    for condition in _split_top_level(expression.strip()[1:-1]):
+        if condition.startswith('and('):
+            if all(_row_matches(row, *c.split('.', 1)) for c in _split_top_level(condition[3:].strip()[1:-1])):
+                return True
+            continue
+        column, _, rest = condition.partition('.')
+        op, _, raw = rest.partition('.')
+        if raw.startswith('"') and raw.endswith('"'):
+            rest = f"{op}.{raw[1:-1]}"
+        if _row_matches(row, column, rest):
+            return True
+    return False
+
+
+# =================================================================
+# 2. BASE DE DATOS EN MEMORIA
+# =================================================================
+
+class FakeDatabase:
+    """Tablas en memoria con las operaciones de PostgREST que usa la app."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.tables = {name: [] for name in SCHEMA}
+        self.sequences = {name: 0 for name in SCHEMA}
+        self.users = {}   # email -> {'id', 'password', 'email'}
+        self.tokens = {}  # access_token -> user
+
+    # --- Auth ---
+
+    def signup(self, email: str, password: str):
+        with self.lock:
+            if email in self.users:
+                raise PostgrestError(422, 'User already registered: email address is already taken')
+            user = {'id': str(uuid.uuid4()), 'email': email, 'password': password}
+            self.users[email] = user
+            return {'id': user['id'], 'email': email}
+
+    def sign_in(self, email: str, password: str):
+        with self.lock:
+            user = self.users.get(email)
+            if not user or user['password'] != password:
+                raise PostgrestError(400, 'Invalid login credentials')
+            token = uuid.uuid4().hex
+            self.tokens[token] = user
+            return {
+                'access_token': token,
+                'token_type': 'bearer',
+                'expires_in': 3600,
+                'user': {'id': user['id'], 'email': user['email']},
+            }
+
+    # --- Escritura ---
+
+    def _apply_defaults(self, table: str, row: dict):
+        spec = SCHEMA[table]
+        new_row = {}
+        for column, default in spec['defaults'].items():
+            new_row[column] = datetime.now().isoformat() if default == 'now()' else default
+        new_row.update(row)
+        if spec['pk'] not in new_row or new_row[spec['pk']] is None:
+            if spec['serial']:
+                self.sequences[table] += 1
+                new_row[spec['pk']] = self.sequences[table]
+            else:
+                new_row[spec['pk']] = str(uuid.uuid4())
+        elif spec['serial'] and isinstance(new_row[spec['pk']], int):
+            self.sequences[table] = max(self.sequences[table], new_row[spec['pk']])
+        return new_row
+
+    def insert(self, table: str, rows: list, on_conflict: str = None, merge: bool = False, ignore: bool = False):
+        self._check_table(table)
+        conflict_cols = [c for c in (on_conflict or SCHEMA[table]['pk']).split(',') if c]
+        inserted = []
+        with self.lock:
+            for row in rows:
+                new_row = self._apply_defaults(table, row)
+                key = tuple(new_row.get(c) for c in conflict_cols)
+                existing = next(
+                    (r for r in self.tables[table] if tuple(r.get(c) for c in conflict_cols) == key),
+                    None,
+                )
+                if table == 'coupons':
+                    self._sync_status(new_row)
+                if existing is not None:
+                    if merge:
+                        existing.update(row)
+                        if table == 'coupons':
+                            self._sync_status(existing)
+                        inserted.append(existing)
+                        continue
+                    if ignore:
+                        continue
+                    raise PostgrestError(
+                        409, f'duplicate key value violates unique constraint "{table}_pkey"', '23505'
+                    )
+                self.tables[table].append(new_row)
+                inserted.append(new_row)
+        return [dict(r) for r in inserted]
+
+    def update(self, table: str, filters: list, payload: dict):
+        self._check_table(table)
+        with self.lock:
+            rows = self._filter(table, filters)
+            for row in rows:
+                row.update(payload)
+                if table == 'coupons':
+                    self._sync_status(row)
+            return [dict(r) for r in rows]
+
+    def delete(self, table: str, filters: list):
+        self._check_table(table)
+        with self.lock:
+            rows = self._filter(table, filters)
+            ids = {id(r) for r in rows}
+            self.tables[table] = [r for r in self.tables[table] if id(r) not in ids]
+            return [dict(r) for r in rows]
+
+    # --- Funciones (POST /rpc/<nombre>), equivalentes a las de migrations/ ---
+
+    def rpc(self, name: str, args: dict):
+        handler = getattr(self, f'_rpc_{name}', None)
+        if handler is None:
+            raise PostgrestError(404, f'Could not find the function public.{name}', 'PGRST202')
+        with self.lock:
+            return handler(**args)
+
+    def _batch_expiration(self, batch_id):
+        return next((b.get('expiration_date') for b in self.tables['batches'] if b['id'] == batch_id), None)
+
+    def _sync_status(self, row: dict):
+        _sync_coupon_status(row, None if row.get('expiration_date') else self._batch_expiration(row.get('batch_id')))
+
+    def _batch_update(self, op: str, p_batch_id, coupon_changes: dict, batch_changes: dict,
+                      p_consecutive_from=None, p_consecutive_to=None, inherited: bool = False, **log):
+        batch = next((b for b in self.tables['batches'] if b['id'] == p_batch_id), None)
+        whole_batch = p_consecutive_from is None and p_consecutive_to is None
+        if whole_batch and batch is not None:
+            if inherited:
+                # Atributos del lote (007): canjeados y anulados conservan el valor; los pendientes heredan
+                pinned = {c: batch.get(b) for c, b in zip(coupon_changes, batch_changes)}
+                for row in self.tables['coupons']:
+                    if row.get('batch_id') == p_batch_id and (row.get('is_redeemed') or row.get('is_void')):
+                        row.update({c: v for c, v in pinned.items() if row.get(c) is None})
+                coupon_changes = dict.fromkeys(coupon_changes)
+            batch.update(batch_changes)
+        affected = 0
+        for row in self.tables['coupons']:
+            if row.get('batch_id') != p_batch_id or row.get('is_redeemed') or row.get('is_void'):
+                continue
+            if p_consecutive_from is not None and row['consecutive'] < p_consecutive_from:
+                continue
+            if p_consecutive_to is not None and row['consecutive'] > p_consecutive_to:
+                continue
+            row.update(coupon_changes)
+            _sync_coupon_status(row, batch.get('expiration_date') if batch else None)
+            affected += 1
+        if batch is not None:
+            info = dict(batch.get('json_qrs') or {})
+            info['operations'] = list(info.get('operations', [])) + [{
+                'op': op, 'from': p_consecutive_from, 'to': p_consecutive_to, 'coupons': affected,
+                'at': datetime.now().isoformat(), **log,
+            }]
+            batch['json_qrs'] = info
+        return affected
+
+    def _rpc_batch_void(self, p_batch_id, p_consecutive_from=None, p_consecutive_to=None):
+        return self._batch_update('void', p_batch_id, {'is_void': True}, {'is_void': True},
+                                  p_consecutive_from, p_consecutive_to)
+
+    def _move_coupons(self, source: str, target: str, matches) -> int:
+        moved = [row for row in self.tables[source] if matches(row)]
+        if moved:
+            ids = {id(row) for row in moved}
+            self.tables[source] = [row for row in self.tables[source] if id(row) not in ids]
+            for row in moved:
+                row.pop('archived_at', None)
+                self.tables[target].append(self._apply_defaults(target, row))
+        return len(moved)
+
+    def _rpc_archive_coupons(self, p_after_days=180, p_limit=5000):
+        cutoff = datetime.now() - timedelta(days=p_after_days)
+        expirations = {b['id']: b.get('expiration_date') for b in self.tables['batches']}
+        candidates = set()
+        for row in self.tables['coupons']:
+            if len(candidates) >= p_limit:
+                break
+            expiration = row.get('expiration_date') or expirations.get(row.get('batch_id'))
+            if ((row.get('status') == 'redeemed' and str(row.get('redemption_date')) < cutoff.isoformat())
+                    or (row.get('status') == 'expired' and str(expiration)[:10] < cutoff.date().isoformat())):
+                candidates.add(row['id'])
+        return self._move_coupons('coupons', 'coupons_archive', lambda row: row['id'] in candidates)
+
+    def _rpc_restore_archived_coupons(self, p_batch_id, p_consecutive_from=None, p_consecutive_to=None):
+        def matches(row):
+            return (row.get('batch_id') == p_batch_id and not row.get('is_redeemed') and not row.get('is_void')
+                    and (p_consecutive_from is None or row['consecutive'] >= p_consecutive_from)
+                    and (p_consecutive_to is None or row['consecutive'] <= p_consecutive_to))
+        return self._move_coupons('coupons_archive', 'coupons', matches)
+
+    def _rpc_batch_extend(self, p_batch_id, p_expiration_date, p_consecutive_from=None, p_consecutive_to=None):
+        self._rpc_restore_archived_coupons(p_batch_id, p_consecutive_from, p_consecutive_to)
+        return self._batch_update('extend', p_batch_id, {'expiration_date': p_expiration_date},
+                                  {'expiration_date': p_expiration_date}, p_consecutive_from, p_consecutive_to,
+                                  inherited=True, expiration_date=p_expiration_date)
+
+    def _rpc_batch_set_branches(self, p_batch_id, p_branch_ids, p_consecutive_from=None, p_consecutive_to=None):
+        return self._batch_update('branches', p_batch_id, {'branch_permissions': list(p_branch_ids)},
+                                  {'branch_ids': list(p_branch_ids)}, p_consecutive_from, p_consecutive_to,
+                                  inherited=True, branch_ids=list(p_branch_ids))
+
+    def _rpc_sweep_expired_coupons(self, p_today=None):
+        today = p_today or datetime.now().date().isoformat()
+        expirations = {b['id']: b.get('expiration_date') for b in self.tables['batches']}
+        affected = 0
+        for row in self.tables['coupons']:
+            expiration = row.get('expiration_date') or expirations.get(row.get('batch_id'))
+            if row.get('status') == 'active' and str(expiration)[:10] < today:
+                row['status'] = 'expired'
+                affected += 1
+        return affected
+
+    def _rpc_create_coupon_batch(self, p_count, p_promo_id, p_issuer_id, p_branch_ids, p_value_colones,
+                                 p_value_dolares, p_expiration_date, p_batch_name_prefix, p_description,
+                                 p_created_by=None):
+        if not p_count or p_count < 1:
+            raise PostgrestError(400, 'La cantidad de cupones debe ser mayor que cero', 'P0001')
+        start = max((r.get('consecutive') or 0 for table in ('coupons', 'coupons_archive')
+                     for r in self.tables[table]), default=0) + 1
+        batch_id = str(uuid.uuid4())
+        batch_name = f"{p_batch_name_prefix}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{batch_id[:4]}"
+        self.tables['batches'].append(self._apply_defaults('batches', {
+            'id': batch_id, 'batch_name': batch_name,
+            'json_qrs': {'count': p_count, 'promo_description': p_description},
+            'consecutive_start': start, 'consecutive_end': start + p_count - 1,
+            'branch_ids': list(p_branch_ids or []), 'expiration_date': p_expiration_date,
+            'issuer_id': p_issuer_id, 'created_by_user_id': p_created_by, 'promo_type_id': p_promo_id,
+            'base_value_colones': p_value_colones, 'base_value_dolares': p_value_dolares,
+        }))
+        ids = []
+        for i in range(p_count):
+            coupon_id = str(uuid.uuid4())
+            row = self._apply_defaults('coupons', {
+                'id': coupon_id, 'code': coupon_codes.encode_coupon_id(coupon_id), 'batch_id': batch_id,
+                'consecutive': start + i,
+            })
+            _sync_coupon_status(row, p_expiration_date)
+            self.tables['coupons'].append(row)
+            ids.append(coupon_id)
+        return {'batch_id': batch_id, 'batch_name': batch_name, 'consecutive_start': start, 'ids': ids}
+
+    # --- Lectura ---
+
+    def select(self, table: str, select: str, filters: list, order: str = None,
+               limit: int = None, offset: int = 0):
+        """Retorna (filas_proyectadas, total_sin_paginar)."""
+        self._check_table(table)
+        with self.lock:
+            rows = self._filter(table, filters)
+            if order:
+                for term in reversed(_split_top_level(order)):
+                    column, *modifiers = term.split('.')
+                    desc = 'desc' in modifiers
+                    nulls_first = 'nullsfirst' in modifiers or (desc and 'nullslast' not in modifiers)
+                    present = [r for r in rows if r.get(column) is not None]
+                    missing = [r for r in rows if r.get(column) is None]
+                    present.sort(key=lambda r, c=column: r[c], reverse=desc)
+                    rows = missing + present if nulls_first else present + missing
+            total = len(rows)
+            rows = rows[offset:]
+            if limit is not None:
+                rows = rows[:limit]
+            return [self._project(table, r, select or '*') for r in rows], total
+
+    def _check_table(self, table: str):
+        if table not in self.tables:
+            raise PostgrestError(404, f'relation "public.{table}" does not exist', '42P01')
+
+    def _filter(self, table: str, filters: list):
+        rows = self.tables[table]
+        for column, expression in filters:
+            if column == 'or':
+                rows = [r for r in rows if _or_matches(r, expression)]
+            else:
+                rows = [r for r in rows if _row_matches(r, column, expression)]
+        return list(rows)
+
+    def _resolve_embed(self, table: str, name: str):
+        """Retorna (tabla_destino, columna_local, columna_remota, es_lista)."""
+        fks = SCHEMA[table]['fks']
+        if name in fks:
+            return fks[name], name, SCHEMA[fks[name]]['pk'], False
+        for column, target in fks.items():
+            if target == name:
+                return target, column, SCHEMA[target]['pk'], False
+        for other, spec in SCHEMA.items():
+            for column, target in spec['fks'].items():
+                if other == name and target == table:
+                    return other, SCHEMA[table]['pk'], column, True
+        raise PostgrestError(
+            400, f"Could not find a relationship between '{table}' and '{name}' in the schema cache", 'PGRST200'
+        )
+
+    def _project(self, table: str, row: dict, select: str):
+        result = {}
+        for item in _split_top_level(select.replace(' ', '')):
+            alias = None
+            head = item
+            if ':' in item.split('(')[0]:
+                alias, head = item.split(':', 1)
+            if '(' in head:
+                name, inner = head.split('(', 1)
+                inner = inner[:-1]
+                name = name.split('!')[0]
+                target, local_col, remote_col, many = self._resolve_embed(table, name)
+                matches = [r for r in self.tables[target] if r.get(remote_col) == row.get(local_col)]
+                if many:
+                    value = [self._project(target, r, inner) for r in matches]
+                else:
+                    value = self._project(target, matches[0], inner) if matches else None
+                result[alias or name] = value
+            elif head == '*':
+                result.update(row)
+            else:
+                column = head.split('::')[0]
+                result[alias or column] = row.get(column)
+        return result
+
+    # --- Datos de ejemplo ---
+
+    def seed(self, branches: int = 5, issuers: int = 3, promos: int = 10, users_per_role: int = 5):
+        """Carga datos maestros y usuarios de prueba (contraseña: 'password')."""
+        self.insert('roles', [{'role_name': r} for r in ('Admin', 'Creator', 'Cashier')])
+        self.insert('branches', [
+            {'name': f'Sucursal {i + 1}', 'address': f'Dirección {i + 1}'} for i in range(branches)
+        ])
+        self.insert('issuers', [{'issuer_name': f'Emisor {i + 1}'} for i in range(issuers)])
+        self.insert('promos', [
+            {
+                'type_name': f'Promo {i + 1}', 'is_percentage': i % 3 == 0, 'is_cash_value': i % 3 == 1,
+                'is_product': i % 3 == 2, 'value': float(5000 + i * 500), 'description': f'Beneficio {i + 1}',
+            }
+            for i in range(promos)
+        ])
+        role_ids = {r['role_name']: r['id'] for r in self.tables['roles']}
+        credentials = []
+        for role_name, role_id in role_ids.items():
+            for i in range(users_per_role):
+                email = f'{role_name.lower()}{i + 1}@example.com'
+                user = self.signup(email, 'password')
+                self.insert('profiles', [{
+                    'id': user['id'], 'email': email, 'username': f'{role_name} {i + 1}',
+                    'role_id': role_id, 'branch_id': (i % branches) + 1 if role_name != 'Admin' else None,
+                }])
+                credentials.append((role_name, email, 'password'))
+        return credentials
+
+
+# =================================================================
+# 3. SERVIDOR HTTP
+# =================================================================
+
+def _parse_prefer(header: str):
+    prefer = {}
+    for part in (header or '').split(','):
+        key, _, value = part.strip().partition('=')
+        if key:
+            prefer[key] = value
+    return prefer
+
+
+class FakeSupabaseHandler(BaseHTTPRequestHandler):
+    """Traduce peticiones HTTP a operaciones de FakeDatabase."""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeSupabase/1.0'
+
+    def log_message(self, format, *args):  # Silencia el log por petición
+        pass
+
+    # --- Utilidades de respuesta ---
+
+    def _send(self, status: int, body=None, headers: dict = None):
+        if isinstance(body, bytes):
+            payload = body
+        else:
+            payload = b'' if body is None else json.dumps(body, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if payload and self.command != 'HEAD':
+            self.wfile.write(payload)
+        self.server.record(status)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return None
+        return json.loads(self.rfile.read(length).decode('utf-8'))
+
+    def _authorized(self) -> bool:
+        if self.headers.get('apikey') is None:
+            self._send(401, {'message': 'No API key found in request'})
+            return False
+        return True
+
+    # --- Dispatch ---
+
+    def _dispatch(self):
+        if self.server.latency_s:
+            time.sleep(self.server.latency_s)
+        if self.server.slow_rate and random.random() < self.server.slow_rate:
+            time.sleep(self.server.slow_s)
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            self._send(503, {'message': 'Servicio no disponible (falla simulada)'}, {'Retry-After': '0'})
+            return
+        parts = urlsplit(self.path)
+        try:
+            if not self._authorized():
+                return
+            if parts.path.startswith('/auth/v1/'):
+                self._handle_auth(parts.path[len('/auth/v1/'):], dict(parse_qsl(parts.query)))
+            elif parts.path.startswith('/rest/v1/'):
+                self._handle_rest(unquote(parts.path[len('/rest/v1/'):]), parts.query)
+            else:
+                self._send(404, {'message': 'Not found'})
+        except PostgrestError as err:
+            self._send(err.status, {'message': err.message, 'code': err.code})
+        except (ValueError, KeyError) as err:
+            self._send(400, {'message': f'Petición inválida: {err}', 'code': 'PGRST100'})
+
+    do_GET = do_POST = do_PATCH = do_DELETE = do_HEAD = _dispatch
+
+    def _handle_auth(self, action: str, params: dict):
+        db = self.server.db
+        body = self._read_json() or {}
+        if action == 'token' and self.command == 'POST' and params.get('grant_type') == 'password':
+            self._send(200, db.sign_in(body.get('email'), body.get('password')))
+        elif action == 'signup' and self.command == 'POST':
+            self._send(200, {'user': db.signup(body['email'], body['password'])})
+        else:
+            self._send(404, {'message': f'Auth endpoint no soportado: {action}'})
+
+    def _handle_rest(self, table: str, query: str):
+        db = self.server.db
+        if table.startswith('rpc/') and self.command == 'POST':
+            self._send(200, db.rpc(table[len('rpc/'):], self._read_json() or {}))
+            return
+        prefer = _parse_prefer(self.headers.get('Prefer'))
+        select, order, limit, offset, on_conflict = '*', None, None, 0, None
+        filters = []
+        for key, value in parse_qsl(query, keep_blank_values=True):
+            if key == 'select':
+                select = value
+            elif key == 'order':
+                order = value
+            elif key == 'limit':
+                limit = int(value)
+            elif key == 'offset':
+                offset = int(value)
+            elif key == 'on_conflict':
+                on_conflict = value
+            elif key == 'columns':
+                continue
+            else:
+                filters.append((key, value))
+
+        if self.command in ('GET', 'HEAD'):
+            range_header = self.headers.get('Range')
+            if range_header:
+                start, _, end = range_header.partition('-')
+                offset = int(start)
+                limit = int(end) - offset + 1 if end else None
+            rows, total = db.select(table, select, filters, order, limit, offset)
+            headers = {}
+            if rows or range_header or 'count' in prefer:
+                end = offset + len(rows) - 1
+                range_text = f'{offset}-{end}' if rows else '*'
+                headers['Content-Range'] = f"{range_text}/{total if 'count' in prefer else '*'}"
+            status = 206 if range_header and 'count' in prefer and offset + len(rows) < total else 200
+            # Validador fuerte: hash del cuerpo y del rango; si el cliente ya lo tiene, 304 sin cuerpo
+            payload = json.dumps(rows, default=str).encode('utf-8')
+            headers['ETag'] = '"{}"'.format(hashlib.sha1(payload + headers.get('Content-Range', '').encode()).hexdigest())
+            if headers['ETag'] in (self.headers.get('If-None-Match') or ''):
+                self._send(304, None, headers)
+            else:
+                self._send(status, payload, headers)
+            return
+
+        returning = prefer.get('return') == 'representation'
+        if self.command == 'POST':
+            body = self._read_json()
+            rows = body if isinstance(body, list) else [body]
+            resolution = prefer.get('resolution')
+            result = db.insert(
+                table, rows, on_conflict,
+                merge=resolution == 'merge-duplicates', ignore=resolution == 'ignore-duplicates',
+            )
+            self._send(201, result if returning else None)
+        elif self.command == 'PATCH':
+            if not filters:
+                raise PostgrestError(400, 'UPDATE requires a WHERE clause', '21000')
+            result = db.update(table, filters, self._read_json() or {})
+            self._send(200 if returning else 204, result if returning else None)
+        elif self.command == 'DELETE':
+            if not filters:
+                raise PostgrestError(400, 'DELETE requires a WHERE clause', '21000')
+            result = db.delete(table, filters)
+            self._send(200 if returning else 204, result if returning else None)
+
+
+class FakeSupabaseServer(ThreadingHTTPServer):
+    """
+    Servidor HTTP en un hilo de fondo, con latencia artificial opcional.
+    Para probar la resiliencia del cliente: error_rate responde esa fracción de
+    peticiones con 503 (Retry-After: 0) y slow_rate demora esa fracción slow_ms.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, db: FakeDatabase = None, host: str = '127.0.0.1', port: int = 0, latency_ms: float = 0.0,
+                 error_rate: float = 0.0, slow_rate: float = 0.0, slow_ms: float = 0.0):
+        super().__init__((host, port), FakeSupabaseHandler)
+        self.db = db or FakeDatabase()
+        self.latency_s = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_s = slow_ms / 1000.0
+        self.status_counts = {}
+        self._stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def record(self, status: int):
+        with self._stats_lock:
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='fake-supabase', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Servidor local que imita Supabase (Auth + PostgREST).')
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fracción de peticiones que responden 503')
+    args = parser.parse_args()
+
+    server = FakeSupabaseServer(port=args.port, latency_ms=args.latency_ms, error_rate=args.error_rate)
+    for role, email, password in server.db.seed():
+        print(f'{role:8} {email} / {password}')
+    print(f'Escuchando en {server.url} (exporte SUPABASE_URL={server.url})')
+    server.serve_forever()
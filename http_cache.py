@@ -0,0 +1,115 @@
+# http_cache.py
+"""
+Caché de lecturas condicionales (ETag / Last-Modified) para PostgREST.
+
+Solo actúa si el servidor envía validadores. PostgREST (y por lo tanto
+Supabase) no envía ETag ni Last-Modified en las lecturas de tablas: contra
+Supabase no se guarda nada y cada lectura descarga el cuerpo completo (el
+contador 'no_validator' lo muestra). Los ahorros de load_test.py vienen de
+fake_supabase, que sí agrega ETags; en producción haría falta un proxy que
+los agregue.
+
+Guarda, por URL y token, los validadores de la última respuesta y el
+resultado ya parseado. La siguiente lectura se envía con If-None-Match /
+If-Modified-Since; si el servidor responde 304 se reutiliza el resultado
+sin descargar ni parsear el JSON otra vez. Cada lectura sigue yendo al
+servidor, así que una escritura (de esta u otra instancia) nunca deja datos
+viejos: solo se ahorra el cuerpo cuando no cambió.
+
+Los resultados se comparten entre sesiones y reruns: quien los recibe debe
+tratarlos como de solo lectura.
+
+Aquí solo quedan los validadores; los resultados se registran en memory_budget
+a nombre del token que los pidió, que los baja a disco o los descarta si la
+sesión o el proceso superan su presupuesto. Una entrada cuyo resultado se
+descartó deja de enviarse como condicional.
+
+Configuración: HTTP_CACHE_MAX_ENTRIES (0 desactiva la caché).
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import memory_budget
+
+MAX_ENTRIES = int(os.environ.get('HTTP_CACHE_MAX_ENTRIES', 256))
+# Un resultado parseado (listas de dicts) ocupa ~6 veces su JSON (medido con filas del reporte)
+PARSED_SIZE_FACTOR = 6
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'no_validator': 0}
+
+
+def enabled() -> bool:
+    return MAX_ENTRIES > 0
+
+
+def lookup(key):
+    """Retorna (etag, last_modified, dueño) de la entrada o None (también si su resultado se descartó)."""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        if not memory_budget.contains(entry[2], ('http', key)):
+            del _entries[key]
+            return None
+        _entries.move_to_end(key)
+        return entry
+
+
+def value(key):
+    """Resultado guardado de la entrada (de memoria o del disco) o None."""
+    with _lock:
+        entry = _entries.get(key)
+    return memory_budget.get(entry[2], ('http', key)) if entry else None
+
+
+def conditional_headers(entry) -> dict:
+    """Cabeceras para revalidar una entrada (vacías si no hay entrada)."""
+    if entry is None:
+        return {}
+    etag, last_modified, _ = entry
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return headers
+
+
+def store(key, response, value, owner=None):
+    """Guarda el resultado parseado (a cuenta de `owner`, el token) si la respuesta trae algún validador."""
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if not (etag or last_modified):
+        with _lock:
+            _stats['no_validator'] += 1
+        return
+    with _lock:
+        _entries[key] = (etag, last_modified, owner)
+        _entries.move_to_end(key)
+        _stats['stores'] += 1
+        while len(_entries) > MAX_ENTRIES:
+            old_key, (_, _, old_owner) = _entries.popitem(last=False)
+            memory_budget.discard(old_owner, ('http', old_key))
+            _stats['evictions'] += 1
+    memory_budget.put(owner, ('http', key), value, size=len(response.content) * PARSED_SIZE_FACTOR)
+
+
+def record(hit: bool):
+    with _lock:
+        _stats['hits' if hit else 'misses'] += 1
+
+
+def clear():
+    with _lock:
+        for key, (_, _, owner) in _entries.items():
+            memory_budget.discard(owner, ('http', key))
+        _entries.clear()
+
+
+def get_stats() -> dict:
+    """Contadores acumulados (304 reutilizados, descargas completas, respuestas sin validador) y entradas actuales."""
+    with _lock:
+        return dict(_stats, entries=len(_entries))
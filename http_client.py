@@ -0,0 +1,256 @@
+# http_client.py
+"""
+Capa de resiliencia para las llamadas HTTP a Supabase (PostgREST y Auth).
+
+Mismas firmas que requests.get/post/patch/delete, con:
+
+- Reintentos con espera exponencial y jitter completo para 408/429/5xx y
+  errores de conexión. Si la respuesta trae Retry-After se respeta.
+  Solo se reintentan peticiones idempotentes (GET, HEAD, PATCH, DELETE o
+  idempotent=True); un POST normal solo se reintenta ante 429, 503 o un
+  timeout de conexión, que indican que el servidor no lo procesó.
+- Lecturas "hedged" opcionales: si un GET no responde en HTTP_HEDGE_AFTER_MS
+  (contados desde que la petición sale, no desde que espera un hilo) se envía
+  un duplicado y se usa la primera respuesta que llegue. Con todos los hilos
+  de hedging ocupados no se duplica nada: la petición va sin hedging.
+- Circuit breaker por host: tras varios fallos seguidos las peticiones fallan
+  de inmediato (CircuitOpenError) durante CIRCUIT_RESET_SECONDS y luego se
+  deja pasar una petición de prueba.
+
+Configuración por variables de entorno (ver README).
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+
+MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 3))
+BACKOFF_BASE = float(os.environ.get('HTTP_BACKOFF_BASE', 0.25))   # segundos
+BACKOFF_MAX = float(os.environ.get('HTTP_BACKOFF_MAX', 8.0))      # tope de espera entre intentos
+TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', 30.0))
+HEDGE_AFTER_MS = float(os.environ.get('HTTP_HEDGE_AFTER_MS', 0))  # 0 = sin hedging
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5))
+CIRCUIT_RESET_SECONDS = float(os.environ.get('CIRCUIT_RESET_SECONDS', 30.0))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+NOT_PROCESSED_STATUS = {429, 503}  # Seguros de reintentar aun sin idempotencia
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+HEDGE_THREADS = 8
+_hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_THREADS, thread_name_prefix='http-hedge')
+# Un cupo por petición en vuelo en el pool: con cupo hay un hilo libre y la petición no hace cola
+_hedge_slots = threading.BoundedSemaphore(HEDGE_THREADS)
+_stats = {'requests': 0, 'retries': 0, 'hedges': 0, 'hedge_wins': 0, 'hedges_skipped': 0, 'circuit_rejections': 0}
+_stats_lock = threading.Lock()
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """El backend está marcado como caído; la petición no se envió."""
+
+
+class CircuitBreaker:
+    """Cerrado -> abierto tras `threshold` fallos seguidos -> semiabierto tras `reset_seconds`."""
+
+    def __init__(self, threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.reset_seconds else 'open'
+
+    def allow(self) -> bool:
+        with self.lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(url: str) -> CircuitBreaker:
+    host = urlsplit(url).netloc
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker()
+        return _breakers[host]
+
+
+def get_stats() -> dict:
+    """Contadores acumulados (peticiones, reintentos, hedges) y estado de cada circuito."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['circuits'] = {host: breaker.state for host, breaker in _breakers.items()}
+    return stats
+
+
+def _count(name: str, amount: int = 1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def retry_after_seconds(response):
+    """Segundos indicados por Retry-After (número o fecha HTTP), o None."""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_seconds(attempt: int) -> float:
+    """Espera exponencial con jitter completo: uniforme en [0, min(máx, base * 2^intento)]."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def _is_failure(response) -> bool:
+    """Fallos que cuentan para el circuit breaker (el backend no está sano)."""
+    return response.status_code >= 500
+
+
+def _run_in_slot(started, method: str, url: str, kwargs: dict):
+    """Envía la petición en un hilo del pool y libera su cupo al terminar."""
+    try:
+        if started is not None:
+            started.set()
+        return requests.request(method, url, **kwargs)
+    finally:
+        _hedge_slots.release()
+
+
+def _send_hedged(method: str, url: str, kwargs: dict):
+    """
+    GET con un duplicado si el primero tarda más de HEDGE_AFTER_MS desde que salió.
+    Sin cupos libres (backend lento, muchas sesiones) no se duplica: justo entonces
+    un duplicado solo agregaría carga.
+    """
+    if not _hedge_slots.acquire(blocking=False):
+        _count('hedges_skipped')
+        return requests.request(method, url, **kwargs)
+    started = threading.Event()
+    first = _hedge_pool.submit(_run_in_slot, started, method, url, kwargs)
+    started.wait()  # El plazo corre desde que la petición sale, no desde que se encoló
+    done, _ = wait([first], timeout=HEDGE_AFTER_MS / 1000.0)
+    if done:
+        return first.result()
+    if not _hedge_slots.acquire(blocking=False):
+        _count('hedges_skipped')
+        return first.result()
+
+    _count('hedges')
+    second = _hedge_pool.submit(_run_in_slot, None, method, url, kwargs)
+    done, _ = wait([first, second], return_when=FIRST_COMPLETED)
+    winner = next(iter(done))
+    if winner is second:
+        _count('hedge_wins')
+    if winner.exception() is not None:
+        # Si el primero en terminar falló, esperar al otro antes de rendirse.
+        other = second if winner is first else first
+        return other.result()
+    return winner.result()
+
+
+def request(method: str, url: str, idempotent: bool = None, hedge: bool = None, **kwargs):
+    """
+    Como requests.request, con reintentos, hedging y circuit breaker.
+    Retorna la última respuesta (el llamador decide con raise_for_status) o
+    lanza la última excepción de red / CircuitOpenError.
+    """
+    method = method.upper()
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+    if hedge is None:
+        hedge = method == 'GET' and HEDGE_AFTER_MS > 0
+    kwargs.setdefault('timeout', TIMEOUT)
+    breaker = get_breaker(url)
+
+    for attempt in range(MAX_RETRIES + 1):
+        if not breaker.allow():
+            _count('circuit_rejections')
+            raise CircuitOpenError(f"Servicio no disponible ({urlsplit(url).netloc}); reintente en unos segundos.")
+        _count('requests')
+
+        last_try = attempt == MAX_RETRIES
+        try:
+            response = _send_hedged(method, url, kwargs) if hedge else requests.request(method, url, **kwargs)
+        except requests.exceptions.ConnectTimeout:
+            breaker.record_failure()
+            if last_try:
+                raise
+            wait_s = backoff_seconds(attempt)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            breaker.record_failure()
+            if last_try or not idempotent:
+                raise
+            wait_s = backoff_seconds(attempt)
+        else:
+            if _is_failure(response):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            retryable = response.status_code in NOT_PROCESSED_STATUS or (idempotent and response.status_code in RETRYABLE_STATUS)
+            if not retryable or last_try:
+                return response
+            retry_after = retry_after_seconds(response)
+            if retry_after is not None and retry_after > BACKOFF_MAX:
+                return response  # El servidor pide esperar más de lo razonable para una página interactiva
+            wait_s = retry_after if retry_after is not None else backoff_seconds(attempt)
+
+        _count('retries')
+        time.sleep(wait_s)
+
+
+def get(url: str, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def head(url: str, **kwargs):
+    return request('HEAD', url, **kwargs)
+
+
+def post(url: str, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def patch(url: str, **kwargs):
+    return request('PATCH', url, **kwargs)
+
+
+def delete(url: str, **kwargs):
+    return request('DELETE', url, **kwargs)
@@ -0,0 +1,247 @@
+# load_test.py
+"""
+Prueba de carga de extremo a extremo contra el sustituto local de Supabase.
+
+Levanta fake_supabase en proceso, apunta db_config a él y simula N sesiones
+concurrentes (Admin, Creator, Cashier) que repiten una mezcla realista de
+logins, creación de lotes, lectura de datos maestros y reportes con la misma
+capa de servicios que usa app.py (coupon_service, account_service). Cada sesión
+lleva su propio RequestContext, como un usuario real con su token.
+Reporta throughput y percentiles de latencia.
+
+Uso:
+    python load_test.py --sessions 20 --duration 30 --latency-ms 20
+"""
+import argparse
+import os
+import random
+import statistics
+import threading
+import time
+
+from fake_supabase import FakeSupabaseServer
+
+# Mezcla de operaciones (pesos) por rol, aproximando el uso real de cada página.
+ROLE_MIXES = {
+    'Admin': {'login': 1, 'master': 4, 'report': 4, 'batch': 1},
+    'Creator': {'login': 1, 'master': 5, 'batch': 3},
+    'Cashier': {'login': 3, 'master': 1},
+}
+
+DEFAULT_ROLE_WEIGHTS = 'Admin=1,Creator=3,Cashier=6'
+
+
+def _parse_weights(text: str) -> dict:
+    weights = {}
+    for part in text.split(','):
+        key, _, value = part.partition('=')
+        weights[key.strip()] = float(value)
+    return weights
+
+
+def percentile(values: list, pct: float) -> float:
+    """Percentil por interpolación lineal (pct entre 0 y 100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+class LoadStats:
+    """Latencias y errores por operación, seguros entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, op: str, elapsed: float, ok: bool):
+        with self._lock:
+            self.latencies.setdefault(op, []).append(elapsed)
+            if not ok:
+                self.errors[op] = self.errors.get(op, 0) + 1
+
+    def summary(self, wall_time: float) -> list:
+        rows = []
+        all_latencies = []
+        for op in sorted(self.latencies):
+            values = self.latencies[op]
+            all_latencies.extend(values)
+            rows.append(self._row(op, values, self.errors.get(op, 0), wall_time))
+        rows.append(self._row('TOTAL', all_latencies, sum(self.errors.values()), wall_time))
+        return rows
+
+    @staticmethod
+    def _row(op: str, values: list, errors: int, wall_time: float) -> dict:
+        return {
+            'op': op,
+            'count': len(values),
+            'errors': errors,
+            'ops_s': len(values) / wall_time if wall_time else 0.0,
+            'mean_ms': statistics.fmean(values) * 1000 if values else 0.0,
+            'p50_ms': percentile(values, 50) * 1000,
+            'p90_ms': percentile(values, 90) * 1000,
+            'p95_ms': percentile(values, 95) * 1000,
+            'p99_ms': percentile(values, 99) * 1000,
+            'max_ms': max(values) * 1000 if values else 0.0,
+        }
+
+
+class SimulatedSession(threading.Thread):
+    """Una sesión de usuario que repite operaciones según la mezcla de su rol."""
+
+    def __init__(self, index: int, role: str, credentials: tuple, stats: LoadStats,
+                 deadline: float, batch_size: int, think_ms: float, seed: int):
+        super().__init__(name=f'session-{index}', daemon=True)
+        self.role = role
+        self.email, self.password = credentials
+        self.stats = stats
+        self.deadline = deadline
+        self.batch_size = batch_size
+        self.think_s = think_ms / 1000.0
+        self.rng = random.Random(seed)
+        self.ctx = None
+
+    def run(self):
+        import coupon_service
+
+        self._timed('login', self._login)
+        mix = ROLE_MIXES[self.role]
+        ops, weights = list(mix), list(mix.values())
+        while time.perf_counter() < self.deadline:
+            op = self.rng.choices(ops, weights)[0]
+            if op == 'login':
+                self._timed(op, self._login)
+            elif op == 'master':
+                self._timed(op, lambda: all(
+                    isinstance(coupon_service.list_table(self.ctx, t), list) for t in ('promos', 'branches', 'issuers')
+                ))
+            elif op == 'report':
+                self._timed(op, self._report)
+            elif op == 'batch':
+                self._timed(op, self._batch)
+            if self.think_s:
+                time.sleep(self.rng.uniform(0, 2 * self.think_s))
+
+    def _timed(self, op: str, func):
+        start = time.perf_counter()
+        try:
+            ok = bool(func())
+        except Exception:
+            ok = False
+        self.stats.record(op, time.perf_counter() - start, ok)
+
+    def _login(self):
+        import account_service
+
+        self.ctx = account_service.sign_in(self.email, self.password)
+        return self.ctx.token is not None
+
+    def _report(self):
+        import coupon_service
+
+        filters = self.rng.choice(['', 'status=eq.redeemed', 'status=eq.active', 'status=eq.expired'])
+        return coupon_service.activity_report(self.ctx, filters) is not None
+
+    def _batch(self):
+        import coupon_service
+
+        promos = coupon_service.list_table(self.ctx, 'promos')
+        issuers = coupon_service.list_table(self.ctx, 'issuers')
+        branches = coupon_service.list_table(self.ctx, 'branches')
+        if not promos or not issuers:
+            return False
+        promo = self.rng.choice(promos)
+        entries = coupon_service.create_coupon_batch(
+            self.ctx,
+            count=self.batch_size,
+            description=promo['description'],
+            promo_id=promo['id'],
+            value_crc=promo['value'],
+            value_usd=round(promo['value'] / 590, 2),
+            issuer_id=self.rng.choice(issuers)['id'],
+            valid_days=30,
+            branch_names=[b['name'] for b in self.rng.sample(branches, k=min(2, len(branches)))],
+            batch_name_prefix=promo['type_name'],
+        )
+        return bool(entries)
+
+
+def run_load_test(sessions: int, duration: float, role_weights: dict, batch_size: int,
+                  latency_ms: float, think_ms: float, seed: int, error_rate: float = 0.0):
+    """Ejecuta la prueba y retorna (filas_de_resumen, tiempo_total, conteo_http)."""
+    server = FakeSupabaseServer(latency_ms=latency_ms, error_rate=error_rate).start()
+    os.environ['SUPABASE_URL'] = server.url
+    credentials = {}
+    for role, email, password in server.db.seed(users_per_role=max(sessions, 1)):
+        credentials.setdefault(role, []).append((email, password))
+
+    # Importar después de fijar SUPABASE_URL para que db_config use el servidor local.
+    import db_config  # noqa: F401
+
+    rng = random.Random(seed)
+    roles, weights = list(role_weights), list(role_weights.values())
+    stats = LoadStats()
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = []
+    for i in range(sessions):
+        role = rng.choices(roles, weights)[0]
+        creds = credentials[role][i % len(credentials[role])]
+        threads.append(SimulatedSession(i, role, creds, stats, deadline, batch_size, think_ms, seed + i))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - start
+    server.stop()
+    return stats.summary(wall_time), wall_time, dict(server.status_counts)
+
+
+def print_report(rows: list, wall_time: float, status_counts: dict):
+    header = f"{'operación':<10}{'n':>8}{'err':>6}{'ops/s':>9}{'media':>9}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+    print(header)
+    print('-' * len(header))
+    for r in rows:
+        print(
+            f"{r['op']:<10}{r['count']:>8}{r['errors']:>6}{r['ops_s']:>9.1f}{r['mean_ms']:>9.1f}"
+            f"{r['p50_ms']:>9.1f}{r['p90_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['max_ms']:>9.1f}"
+        )
+    print(f"\nTiempo total: {wall_time:.1f}s  (latencias en ms)")
+    print(f"Respuestas HTTP del servidor: {dict(sorted(status_counts.items()))}")
+
+    import http_cache
+    import http_client
+    import memory_budget
+    print(f"Cliente HTTP (reintentos, hedging, circuito): {http_client.get_stats()}")
+    # fake_supabase agrega ETags; PostgREST no, así que contra Supabase 'no_validator' se lleva todas las lecturas
+    print(f"Caché condicional (304 reutilizados / descargas completas): {http_cache.get_stats()}")
+    memory = memory_budget.usage()
+    print(f"Memoria retenida: {memory['memory'] / memory_budget.MB:.1f} MB en memoria, "
+          f"{memory['disk'] / memory_budget.MB:.1f} MB en disco, {len(memory['sessions'])} sesiones, {memory['stats']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga con sesiones simuladas contra un Supabase local.')
+    parser.add_argument('--sessions', type=int, default=10, help='Sesiones concurrentes simuladas')
+    parser.add_argument('--duration', type=float, default=15.0, help='Duración en segundos')
+    parser.add_argument('--roles', default=DEFAULT_ROLE_WEIGHTS, help='Pesos por rol, ej. Admin=1,Creator=3,Cashier=6')
+    parser.add_argument('--batch-size', type=int, default=50, help='Tarjetas por lote creado')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Latencia de red simulada por petición')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fracción de peticiones que fallan con 503')
+    parser.add_argument('--think-ms', type=float, default=100.0, help='Pausa media entre acciones de un usuario')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rows, wall_time, status_counts = run_load_test(
+        args.sessions, args.duration, _parse_weights(args.roles), args.batch_size,
+        args.latency_ms, args.think_ms, args.seed, args.error_rate,
+    )
+    print_report(rows, wall_time, status_counts)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+# memory_budget.py
+"""
+Presupuesto de memoria por sesión para los objetos grandes que el proceso retiene.
+
+Con muchas sesiones abiertas lo que más memoria ocupa son los resultados
+parseados que http_cache guarda por URL y token (un reporte de 100.000 cupones
+son ~40 MB de JSON y unas 6 veces más ya parseado). Este módulo lleva la cuenta
+de esos objetos por dueño (el token de la sesión) y en total, y hace cumplir dos
+presupuestos:
+
+- MEMORY_BUDGET_SESSION_MB (por defecto 64): si una sesión lo supera, sus objetos
+  menos usados se bajan a disco.
+- MEMORY_BUDGET_TOTAL_MB (por defecto 512): lo mismo entre todas las sesiones.
+
+Bajar a disco (spill) guarda el objeto con pickle en MEMORY_SPILL_DIR y libera
+la memoria; el siguiente get() lo lee del archivo sin volver a traerlo a memoria.
+Los objetos de menos de MEMORY_SPILL_MIN_KB se descartan en lugar de bajarse (se
+vuelven a pedir al servidor), igual que los spills que no caben en
+MEMORY_SPILL_MAX_MB. Las sesiones sin uso durante MEMORY_IDLE_SECONDS (la vida
+de un token) se liberan completas.
+
+Los tamaños son estimados (ver estimate_size); http_cache pasa el tamaño medido.
+La página 🩺 Diagnóstico muestra el uso actual.
+"""
+import os
+import pickle
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+MB = 1024 * 1024
+SESSION_BUDGET = int(float(os.environ.get('MEMORY_BUDGET_SESSION_MB', 64)) * MB)
+TOTAL_BUDGET = int(float(os.environ.get('MEMORY_BUDGET_TOTAL_MB', 512)) * MB)
+SPILL_DIR = os.environ.get('MEMORY_SPILL_DIR', 'spill')
+SPILL_MAX = int(float(os.environ.get('MEMORY_SPILL_MAX_MB', 2048)) * MB)
+SPILL_MIN = int(float(os.environ.get('MEMORY_SPILL_MIN_KB', 256)) * 1024)
+IDLE_SECONDS = float(os.environ.get('MEMORY_IDLE_SECONDS', 3600))
+SIZE_SAMPLE = 200  # elementos que se miden de una lista grande antes de extrapolar
+
+_MISSING = object()
+
+
+class _Entry:
+    __slots__ = ('owner', 'value', 'size', 'path', 'disk_size')
+
+    def __init__(self, owner, value, size):
+        self.owner = owner
+        self.value = value
+        self.size = size
+        self.path = None
+        self.disk_size = 0
+
+
+_entries = OrderedDict()  # (dueño, llave) -> _Entry, del menos al más usado
+_owners = {}              # dueño -> {'label', 'last_seen'}
+_lock = threading.RLock()
+_stats = {'spills': 0, 'evictions': 0, 'disk_loads': 0, 'idle_drops': 0}
+
+
+# --- Estimación de tamaño ---
+
+def estimate_size(value, _depth: int = 0) -> int:
+    """
+    Bytes aproximados de un objeto: DataFrames con memory_usage(deep=True), bytes y
+    texto por su largo, imágenes PIL por píxeles y, para listas y dicts, la suma de
+    sus elementos (las listas grandes se muestrean y se extrapola).
+    """
+    if hasattr(value, 'memory_usage') and hasattr(value, 'columns'):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (bytes, bytearray, str)):
+        return sys.getsizeof(value)
+    if hasattr(value, 'getbands') and hasattr(value, 'size'):
+        width, height = value.size
+        return width * height * len(value.getbands())
+    size = sys.getsizeof(value)
+    if _depth > 6:
+        return size
+    if isinstance(value, dict):
+        return size + sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = list(value) if not isinstance(value, (list, tuple)) else value
+        if len(items) > SIZE_SAMPLE:
+            sample = items[:SIZE_SAMPLE]
+            return size + sum(estimate_size(v, _depth + 1) for v in sample) * len(items) // SIZE_SAMPLE
+        return size + sum(estimate_size(v, _depth + 1) for v in items)
+    return size
+
+
+# --- Registro ---
+
+def set_label(owner, label: str):
+    """Nombre a mostrar para el dueño (p. ej. el usuario de la sesión); nunca se muestra el token."""
+    with _lock:
+        _owners.setdefault(owner, {'label': None, 'last_seen': time.time()})['label'] = label
+
+
+def _touch(owner):
+    _owners.setdefault(owner, {'label': None, 'last_seen': 0})['last_seen'] = time.time()
+
+
+def put(owner, key, value, size: int = None):
+    """Registra un objeto de `owner` y aplica los presupuestos (puede bajarlo a disco de inmediato)."""
+    entry = _Entry(owner, value, size if size is not None else estimate_size(value))
+    with _lock:
+        _remove((owner, key))
+        _entries[(owner, key)] = entry
+        _touch(owner)
+        _enforce(owner)
+
+
+def contains(owner, key) -> bool:
+    with _lock:
+        return (owner, key) in _entries
+
+
+def get(owner, key, default=None):
+    """El objeto (de memoria o leído del disco) o `default` si no está o se descartó."""
+    with _lock:
+        entry = _entries.get((owner, key))
+        if entry is None:
+            return default
+        _entries.move_to_end((owner, key))
+        _touch(owner)
+        if entry.path is None:
+            return entry.value
+        path = entry.path
+    # Fuera del candado: leer un reporte grande no frena a las demás sesiones
+    try:
+        with open(path, 'rb') as f:
+            value = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        discard(owner, key)
+        return default
+    with _lock:
+        _stats['disk_loads'] += 1
+    return value
+
+
+def discard(owner, key):
+    with _lock:
+        _remove((owner, key))
+
+
+def drop_owner(owner):
+    """Libera todo lo de un dueño (al cerrar sesión)."""
+    with _lock:
+        for entry_key in [k for k in _entries if k[0] == owner]:
+            _remove(entry_key)
+        _owners.pop(owner, None)
+
+
+def clear():
+    with _lock:
+        for entry_key in list(_entries):
+            _remove(entry_key)
+        _owners.clear()
+
+
+def _remove(entry_key):
+    entry = _entries.pop(entry_key, None)
+    if entry is not None and entry.path:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+# --- Presupuestos ---
+
+def _memory(owner=_MISSING) -> int:
+    return sum(e.size for e in _entries.values() if e.path is None and (owner is _MISSING or e.owner == owner))
+
+
+def _disk() -> int:
+    return sum(e.disk_size for e in _entries.values() if e.path)
+
+
+def _spill(entry_key):
+    """Baja el objeto a disco o, si es chico o no se puede escribir, lo descarta."""
+    entry = _entries[entry_key]
+    if entry.size >= SPILL_MIN:
+        path = os.path.join(SPILL_DIR, f"{uuid.uuid4().hex}.pkl")
+        try:
+            os.makedirs(SPILL_DIR, exist_ok=True)
+            with open(path, 'wb') as f:
+                pickle.dump(entry.value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            entry.path, entry.disk_size, entry.value = path, os.path.getsize(path), None
+            _stats['spills'] += 1
+            return
+        except (OSError, pickle.PicklingError, TypeError):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    _entries.pop(entry_key)
+    _stats['evictions'] += 1
+
+
+def _enforce(owner):
+    now = time.time()
+    for idle in [o for o, info in _owners.items() if now - info['last_seen'] > IDLE_SECONDS]:
+        for entry_key in [k for k in _entries if k[0] == idle]:
+            _remove(entry_key)
+        _owners.pop(idle, None)
+        _stats['idle_drops'] += 1
+
+    # Del menos usado al más usado: primero lo de la sesión, después lo de todas
+    for budget, scope in ((SESSION_BUDGET, owner), (TOTAL_BUDGET, _MISSING)):
+        used = _memory(scope)
+        for entry_key in [k for k, e in _entries.items() if e.path is None and (scope is _MISSING or e.owner == scope)]:
+            if used <= budget:
+                break
+            used -= _entries[entry_key].size
+            _spill(entry_key)
+
+    disk = _disk()
+    for entry_key in [k for k, e in _entries.items() if e.path]:
+        if disk <= SPILL_MAX:
+            break
+        disk -= _entries[entry_key].disk_size
+        _remove(entry_key)
+        _stats['evictions'] += 1
+
+
+# --- Consulta ---
+
+def usage() -> dict:
+    """{'memory', 'disk', 'objects', 'stats', 'sessions': [...]} con bytes por sesión."""
+    with _lock:
+        sessions = {}
+        for entry in _entries.values():
+            row = sessions.setdefault(entry.owner, {'memory': 0, 'disk': 0, 'objects': 0, 'spilled': 0})
+            row['objects'] += 1
+            if entry.path:
+                row['disk'] += entry.disk_size
+                row['spilled'] += 1
+            else:
+                row['memory'] += entry.size
+        rows = []
+        for owner, row in sessions.items():
+            info = _owners.get(owner, {})
+            rows.append(dict(row, label=info.get('label') or ('Anónimo' if owner is None else 'Sin nombre'),
+                             last_seen=info.get('last_seen')))
+        return {
+            'memory': _memory(),
+            'disk': _disk(),
+            'objects': len(_entries),
+            'stats': dict(_stats),
+            'sessions': sorted(rows, key=lambda r: r['memory'] + r['disk'], reverse=True),
+        }
+
+
+def file_data(path: str):
+    """
+    `data` diferido para st.download_button: el archivo se lee del disco solo al
+    descargarlo, en lugar de quedar en la memoria de la sesión mientras el botón
+    esté en pantalla.
+    """
+    def read():
+        with open(path, 'rb') as f:
+            return f.read()
+    return read
+
+
+def render_memory_section():
+    """Sección de 🩺 Diagnóstico: uso de memoria por sesión y en total frente a los presupuestos."""
+    import pandas as pd
+    import streamlit as st
+    import auth
+
+    if auth.get_user_role() != 'Admin':
+        return  # La página ya mostró el acceso denegado
+
+    st.subheader("🧠 Memoria por sesión")
+    current = usage()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("En memoria", f"{current['memory'] / MB:.1f} / {TOTAL_BUDGET / MB:.0f} MB")
+    col2.metric("En disco", f"{current['disk'] / MB:.1f} MB")
+    col3.metric("Bajados a disco", current['stats']['spills'])
+    col4.metric("Descartados", current['stats']['evictions'])
+    st.caption(
+        f"Presupuesto por sesión: {SESSION_BUDGET / MB:.0f} MB. Los objetos que lo superan se bajan a "
+        f"`{SPILL_DIR}/` (los menores de {SPILL_MIN // 1024} KB se descartan). "
+        f"Lecturas desde disco: {current['stats']['disk_loads']}."
+    )
+    if not current['sessions']:
+        st.info("No hay objetos retenidos.")
+        return
+    st.dataframe(pd.DataFrame([{
+        'Sesión': row['label'],
+        'Memoria (MB)': round(row['memory'] / MB, 2),
+        'Disco (MB)': round(row['disk'] / MB, 2),
+        'Objetos': row['objects'],
+        'En disco': row['spilled'],
+        'Último uso': time.strftime('%H:%M:%S', time.localtime(row['last_seen'])) if row['last_seen'] else '',
+    } for row in current['sessions']]), width='stretch', hide_index=True)
+    if st.button("Liberar todo"):
+        clear()
+        st.rerun()
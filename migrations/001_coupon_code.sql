@@ -0,0 +1,47 @@
+-- 001_coupon_code.sql
+-- Código compacto del cupón (ver coupon_codes.py): UUID en base32 Crockford
+-- + dígito verificador Luhn mod 32. La app lo envía al crear el lote; la
+-- función coupon_code() permite completar las filas existentes.
+
+ALTER TABLE coupons ADD COLUMN IF NOT EXISTS code text;
+
+CREATE OR REPLACE FUNCTION coupon_code(coupon_id uuid) RETURNS text
+LANGUAGE plpgsql IMMUTABLE STRICT AS $$
+DECLARE
+    alphabet constant text := '0123456789ABCDEFGHJKMNPQRSTVWXYZ';
+    raw bytea := uuid_send(coupon_id);
+    body text := '';
+    symbol int;
+    pos int;
+    total int := 0;
+    factor int := 2;
+    addend int;
+BEGIN
+    -- 26 símbolos de 5 bits; los 128 bits del UUID llevan 2 bits de relleno a la izquierda.
+    FOR i IN 0..25 LOOP
+        symbol := 0;
+        FOR padded IN (i * 5)..(i * 5 + 4) LOOP
+            pos := padded - 2;
+            symbol := symbol * 2;
+            IF pos >= 0 THEN
+                -- get_bit numera desde el bit menos significativo de cada byte
+                symbol := symbol + get_bit(raw, (pos / 8) * 8 + 7 - (pos % 8));
+            END IF;
+        END LOOP;
+        body := body || substr(alphabet, symbol + 1, 1);
+    END LOOP;
+
+    -- Dígito verificador Luhn mod 32 (recorriendo el cuerpo de derecha a izquierda)
+    FOR i IN REVERSE 26..1 LOOP
+        addend := factor * (strpos(alphabet, substr(body, i, 1)) - 1);
+        factor := CASE WHEN factor = 2 THEN 1 ELSE 2 END;
+        total := total + addend / 32 + addend % 32;
+    END LOOP;
+
+    RETURN body || substr(alphabet, ((32 - total % 32) % 32) + 1, 1);
+END;
+$$;
+
+UPDATE coupons SET code = coupon_code(id) WHERE code IS NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS coupons_code_key ON coupons (code);
@@ -0,0 +1,7 @@
+-- 002_master_data_unique_keys.sql
+-- Claves naturales únicas usadas como on_conflict por la importación masiva
+-- (bulk_import.py). Antes de aplicarla, elimine o renombre los duplicados.
+
+CREATE UNIQUE INDEX IF NOT EXISTS branches_name_key ON branches (name);
+CREATE UNIQUE INDEX IF NOT EXISTS issuers_issuer_name_key ON issuers (issuer_name);
+CREATE UNIQUE INDEX IF NOT EXISTS promos_type_name_key ON promos (type_name);
@@ -0,0 +1,87 @@
+-- 003_batch_operations.sql
+-- Operaciones sobre lotes completos o rangos de consecutivos (db_service:
+-- void_batch, extend_batch_expiration, set_batch_branches). Cada función
+-- actualiza los cupones con un solo UPDATE filtrado y, en la misma
+-- transacción, la fila de BATCHES (atributos del lote si la operación cubre
+-- el lote completo, y siempre una entrada en json_qrs->'operations').
+-- Asume branch_permissions y branch_ids como integer[]; si en su proyecto son
+-- jsonb, reemplace `= p_branch_ids` por `= to_jsonb(p_branch_ids)`.
+
+ALTER TABLE coupons ADD COLUMN IF NOT EXISTS is_void boolean NOT NULL DEFAULT false;
+ALTER TABLE batches ADD COLUMN IF NOT EXISTS is_void boolean NOT NULL DEFAULT false;
+
+CREATE INDEX IF NOT EXISTS coupons_batch_id_consecutive_idx ON coupons (batch_id, consecutive);
+
+CREATE OR REPLACE FUNCTION _log_batch_operation(p_batch_id uuid, p_entry jsonb) RETURNS void
+LANGUAGE sql AS $$
+    UPDATE batches
+       SET json_qrs = jsonb_set(
+               coalesce(json_qrs, '{}'::jsonb), '{operations}',
+               coalesce(json_qrs -> 'operations', '[]'::jsonb) || (p_entry || jsonb_build_object('at', now()))
+           )
+     WHERE id = p_batch_id;
+$$;
+
+CREATE OR REPLACE FUNCTION batch_void(
+    p_batch_id uuid, p_consecutive_from integer DEFAULT NULL, p_consecutive_to integer DEFAULT NULL
+) RETURNS integer LANGUAGE plpgsql AS $$
+DECLARE
+    affected integer;
+BEGIN
+    UPDATE coupons SET is_void = true
+     WHERE batch_id = p_batch_id AND NOT is_redeemed AND NOT is_void
+       AND consecutive BETWEEN coalesce(p_consecutive_from, consecutive) AND coalesce(p_consecutive_to, consecutive);
+    GET DIAGNOSTICS affected = ROW_COUNT;
+
+    IF p_consecutive_from IS NULL AND p_consecutive_to IS NULL THEN
+        UPDATE batches SET is_void = true WHERE id = p_batch_id;
+    END IF;
+    PERFORM _log_batch_operation(p_batch_id, jsonb_build_object(
+        'op', 'void', 'from', p_consecutive_from, 'to', p_consecutive_to, 'coupons', affected));
+    RETURN affected;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION batch_extend(
+    p_batch_id uuid, p_expiration_date date,
+    p_consecutive_from integer DEFAULT NULL, p_consecutive_to integer DEFAULT NULL
+) RETURNS integer LANGUAGE plpgsql AS $$
+DECLARE
+    affected integer;
+BEGIN
+    UPDATE coupons SET expiration_date = p_expiration_date
+     WHERE batch_id = p_batch_id AND NOT is_redeemed AND NOT is_void
+       AND consecutive BETWEEN coalesce(p_consecutive_from, consecutive) AND coalesce(p_consecutive_to, consecutive);
+    GET DIAGNOSTICS affected = ROW_COUNT;
+
+    IF p_consecutive_from IS NULL AND p_consecutive_to IS NULL THEN
+        UPDATE batches SET expiration_date = p_expiration_date WHERE id = p_batch_id;
+    END IF;
+    PERFORM _log_batch_operation(p_batch_id, jsonb_build_object(
+        'op', 'extend', 'expiration_date', p_expiration_date,
+        'from', p_consecutive_from, 'to', p_consecutive_to, 'coupons', affected));
+    RETURN affected;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION batch_set_branches(
+    p_batch_id uuid, p_branch_ids integer[],
+    p_consecutive_from integer DEFAULT NULL, p_consecutive_to integer DEFAULT NULL
+) RETURNS integer LANGUAGE plpgsql AS $$
+DECLARE
+    affected integer;
+BEGIN
+    UPDATE coupons SET branch_permissions = p_branch_ids
+     WHERE batch_id = p_batch_id AND NOT is_redeemed AND NOT is_void
+       AND consecutive BETWEEN coalesce(p_consecutive_from, consecutive) AND coalesce(p_consecutive_to, consecutive);
+    GET DIAGNOSTICS affected = ROW_COUNT;
+
+    IF p_consecutive_from IS NULL AND p_consecutive_to IS NULL THEN
+        UPDATE batches SET branch_ids = p_branch_ids WHERE id = p_batch_id;
+    END IF;
+    PERFORM _log_batch_operation(p_batch_id, jsonb_build_object(
+        'op', 'branches', 'branch_ids', to_jsonb(p_branch_ids),
+        'from', p_consecutive_from, 'to', p_consecutive_to, 'coupons', affected));
+    RETURN affected;
+END;
+$$;
@@ -0,0 +1,18 @@
+-- 004_coupon_lookup_indexes.sql
+-- Índices de la búsqueda rápida de cupones (db_service.lookup_coupons). Cada
+-- criterio de búsqueda usa uno de ellos; con el or=(...) Postgres combina los
+-- índices (BitmapOr) y la consulta no recorre la tabla:
+--
+--   consecutive.eq.N                -> coupons_consecutive_idx
+--   invoice_number.eq.X             -> coupons_invoice_number_idx
+--   and(id.gte.A,id.lte.B)          -> llave primaria (prefijo del UUID como rango)
+--   code.like.PREFIJO*              -> coupons_code_prefix_idx
+--
+-- text_pattern_ops permite usar el índice en LIKE 'PREFIJO%' con cualquier
+-- collation (el índice único de 001 solo sirve para igualdad). Verificar con:
+--   EXPLAIN ANALYZE SELECT id FROM coupons
+--    WHERE consecutive = 10234 OR invoice_number = '10234';
+
+CREATE INDEX IF NOT EXISTS coupons_consecutive_idx ON coupons (consecutive);
+CREATE INDEX IF NOT EXISTS coupons_invoice_number_idx ON coupons (invoice_number) WHERE invoice_number IS NOT NULL;
+CREATE INDEX IF NOT EXISTS coupons_code_prefix_idx ON coupons (code text_pattern_ops);
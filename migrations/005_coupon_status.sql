@@ -0,0 +1,57 @@
+-- 005_coupon_status.sql
+-- Estado precalculado del cupón (active / redeemed / expired / void) para que
+-- reportes, conteos y validación filtren con una igualdad indexada en lugar de
+-- comparar fechas fila por fila.
+--
+-- - is_void / is_redeemed siguen siendo la fuente de verdad de anulación y canje
+--   (el escáner PWA solo escribe is_redeemed); el trigger mantiene status al día.
+-- - 'expired' lo asigna el barrido (expiration_sweeper.py o sweep_expired_coupons()
+--   programada con pg_cron) con un solo UPDATE filtrado por ejecución. Si luego se
+--   extiende la vigencia (batch_extend), el trigger devuelve el cupón a 'active'.
+
+ALTER TABLE coupons ADD COLUMN IF NOT EXISTS status text NOT NULL DEFAULT 'active'
+    CHECK (status IN ('active', 'redeemed', 'expired', 'void'));
+
+UPDATE coupons
+   SET status = CASE
+           WHEN is_void THEN 'void'
+           WHEN is_redeemed THEN 'redeemed'
+           WHEN expiration_date < current_date THEN 'expired'
+           ELSE 'active'
+       END;
+
+CREATE INDEX IF NOT EXISTS coupons_status_creation_date_idx ON coupons (status, creation_date DESC);
+-- Índice parcial para el barrido: solo los activos, ordenados por vencimiento
+CREATE INDEX IF NOT EXISTS coupons_active_expiration_idx ON coupons (expiration_date) WHERE status = 'active';
+
+CREATE OR REPLACE FUNCTION coupons_sync_status() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.status := CASE
+        WHEN NEW.is_void THEN 'void'
+        WHEN NEW.is_redeemed THEN 'redeemed'
+        WHEN NEW.status = 'expired' AND NEW.expiration_date < current_date THEN 'expired'
+        ELSE 'active'
+    END;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS coupons_sync_status ON coupons;
+CREATE TRIGGER coupons_sync_status
+    BEFORE INSERT OR UPDATE OF is_void, is_redeemed, expiration_date, status ON coupons
+    FOR EACH ROW EXECUTE FUNCTION coupons_sync_status();
+
+CREATE OR REPLACE FUNCTION sweep_expired_coupons(p_today date DEFAULT current_date) RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    affected integer;
+BEGIN
+    UPDATE coupons SET status = 'expired'
+     WHERE status = 'active' AND expiration_date < p_today;
+    GET DIAGNOSTICS affected = ROW_COUNT;
+    RETURN affected;
+END;
+$$;
+
+-- Opcional (extensión pg_cron): barrido diario a las 00:05
+-- SELECT cron.schedule('sweep-expired-coupons', '5 0 * * *', 'SELECT sweep_expired_coupons()');
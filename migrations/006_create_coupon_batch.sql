@@ -0,0 +1,66 @@
+-- 006_create_coupon_batch.sql
+-- Creación de un lote completo en la base (coupon_service.create_coupon_batch).
+-- La app envía los parámetros del lote una sola vez; los cupones se generan con
+-- generate_series en la misma transacción que la fila de BATCHES, así que el
+-- tamaño de la petición no crece con la cantidad de cupones y un fallo no deja
+-- un lote sin cupones. El consecutivo se asigna aquí, bajo un candado de
+-- transacción, en lugar de leer el máximo desde la app.
+--
+-- Retorna solo lo necesario para imprimir: id del lote, nombre, consecutivo
+-- inicial y los ids de los cupones en orden de consecutivo (el código impreso se
+-- deriva del id con coupon_codes.encode_coupon_id, igual que coupon_code()).
+-- Requiere coupon_code() de 001 y gen_random_uuid() (Postgres 13+).
+-- Asume branch_permissions y branch_ids como integer[] (ver 003). max(consecutive)
+-- usa el índice coupons_consecutive_idx de 004.
+
+CREATE OR REPLACE FUNCTION create_coupon_batch(
+    p_count integer,
+    p_promo_id integer,
+    p_issuer_id integer,
+    p_branch_ids integer[],
+    p_value_colones numeric,
+    p_value_dolares numeric,
+    p_expiration_date date,
+    p_batch_name_prefix text,
+    p_description text,
+    p_created_by uuid
+) RETURNS jsonb LANGUAGE plpgsql AS $$
+DECLARE
+    v_batch_id uuid := gen_random_uuid();
+    v_batch_name text;
+    v_start integer;
+    v_ids uuid[];
+BEGIN
+    IF p_count IS NULL OR p_count < 1 THEN
+        RAISE EXCEPTION 'La cantidad de cupones debe ser mayor que cero';
+    END IF;
+
+    -- Dos lotes simultáneos no pueden tomar el mismo rango de consecutivos
+    PERFORM pg_advisory_xact_lock(hashtext('coupons.consecutive'));
+    SELECT coalesce(max(consecutive), 0) + 1 INTO v_start FROM coupons;
+
+    v_batch_name := p_batch_name_prefix || '_' || to_char(now(), 'YYYYMMDDHH24MISS') || '_' || left(v_batch_id::text, 4);
+
+    INSERT INTO batches (id, batch_name, json_qrs, consecutive_start, consecutive_end, branch_ids,
+                         expiration_date, issuer_id, created_by_user_id)
+    VALUES (v_batch_id, v_batch_name, jsonb_build_object('count', p_count, 'promo_description', p_description),
+            v_start, v_start + p_count - 1, p_branch_ids, p_expiration_date, p_issuer_id, p_created_by);
+
+    WITH inserted AS (
+        INSERT INTO coupons (id, code, batch_id, consecutive, promo_type_id, branch_permissions,
+                             base_value_colones, base_value_dolares, expiration_date)
+        SELECT g.id, coupon_code(g.id), v_batch_id, v_start + g.n - 1, p_promo_id, p_branch_ids,
+               p_value_colones, p_value_dolares, p_expiration_date
+          FROM (SELECT gen_random_uuid() AS id, n FROM generate_series(1, p_count) AS n) AS g
+        RETURNING id, consecutive
+    )
+    SELECT array_agg(id ORDER BY consecutive) INTO v_ids FROM inserted;
+
+    RETURN jsonb_build_object(
+        'batch_id', v_batch_id,
+        'batch_name', v_batch_name,
+        'consecutive_start', v_start,
+        'ids', to_jsonb(v_ids)
+    );
+END;
+$$;
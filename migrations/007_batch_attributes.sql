@@ -0,0 +1,249 @@
+-- 007_batch_attributes.sql
+-- Atributos comunes a todo el lote (promoción, valores base, sucursales y
+-- vencimiento) guardados una sola vez en BATCHES en lugar de repetirse en cada
+-- fila de COUPONS. Un lote de 10.000 cupones repetía 10.000 veces los mismos
+-- cinco valores al insertarse, al guardarse y en cada lectura con select=*.
+--
+-- - En COUPONS las columnas promo_type_id, branch_permissions,
+--   base_value_colones, base_value_dolares y expiration_date quedan en NULL =
+--   "la del lote". Solo tienen valor cuando una operación por rango de
+--   consecutivos (batch_extend, batch_set_branches) o la emisión inmediata
+--   (warm_pool) cambia el atributo de algunos cupones: valor propio del cupón.
+-- - La app resuelve el valor con un embed de batch_id
+--   (coupon_service.resolve_batch_attributes). Para clientes que leen filas
+--   planas (escáner PWA) está la vista coupons_resolved, con los mismos nombres
+--   de columna que antes.
+-- - Las operaciones sobre el lote completo cambian solo la fila de BATCHES y
+--   devuelven los cupones pendientes a "la del lote"; los canjeados o anulados
+--   conservan el valor que tenían (se copia al cupón antes del cambio).
+--
+-- Requiere 003, 005 y 006. Asume branch_permissions y branch_ids como integer[]
+-- (ver 003).
+
+ALTER TABLE batches ADD COLUMN IF NOT EXISTS promo_type_id integer REFERENCES promos (id);
+ALTER TABLE batches ADD COLUMN IF NOT EXISTS base_value_colones numeric;
+ALTER TABLE batches ADD COLUMN IF NOT EXISTS base_value_dolares numeric;
+
+ALTER TABLE coupons ALTER COLUMN promo_type_id DROP NOT NULL;
+ALTER TABLE coupons ALTER COLUMN branch_permissions DROP NOT NULL;
+ALTER TABLE coupons ALTER COLUMN base_value_colones DROP NOT NULL;
+ALTER TABLE coupons ALTER COLUMN base_value_dolares DROP NOT NULL;
+ALTER TABLE coupons ALTER COLUMN expiration_date DROP NOT NULL;
+
+-- Lotes existentes: los atributos del primer cupón del lote
+UPDATE batches b
+   SET promo_type_id = coalesce(b.promo_type_id, first.promo_type_id),
+       base_value_colones = coalesce(b.base_value_colones, first.base_value_colones),
+       base_value_dolares = coalesce(b.base_value_dolares, first.base_value_dolares),
+       branch_ids = coalesce(b.branch_ids, first.branch_permissions),
+       expiration_date = coalesce(b.expiration_date, first.expiration_date)
+  FROM (SELECT DISTINCT ON (batch_id) batch_id, promo_type_id, base_value_colones, base_value_dolares,
+               branch_permissions, expiration_date
+          FROM coupons
+         ORDER BY batch_id, consecutive) AS first
+ WHERE first.batch_id = b.id;
+
+-- Cupones existentes: deja en NULL lo que coincide con el lote. No es necesario
+-- para que la app funcione (un valor igual al del lote da el mismo resultado),
+-- solo libera espacio; con millones de filas conviene correrlo por partes:
+--   SELECT normalize_coupon_rows(50000);  -- repetir hasta que retorne 0
+-- y después VACUUM (o pg_repack) para devolver el espacio.
+CREATE OR REPLACE FUNCTION normalize_coupon_rows(p_limit integer DEFAULT NULL) RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    affected integer;
+BEGIN
+    UPDATE coupons c
+       SET promo_type_id = CASE WHEN c.promo_type_id IS NOT DISTINCT FROM b.promo_type_id THEN NULL ELSE c.promo_type_id END,
+           branch_permissions = CASE WHEN c.branch_permissions IS NOT DISTINCT FROM b.branch_ids THEN NULL ELSE c.branch_permissions END,
+           base_value_colones = CASE WHEN c.base_value_colones IS NOT DISTINCT FROM b.base_value_colones THEN NULL ELSE c.base_value_colones END,
+           base_value_dolares = CASE WHEN c.base_value_dolares IS NOT DISTINCT FROM b.base_value_dolares THEN NULL ELSE c.base_value_dolares END,
+           expiration_date = CASE WHEN c.expiration_date IS NOT DISTINCT FROM b.expiration_date THEN NULL ELSE c.expiration_date END
+      FROM batches b
+     WHERE b.id = c.batch_id
+       AND c.id IN (
+           SELECT c2.id
+             FROM coupons c2 JOIN batches b2 ON b2.id = c2.batch_id
+            WHERE (c2.promo_type_id IS NOT NULL AND c2.promo_type_id IS NOT DISTINCT FROM b2.promo_type_id)
+               OR (c2.branch_permissions IS NOT NULL AND c2.branch_permissions IS NOT DISTINCT FROM b2.branch_ids)
+               OR (c2.base_value_colones IS NOT NULL AND c2.base_value_colones IS NOT DISTINCT FROM b2.base_value_colones)
+               OR (c2.base_value_dolares IS NOT NULL AND c2.base_value_dolares IS NOT DISTINCT FROM b2.base_value_dolares)
+               OR (c2.expiration_date IS NOT NULL AND c2.expiration_date IS NOT DISTINCT FROM b2.expiration_date)
+            LIMIT p_limit
+       );
+    GET DIAGNOSTICS affected = ROW_COUNT;
+    RETURN affected;
+END;
+$$;
+
+-- Lectura plana (mismas columnas que COUPONS, con los atributos ya resueltos).
+-- security_invoker (Postgres 15+): aplica las políticas RLS de quien consulta.
+CREATE OR REPLACE VIEW coupons_resolved WITH (security_invoker = true) AS
+SELECT c.id, c.code, c.batch_id, c.consecutive,
+       coalesce(c.promo_type_id, b.promo_type_id) AS promo_type_id,
+       coalesce(c.branch_permissions, b.branch_ids) AS branch_permissions,
+       coalesce(c.base_value_colones, b.base_value_colones) AS base_value_colones,
+       coalesce(c.base_value_dolares, b.base_value_dolares) AS base_value_dolares,
+       coalesce(c.expiration_date, b.expiration_date) AS expiration_date,
+       c.is_redeemed, c.redemption_date, c.invoice_number, c.redemption_branch_id, c.redeemed_by_user_id,
+       c.creation_date, c.is_void, c.status
+  FROM coupons c
+  LEFT JOIN batches b ON b.id = c.batch_id;
+
+-- --- Estado (reemplaza las funciones de 005) ---
+
+CREATE OR REPLACE FUNCTION coupons_sync_status() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.status := CASE
+        WHEN NEW.is_void THEN 'void'
+        WHEN NEW.is_redeemed THEN 'redeemed'
+        WHEN NEW.status = 'expired'
+             AND coalesce(NEW.expiration_date, (SELECT expiration_date FROM batches WHERE id = NEW.batch_id)) < current_date
+            THEN 'expired'
+        ELSE 'active'
+    END;
+    RETURN NEW;
+END;
+$$;
+
+-- Activos que heredan el vencimiento, por lote (el barrido entra por los lotes vencidos)
+CREATE INDEX IF NOT EXISTS coupons_active_batch_idx ON coupons (batch_id)
+    WHERE status = 'active' AND expiration_date IS NULL;
+CREATE INDEX IF NOT EXISTS batches_expiration_date_idx ON batches (expiration_date);
+
+CREATE OR REPLACE FUNCTION sweep_expired_coupons(p_today date DEFAULT current_date) RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    own integer;
+    inherited integer;
+BEGIN
+    -- Vencimiento propio del cupón (índice parcial coupons_active_expiration_idx de 005)
+    UPDATE coupons SET status = 'expired'
+     WHERE status = 'active' AND expiration_date < p_today;
+    GET DIAGNOSTICS own = ROW_COUNT;
+
+    UPDATE coupons c SET status = 'expired'
+      FROM batches b
+     WHERE b.id = c.batch_id AND b.expiration_date < p_today
+       AND c.status = 'active' AND c.expiration_date IS NULL;
+    GET DIAGNOSTICS inherited = ROW_COUNT;
+    RETURN own + inherited;
+END;
+$$;
+
+-- --- Operaciones por lote (reemplaza batch_extend y batch_set_branches de 003) ---
+
+CREATE OR REPLACE FUNCTION batch_extend(
+    p_batch_id uuid, p_expiration_date date,
+    p_consecutive_from integer DEFAULT NULL, p_consecutive_to integer DEFAULT NULL
+) RETURNS integer LANGUAGE plpgsql AS $$
+DECLARE
+    affected integer;
+BEGIN
+    IF p_consecutive_from IS NULL AND p_consecutive_to IS NULL THEN
+        -- Canjeados y anulados conservan su vencimiento; los pendientes vuelven al del lote
+        UPDATE coupons c SET expiration_date = b.expiration_date
+          FROM batches b
+         WHERE b.id = p_batch_id AND c.batch_id = p_batch_id
+           AND (c.is_redeemed OR c.is_void) AND c.expiration_date IS NULL;
+        UPDATE batches SET expiration_date = p_expiration_date WHERE id = p_batch_id;
+        -- expiration_date en el SET dispara coupons_sync_status aunque ya fuera NULL
+        UPDATE coupons SET expiration_date = NULL
+         WHERE batch_id = p_batch_id AND NOT is_redeemed AND NOT is_void;
+    ELSE
+        UPDATE coupons SET expiration_date = p_expiration_date
+         WHERE batch_id = p_batch_id AND NOT is_redeemed AND NOT is_void
+           AND consecutive BETWEEN coalesce(p_consecutive_from, consecutive) AND coalesce(p_consecutive_to, consecutive);
+    END IF;
+    GET DIAGNOSTICS affected = ROW_COUNT;
+
+    PERFORM _log_batch_operation(p_batch_id, jsonb_build_object(
+        'op', 'extend', 'expiration_date', p_expiration_date,
+        'from', p_consecutive_from, 'to', p_consecutive_to, 'coupons', affected));
+    RETURN affected;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION batch_set_branches(
+    p_batch_id uuid, p_branch_ids integer[],
+    p_consecutive_from integer DEFAULT NULL, p_consecutive_to integer DEFAULT NULL
+) RETURNS integer LANGUAGE plpgsql AS $$
+DECLARE
+    affected integer;
+BEGIN
+    IF p_consecutive_from IS NULL AND p_consecutive_to IS NULL THEN
+        UPDATE coupons c SET branch_permissions = b.branch_ids
+          FROM batches b
+         WHERE b.id = p_batch_id AND c.batch_id = p_batch_id
+           AND (c.is_redeemed OR c.is_void) AND c.branch_permissions IS NULL;
+        UPDATE batches SET branch_ids = p_branch_ids WHERE id = p_batch_id;
+        UPDATE coupons SET branch_permissions = NULL
+         WHERE batch_id = p_batch_id AND NOT is_redeemed AND NOT is_void;
+    ELSE
+        UPDATE coupons SET branch_permissions = p_branch_ids
+         WHERE batch_id = p_batch_id AND NOT is_redeemed AND NOT is_void
+           AND consecutive BETWEEN coalesce(p_consecutive_from, consecutive) AND coalesce(p_consecutive_to, consecutive);
+    END IF;
+    GET DIAGNOSTICS affected = ROW_COUNT;
+
+    PERFORM _log_batch_operation(p_batch_id, jsonb_build_object(
+        'op', 'branches', 'branch_ids', to_jsonb(p_branch_ids),
+        'from', p_consecutive_from, 'to', p_consecutive_to, 'coupons', affected));
+    RETURN affected;
+END;
+$$;
+
+-- --- Creación de lotes (reemplaza create_coupon_batch de 006) ---
+-- Los atributos van en la fila de BATCHES; cada cupón lleva solo id, código,
+-- lote y consecutivo.
+
+CREATE OR REPLACE FUNCTION create_coupon_batch(
+    p_count integer,
+    p_promo_id integer,
+    p_issuer_id integer,
+    p_branch_ids integer[],
+    p_value_colones numeric,
+    p_value_dolares numeric,
+    p_expiration_date date,
+    p_batch_name_prefix text,
+    p_description text,
+    p_created_by uuid
+) RETURNS jsonb LANGUAGE plpgsql AS $$
+DECLARE
+    v_batch_id uuid := gen_random_uuid();
+    v_batch_name text;
+    v_start integer;
+    v_ids uuid[];
+BEGIN
+    IF p_count IS NULL OR p_count < 1 THEN
+        RAISE EXCEPTION 'La cantidad de cupones debe ser mayor que cero';
+    END IF;
+
+    PERFORM pg_advisory_xact_lock(hashtext('coupons.consecutive'));
+    SELECT coalesce(max(consecutive), 0) + 1 INTO v_start FROM coupons;
+
+    v_batch_name := p_batch_name_prefix || '_' || to_char(now(), 'YYYYMMDDHH24MISS') || '_' || left(v_batch_id::text, 4);
+
+    INSERT INTO batches (id, batch_name, json_qrs, consecutive_start, consecutive_end, branch_ids,
+                         expiration_date, issuer_id, created_by_user_id, promo_type_id,
+                         base_value_colones, base_value_dolares)
+    VALUES (v_batch_id, v_batch_name, jsonb_build_object('count', p_count, 'promo_description', p_description),
+            v_start, v_start + p_count - 1, p_branch_ids, p_expiration_date, p_issuer_id, p_created_by,
+            p_promo_id, p_value_colones, p_value_dolares);
+
+    WITH inserted AS (
+        INSERT INTO coupons (id, code, batch_id, consecutive)
+        SELECT g.id, coupon_code(g.id), v_batch_id, v_start + g.n - 1
+          FROM (SELECT gen_random_uuid() AS id, n FROM generate_series(1, p_count) AS n) AS g
+        RETURNING id, consecutive
+    )
+    SELECT array_agg(id ORDER BY consecutive) INTO v_ids FROM inserted;
+
+    RETURN jsonb_build_object(
+        'batch_id', v_batch_id,
+        'batch_name', v_batch_name,
+        'consecutive_start', v_start,
+        'ids', to_jsonb(v_ids)
+    );
+END;
+$$;
@@ -0,0 +1,191 @@
+-- 008_coupon_archive.sql
+-- Archivo de cupones (particionado caliente / frío). COUPONS solo crece, y los
+-- reportes, la búsqueda y el cálculo del siguiente consecutivo recorren toda la
+-- historia. Los cupones que ya no cambian (canjeados o vencidos hace más de
+-- p_after_days días) se mueven a COUPONS_ARCHIVE por bloques con
+-- archive_coupons(); COUPONS queda con lo vigente.
+--
+-- - Reportes (coupon_service.activity_report): solo COUPONS, salvo que la fecha
+--   de creación "desde" caiga en el rango del archivo (su creation_date más
+--   reciente); entonces consulta las dos tablas y une los resultados.
+-- - Búsqueda rápida y validación: consultan el archivo solo si COUPONS no tiene
+--   el cupón.
+-- - El siguiente consecutivo considera las dos tablas.
+-- - batch_extend devuelve a COUPONS los cupones vencidos archivados del lote (o
+--   del rango) antes de cambiar el vencimiento.
+--
+-- Requiere 005 y 007. COUPONS_ARCHIVE copia las columnas de COUPONS (LIKE): si
+-- una migración futura agrega columnas a COUPONS, debe agregarlas también aquí.
+
+-- Las llaves foráneas permiten los mismos embeds del reporte (lote, sucursal y cajero de canje)
+CREATE TABLE IF NOT EXISTS coupons_archive (
+    LIKE coupons INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+    archived_at timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (id),
+    FOREIGN KEY (batch_id) REFERENCES batches (id),
+    FOREIGN KEY (promo_type_id) REFERENCES promos (id),
+    FOREIGN KEY (redemption_branch_id) REFERENCES branches (id),
+    FOREIGN KEY (redeemed_by_user_id) REFERENCES profiles (id)
+);
+
+-- Los mismos accesos que en COUPONS (004 y 005)
+CREATE UNIQUE INDEX IF NOT EXISTS coupons_archive_code_idx ON coupons_archive (code);
+CREATE INDEX IF NOT EXISTS coupons_archive_batch_id_consecutive_idx ON coupons_archive (batch_id, consecutive);
+CREATE INDEX IF NOT EXISTS coupons_archive_consecutive_idx ON coupons_archive (consecutive);
+CREATE INDEX IF NOT EXISTS coupons_archive_invoice_number_idx ON coupons_archive (invoice_number);
+CREATE INDEX IF NOT EXISTS coupons_archive_creation_date_idx ON coupons_archive (creation_date DESC);
+CREATE INDEX IF NOT EXISTS coupons_archive_status_creation_date_idx ON coupons_archive (status, creation_date DESC);
+
+-- Lectura para usuarios autenticados; las escrituras pasan por las funciones de abajo
+ALTER TABLE coupons_archive ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS coupons_archive_read ON coupons_archive;
+CREATE POLICY coupons_archive_read ON coupons_archive FOR SELECT TO authenticated USING (true);
+
+-- Candidatos del barrido de canjeados
+CREATE INDEX IF NOT EXISTS coupons_redeemed_date_idx ON coupons (redemption_date) WHERE status = 'redeemed';
+
+-- Mueve hasta p_limit cupones canjeados o vencidos hace más de p_after_days días.
+-- Retorna cuántos movió; repetir hasta que retorne menos de p_limit. Cada llamada
+-- es una transacción corta (SKIP LOCKED: no espera a los canjes en curso).
+CREATE OR REPLACE FUNCTION archive_coupons(p_after_days integer DEFAULT 180, p_limit integer DEFAULT 5000)
+RETURNS integer LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+DECLARE
+    affected integer;
+BEGIN
+    WITH candidates AS (
+        SELECT c.id
+          FROM coupons c
+          LEFT JOIN batches b ON b.id = c.batch_id
+         WHERE (c.status = 'redeemed' AND c.redemption_date < now() - make_interval(days => p_after_days))
+            OR (c.status = 'expired' AND coalesce(c.expiration_date, b.expiration_date) < current_date - p_after_days)
+         LIMIT p_limit
+           FOR UPDATE OF c SKIP LOCKED
+    ), moved AS (
+        DELETE FROM coupons c USING candidates WHERE c.id = candidates.id RETURNING c.*
+    )
+    -- Por nombre de columna (jsonb), no por posición
+    INSERT INTO coupons_archive
+    SELECT (jsonb_populate_record(NULL::coupons_archive, to_jsonb(m) || jsonb_build_object('archived_at', now()))).*
+      FROM moved m;
+    GET DIAGNOSTICS affected = ROW_COUNT;
+    RETURN affected;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION archive_coupons(integer, integer) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION archive_coupons(integer, integer) TO authenticated;
+
+-- Devuelve a COUPONS los pendientes archivados (vencidos) del lote o del rango
+CREATE OR REPLACE FUNCTION restore_archived_coupons(
+    p_batch_id uuid, p_consecutive_from integer DEFAULT NULL, p_consecutive_to integer DEFAULT NULL
+) RETURNS integer LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+DECLARE
+    affected integer;
+BEGIN
+    WITH restored AS (
+        DELETE FROM coupons_archive a
+         WHERE a.batch_id = p_batch_id AND NOT a.is_redeemed AND NOT a.is_void
+           AND a.consecutive BETWEEN coalesce(p_consecutive_from, a.consecutive) AND coalesce(p_consecutive_to, a.consecutive)
+        RETURNING a.*
+    )
+    INSERT INTO coupons
+    SELECT (jsonb_populate_record(NULL::coupons, to_jsonb(r))).* FROM restored r;
+    GET DIAGNOSTICS affected = ROW_COUNT;
+    RETURN affected;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION restore_archived_coupons(uuid, integer, integer) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION restore_archived_coupons(uuid, integer, integer) TO authenticated;
+
+-- --- batch_extend (reemplaza la de 007): primero recupera los vencidos archivados ---
+
+CREATE OR REPLACE FUNCTION batch_extend(
+    p_batch_id uuid, p_expiration_date date,
+    p_consecutive_from integer DEFAULT NULL, p_consecutive_to integer DEFAULT NULL
+) RETURNS integer LANGUAGE plpgsql AS $$
+DECLARE
+    affected integer;
+BEGIN
+    PERFORM restore_archived_coupons(p_batch_id, p_consecutive_from, p_consecutive_to);
+
+    IF p_consecutive_from IS NULL AND p_consecutive_to IS NULL THEN
+        UPDATE coupons c SET expiration_date = b.expiration_date
+          FROM batches b
+         WHERE b.id = p_batch_id AND c.batch_id = p_batch_id
+           AND (c.is_redeemed OR c.is_void) AND c.expiration_date IS NULL;
+        UPDATE batches SET expiration_date = p_expiration_date WHERE id = p_batch_id;
+        UPDATE coupons SET expiration_date = NULL
+         WHERE batch_id = p_batch_id AND NOT is_redeemed AND NOT is_void;
+    ELSE
+        UPDATE coupons SET expiration_date = p_expiration_date
+         WHERE batch_id = p_batch_id AND NOT is_redeemed AND NOT is_void
+           AND consecutive BETWEEN coalesce(p_consecutive_from, consecutive) AND coalesce(p_consecutive_to, consecutive);
+    END IF;
+    GET DIAGNOSTICS affected = ROW_COUNT;
+
+    PERFORM _log_batch_operation(p_batch_id, jsonb_build_object(
+        'op', 'extend', 'expiration_date', p_expiration_date,
+        'from', p_consecutive_from, 'to', p_consecutive_to, 'coupons', affected));
+    RETURN affected;
+END;
+$$;
+
+-- --- create_coupon_batch (reemplaza la de 007): consecutivo sobre las dos tablas ---
+
+CREATE OR REPLACE FUNCTION create_coupon_batch(
+    p_count integer,
+    p_promo_id integer,
+    p_issuer_id integer,
+    p_branch_ids integer[],
+    p_value_colones numeric,
+    p_value_dolares numeric,
+    p_expiration_date date,
+    p_batch_name_prefix text,
+    p_description text,
+    p_created_by uuid
+) RETURNS jsonb LANGUAGE plpgsql AS $$
+DECLARE
+    v_batch_id uuid := gen_random_uuid();
+    v_batch_name text;
+    v_start integer;
+    v_ids uuid[];
+BEGIN
+    IF p_count IS NULL OR p_count < 1 THEN
+        RAISE EXCEPTION 'La cantidad de cupones debe ser mayor que cero';
+    END IF;
+
+    PERFORM pg_advisory_xact_lock(hashtext('coupons.consecutive'));
+    -- Un consecutivo archivado tampoco se reutiliza
+    SELECT greatest(coalesce((SELECT max(consecutive) FROM coupons), 0),
+                    coalesce((SELECT max(consecutive) FROM coupons_archive), 0)) + 1
+      INTO v_start;
+
+    v_batch_name := p_batch_name_prefix || '_' || to_char(now(), 'YYYYMMDDHH24MISS') || '_' || left(v_batch_id::text, 4);
+
+    INSERT INTO batches (id, batch_name, json_qrs, consecutive_start, consecutive_end, branch_ids,
+                         expiration_date, issuer_id, created_by_user_id, promo_type_id,
+                         base_value_colones, base_value_dolares)
+    VALUES (v_batch_id, v_batch_name, jsonb_build_object('count', p_count, 'promo_description', p_description),
+            v_start, v_start + p_count - 1, p_branch_ids, p_expiration_date, p_issuer_id, p_created_by,
+            p_promo_id, p_value_colones, p_value_dolares);
+
+    WITH inserted AS (
+        INSERT INTO coupons (id, code, batch_id, consecutive)
+        SELECT g.id, coupon_code(g.id), v_batch_id, v_start + g.n - 1
+          FROM (SELECT gen_random_uuid() AS id, n FROM generate_series(1, p_count) AS n) AS g
+        RETURNING id, consecutive
+    )
+    SELECT array_agg(id ORDER BY consecutive) INTO v_ids FROM inserted;
+
+    RETURN jsonb_build_object(
+        'batch_id', v_batch_id,
+        'batch_name', v_batch_name,
+        'consecutive_start', v_start,
+        'ids', to_jsonb(v_ids)
+    );
+END;
+$$;
+
+-- Opcional (extensión pg_cron): cada 10 minutos entre la 1:00 y las 5:59, 5.000 cupones por vez
+-- SELECT cron.schedule('archive-coupons', '*/10 1-5 * * *', 'SELECT archive_coupons(180, 5000)');
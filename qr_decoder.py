@@ -0,0 +1,195 @@
+# qr_decoder.py
+"""
+Lectura de QRs desde fotos de tarjetas (Escáner del Cajero y bench_decode.py).
+
+Las fotos de celular son grandes, vienen inclinadas y a menudo desenfocadas. En
+lugar de pasar la foto completa a un solo decodificador, se prueba una cascada
+de etapas de menor a mayor costo y se sale en la primera que lee el código:
+
+1. zbar        pyzbar sobre la imagen en gris reducida a MAX_SIDE px.
+2. zbar_umbral umbral adaptativo (sombras, poco contraste) y pyzbar.
+3. recorte     busca regiones cuadradas con muchos bordes (candidatas a QR), las
+               recorta de la imagen a FULL_SIDE px y las decodifica por separado
+               (tal cual, con umbral, con máscara de enfoque y reducidas).
+4. opencv      detector de QR de OpenCV (tolera mejor la perspectiva y el
+               desenfoque), sobre la imagen reducida y después la de FULL_SIDE px.
+
+pyzbar necesita la biblioteca del sistema zbar (packages.txt: libzbar0). Si no
+está instalada, las etapas 1 y 2 se omiten y el recorte usa OpenCV.
+"""
+import io
+import os
+import time
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+MAX_SIDE = int(os.environ.get('QR_DECODE_MAX_SIDE', 1024))
+# Resolución "completa" para recortes y el último intento de OpenCV: un JPEG de 12 MP se
+# decodifica directamente a escala 1/2 (DCT reducida), ~10 veces más rápido que completo
+FULL_SIDE = int(os.environ.get('QR_DECODE_FULL_SIDE', 2000))
+ROI_CANDIDATES = 4   # regiones que se prueban en la etapa de recorte
+ROI_SIDE = 600       # lado al que se lleva cada recorte antes de decodificar
+SMALL_CROP_SIDE = 200
+ROI_MARGIN = 0.15    # margen alrededor de la región (zona silenciosa del QR)
+
+
+class DecodeResult(NamedTuple):
+    text: str
+    stage: str
+    elapsed_ms: float
+
+
+_zbar = {}
+
+
+def _zbar_decoder():
+    """pyzbar.decode limitado a QR, o None si pyzbar o la biblioteca zbar no están disponibles."""
+    if 'decode' not in _zbar:
+        try:
+            from pyzbar.pyzbar import ZBarSymbol, decode
+            _zbar['decode'] = lambda gray: decode(gray, symbols=[ZBarSymbol.QRCODE])
+        except ImportError:  # pyzbar también lanza ImportError si falta libzbar
+            _zbar['decode'] = None
+    return _zbar['decode']
+
+
+def load_gray(image, full_side: int = FULL_SIDE) -> np.ndarray:
+    """
+    Imagen en gris (uint8) desde una ruta, bytes, archivo abierto, imagen PIL o arreglo.
+    Los JPEG se decodifican a la menor escala que conserve `full_side` px en el lado mayor.
+    """
+    if isinstance(image, np.ndarray):
+        return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    if isinstance(image, (bytes, bytearray)):
+        image = io.BytesIO(image)
+    if not isinstance(image, Image.Image):
+        image = Image.open(image)
+        if full_side and image.format == 'JPEG':
+            scale = full_side / max(image.size)
+            image.draft('L', (round(image.width * scale), round(image.height * scale)))
+    # Las fotos de celular guardan la rotación en EXIF; sin aplicarla el QR llega de costado
+    return np.asarray(ImageOps.exif_transpose(image).convert('L'))
+
+
+def _downscale(gray: np.ndarray, max_side: int) -> np.ndarray:
+    scale = max_side / max(gray.shape)
+    if scale >= 1:
+        return gray
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def _read_zbar(gray: np.ndarray):
+    results = _zbar_decoder()(gray)
+    return results[0].data.decode('utf-8', 'replace') if results else None
+
+
+def _read_opencv(gray: np.ndarray):
+    text, _, _ = cv2.QRCodeDetector().detectAndDecode(gray)
+    return text or None
+
+
+def _read_any(gray: np.ndarray):
+    """Decodificador de los recortes: zbar si está disponible (más rápido), si no OpenCV."""
+    return _read_zbar(gray) if _zbar_decoder() else _read_opencv(gray)
+
+
+def _adaptive_threshold(gray: np.ndarray) -> np.ndarray:
+    block = max(15, min(gray.shape) // 20) | 1  # Impar y proporcional al tamaño
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, block, 5)
+
+
+def _candidate_regions(small: np.ndarray) -> list:
+    """Rectángulos (x, y, w, h) de la imagen reducida que pueden contener el QR, del más grande al más chico."""
+    # El QR es la zona con más bordes por área: gradiente morfológico, umbral y cierre
+    # para unir sus módulos en una sola mancha (el fondo liso y las líneas de texto no forman cuadrados)
+    gradient = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, np.ones((3, 3), np.uint8))
+    binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, min(small.shape) // 50),) * 2)
+    binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
+    contours, _ = cv2.findContours(binary, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)  # El QR queda dentro del contorno de la tarjeta
+    min_area = small.shape[0] * small.shape[1] * 0.003
+    max_area = small.shape[0] * small.shape[1] * 0.5
+    regions = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if min_area <= w * h <= max_area and 0.6 <= w / h <= 1.6 and cv2.contourArea(contour) >= 0.5 * w * h:
+            regions.append((x, y, w, h))
+    return sorted(regions, key=lambda r: r[2] * r[3], reverse=True)[:ROI_CANDIDATES]
+
+
+# --- Etapas: cada una recibe (imagen completa, imagen reducida) y retorna el texto o None ---
+
+def _stage_zbar(gray, small):
+    return _read_zbar(small)
+
+
+def _stage_zbar_threshold(gray, small):
+    return _read_zbar(_adaptive_threshold(small))
+
+
+def _stage_crop(gray, small):
+    scale = gray.shape[0] / small.shape[0]
+    for x, y, w, h in _candidate_regions(small):
+        margin = ROI_MARGIN * max(w, h)
+        x0, y0 = max(0, int((x - margin) * scale)), max(0, int((y - margin) * scale))
+        x1, y1 = int((x + w + margin) * scale), int((y + h + margin) * scale)
+        crop = gray[y0:y1, x0:x1]
+        factor = ROI_SIDE / max(crop.shape)
+        crop = cv2.resize(crop, None, fx=factor, fy=factor,
+                          interpolation=cv2.INTER_AREA if factor < 1 else cv2.INTER_CUBIC)
+        for variant in _crop_variants(crop):
+            text = _read_any(variant)
+            if text:
+                return text
+    return None
+
+
+def _crop_variants(crop: np.ndarray):
+    """El recorte tal cual y, si no se lee, versiones para sombras y desenfoque (de menor a mayor costo)."""
+    yield crop
+    yield _adaptive_threshold(crop)
+    # Máscara de enfoque: recupera los bordes de los módulos en fotos desenfocadas
+    yield cv2.addWeighted(crop, 2.5, cv2.GaussianBlur(crop, (0, 0), 6), -1.5, 0)
+    # Reducido: el desenfoque por movimiento ocupa menos de un módulo
+    yield cv2.resize(crop, None, fx=SMALL_CROP_SIDE / max(crop.shape), fy=SMALL_CROP_SIDE / max(crop.shape),
+                     interpolation=cv2.INTER_AREA)
+
+
+def _stage_opencv(gray, small):
+    return _read_opencv(small) or (_read_opencv(gray) if gray is not small else None)
+
+
+STAGES = [
+    ('zbar', _stage_zbar, True),
+    ('zbar_umbral', _stage_zbar_threshold, True),
+    ('recorte', _stage_crop, False),
+    ('opencv', _stage_opencv, False),
+]
+
+
+def available_stages() -> list:
+    """Nombres de las etapas que pueden correr aquí (las de zbar requieren la biblioteca del sistema)."""
+    has_zbar = _zbar_decoder() is not None
+    return [name for name, _, needs_zbar in STAGES if has_zbar or not needs_zbar]
+
+
+def decode(image, stages: list = None, max_side: int = MAX_SIDE):
+    """
+    Lee el QR de una foto probando las etapas en orden hasta la primera que lo logra.
+    Retorna DecodeResult(texto, etapa, ms) o None si ninguna lo leyó.
+    `stages` limita las etapas (p. ej. ['zbar'] para medir solo la primera).
+    """
+    start = time.perf_counter()
+    gray = load_gray(image)
+    small = _downscale(gray, max_side)
+    enabled = available_stages()
+    for name, stage, _ in STAGES:
+        if name not in enabled or (stages is not None and name not in stages):
+            continue
+        text = stage(gray, small)
+        if text:
+            return DecodeResult(text, name, (time.perf_counter() - start) * 1000)
+    return None
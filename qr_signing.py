@@ -0,0 +1,123 @@
+# qr_signing.py
+"""
+Payload firmado (opcional) para los QR de cupones.
+
+Formato (83 caracteres, todos del modo alfanumérico de QR):
+
+    NA1.<cupón 26>.<lote 26>.<vencimiento AAAAMMDD>.<HMAC 16>
+
+Los IDs van en base32 Crockford (coupon_codes) y la firma es un
+HMAC-SHA256 truncado a 80 bits, también en base32. Con la llave compartida
+el escáner puede rechazar códigos falsificados o mal formados sin consultar
+la base de datos; solo los códigos auténticos llegan a PostgREST.
+
+El vencimiento impreso es el de la emisión: si el lote se extiende queda
+viejo, así que el Escáner verifica con check_expiry=False y usa el de la base.
+
+La llave se lee de la variable de entorno QR_SIGNING_KEY. Sin llave la
+firma está deshabilitada y la app usa el código compacto normal.
+"""
+import base64
+import hashlib
+import hmac
+import os
+from datetime import date, datetime
+from typing import NamedTuple
+
+import coupon_codes
+
+PREFIX = 'NA1'
+SEPARATOR = '.'
+MAC_BYTES = 10    # 80 bits
+MAC_LENGTH = 16   # 80 bits / 5 bits por símbolo
+PAYLOAD_LENGTH = len(PREFIX) + 4 * len(SEPARATOR) + 2 * coupon_codes.BODY_LENGTH + 8 + MAC_LENGTH
+
+# base32 RFC 4648 -> alfabeto Crockford, para mantener un solo alfabeto en los QR.
+_TO_CROCKFORD = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ234567', coupon_codes.ALPHABET)
+
+
+class InvalidPayload(ValueError):
+    """El payload está mal formado o su firma no es válida."""
+
+
+class ExpiredPayload(InvalidPayload):
+    """El payload es auténtico pero su fecha de vencimiento ya pasó."""
+
+
+class SignedPayload(NamedTuple):
+    coupon_id: str
+    batch_id: str
+    expiration_date: date
+
+
+def get_signing_key():
+    """Retorna la llave de firma (bytes) o None si no está configurada."""
+    key = os.environ.get('QR_SIGNING_KEY')
+    return key.encode('utf-8') if key else None
+
+
+def signing_enabled() -> bool:
+    return get_signing_key() is not None
+
+
+def _mac(message: str, key: bytes) -> str:
+    digest = hmac.new(key, message.encode('ascii'), hashlib.sha256).digest()[:MAC_BYTES]
+    return base64.b32encode(digest).decode('ascii').translate(_TO_CROCKFORD)
+
+
+def _as_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def sign_payload(coupon_id, batch_id, expiration_date, key: bytes = None) -> str:
+    """Construye el payload firmado para un cupón."""
+    key = key or get_signing_key()
+    if not key:
+        raise RuntimeError("QR_SIGNING_KEY no está configurada.")
+    message = SEPARATOR.join([
+        PREFIX,
+        coupon_codes.encode_uuid(coupon_id),
+        coupon_codes.encode_uuid(batch_id),
+        _as_date(expiration_date).strftime('%Y%m%d'),
+    ])
+    return f"{message}{SEPARATOR}{_mac(message, key)}"
+
+
+def is_signed_payload(text: str) -> bool:
+    """Chequeo barato de formato (no verifica la firma)."""
+    return len(text) == PAYLOAD_LENGTH and text.startswith(PREFIX + SEPARATOR)
+
+
+def verify_payload(text: str, key: bytes = None, today: date = None, check_expiry: bool = True) -> SignedPayload:
+    """
+    Verifica firma y vencimiento sin acceso a red.
+    Lanza InvalidPayload (o ExpiredPayload) si el código debe rechazarse.
+    """
+    key = key or get_signing_key()
+    if not key:
+        raise RuntimeError("QR_SIGNING_KEY no está configurada.")
+
+    text = text.strip().upper()
+    if not is_signed_payload(text):
+        raise InvalidPayload("Formato de QR no reconocido.")
+    message, _, mac = text.rpartition(SEPARATOR)
+    if not hmac.compare_digest(mac, _mac(message, key)):
+        raise InvalidPayload("Firma inválida: el QR no fue emitido por Novillo Alegre.")
+
+    _, coupon_part, batch_part, expiration_part = message.split(SEPARATOR)
+    try:
+        payload = SignedPayload(
+            coupon_id=coupon_codes.decode_uuid(coupon_part),
+            batch_id=coupon_codes.decode_uuid(batch_part),
+            expiration_date=datetime.strptime(expiration_part, '%Y%m%d').date(),
+        )
+    except ValueError as err:
+        raise InvalidPayload(f"Payload mal formado: {err}") from err
+
+    if check_expiry and payload.expiration_date < (today or date.today()):
+        raise ExpiredPayload(f"QR vencido el {payload.expiration_date.isoformat()}.")
+    return payload
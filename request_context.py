@@ -0,0 +1,75 @@
+# request_context.py
+"""
+Contexto explícito de una petición y errores de la capa de servicios.
+
+Los servicios (coupon_service, account_service) no leen st.session_state ni
+llaman a st.error: reciben un RequestContext y lanzan ServiceError. Así el
+mismo código corre en una página de Streamlit, un hilo o proceso de trabajo,
+un CLI o un worker HTTP. Las páginas son adaptadores delgados: arman el
+contexto con from_session() y muestran el mensaje del error.
+"""
+from typing import NamedTuple
+
+
+class ServiceError(Exception):
+    """Error de un servicio con un mensaje apto para mostrar al usuario."""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+class NotAuthenticated(ServiceError):
+    """La operación requiere un token de sesión."""
+
+
+class PermissionDenied(ServiceError):
+    """El rol del contexto no puede ejecutar la operación."""
+
+
+class InvalidCredentials(ServiceError):
+    """Correo o contraseña incorrectos."""
+
+
+class AlreadyExists(ServiceError):
+    """El registro (p. ej. el correo de un usuario) ya existe."""
+
+
+class RateLimited(ServiceError):
+    """El backend siguió respondiendo 429 después de los reintentos de http_client."""
+
+
+class RequestContext(NamedTuple):
+    token: str = None
+    user_id: str = None
+    role: str = None
+    branch_id: int = None
+    username: str = None
+    email: str = None
+
+    def require_auth(self, message: str = "Se requiere autenticación para esta acción."):
+        if not self.token:
+            raise NotAuthenticated(message)
+        return self
+
+    def require_role(self, *roles: str):
+        self.require_auth()
+        if self.role not in roles:
+            raise PermissionDenied(f"Acceso denegado. Se requiere rol {' o '.join(roles)}.")
+        return self
+
+
+def from_session() -> RequestContext:
+    """Contexto de la sesión de Streamlit actual (solo para las páginas)."""
+    import streamlit as st
+
+    state = st.session_state
+    user = state.get('user') or {}
+    return RequestContext(
+        token=state.get('token'),
+        user_id=state.get('user_id'),
+        role=state.get('user_role'),
+        branch_id=state.get('branch_id'),
+        username=state.get('username'),
+        email=user.get('email'),
+    )
@@ -0,0 +1,215 @@
+# rerun_profiler.py
+"""
+Perfilador opcional de cada ejecución (rerun) del script de Streamlit.
+
+Streamlit vuelve a ejecutar app.py completo en cada interacción. Con el modo
+activado (página 🩺 Diagnóstico o RERUN_PROFILER=1), cada rerun de una página
+corre bajo un perfilador por muestreo: un hilo toma la pila del hilo del script
+cada PROFILER_INTERVAL_MS y la acumula por página (app_mode). Así se ve si el
+tiempo se va en la red (http_client), en pandas, en Pillow o en los widgets.
+
+Solo usa la biblioteca estándar. El resultado de cada página se guarda en
+RERUN_PROFILE_DIR/<página>.folded, en formato de pilas "plegadas" (una línea
+por pila con su cantidad de muestras), que aceptan flamegraph.pl y speedscope:
+
+    flamegraph.pl profiles/reportes_admin.folded > reportes.svg
+
+Desactivado, profile() no agrega trabajo al rerun.
+"""
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_DIR = os.environ.get('RERUN_PROFILE_DIR', 'profiles')
+SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILER_INTERVAL_MS', 5))
+HOT_FUNCTIONS = 15
+
+_state = {'enabled': os.environ.get('RERUN_PROFILER', '').lower() in ('1', 'true', 'yes')}
+_pages = {}
+_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return _state['enabled']
+
+
+def set_enabled(value: bool):
+    """Activa o desactiva el perfilado para todas las sesiones del proceso."""
+    _state['enabled'] = bool(value)
+
+
+def _label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class _Sampler(threading.Thread):
+    """Toma muestras de la pila de un hilo hasta que se detiene."""
+
+    def __init__(self, thread_id: int, root_code, interval: float):
+        super().__init__(name='rerun-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.root_code = root_code
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            # De la función actual hacia arriba, hasta el módulo app.py (lo de arriba es Streamlit)
+            while frame is not None:
+                stack.append(_label(frame.f_code))
+                if frame.f_code is self.root_code:
+                    break
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def page_slug(app_mode: str) -> str:
+    """'📊 Reportes (Admin)' -> 'reportes_admin' (nombre del archivo .folded)."""
+    text = unicodedata.normalize('NFKD', app_mode).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '_', text.lower()).strip('_') or 'pagina'
+
+
+def profile_path(app_mode: str) -> str:
+    return os.path.join(PROFILE_DIR, f"{page_slug(app_mode)}.folded")
+
+
+@contextmanager
+def profile(app_mode: str):
+    """Perfila el bloque (la página del rerun actual) si el modo está activado."""
+    if not _state['enabled']:
+        yield
+        return
+
+    caller = sys._getframe(2)  # Marco de app.py (por encima de contextmanager)
+    sampler = _Sampler(threading.get_ident(), caller.f_code, SAMPLE_INTERVAL_MS / 1000)
+    start = time.perf_counter()
+    sampler.start()
+    try:
+        yield  # st.stop() y st.rerun() salen por excepción: el finally igual registra el rerun
+    finally:
+        sampler.stop()
+        _record(app_mode, (time.perf_counter() - start) * 1000, sampler.stacks)
+
+
+def _record(app_mode: str, elapsed_ms: float, stacks: Counter):
+    with _lock:
+        page = _pages.setdefault(app_mode, {'reruns': 0, 'total_ms': 0.0, 'last_ms': 0.0, 'stacks': Counter()})
+        page['reruns'] += 1
+        page['total_ms'] += elapsed_ms
+        page['last_ms'] = elapsed_ms
+        page['stacks'].update(stacks)
+        lines = [f"{stack} {count}" for stack, count in page['stacks'].most_common()]
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(profile_path(app_mode), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+    except OSError:
+        pass  # Un disco de solo lectura no debe romper la página; el resumen sigue en memoria
+
+
+def get_pages() -> dict:
+    """{app_mode: {'reruns', 'mean_ms', 'last_ms', 'samples'}} de lo perfilado en este proceso."""
+    with _lock:
+        return {
+            mode: {
+                'reruns': page['reruns'],
+                'mean_ms': page['total_ms'] / page['reruns'],
+                'last_ms': page['last_ms'],
+                'samples': sum(page['stacks'].values()),
+            }
+            for mode, page in _pages.items()
+        }
+
+
+def hot_functions(app_mode: str, limit: int = HOT_FUNCTIONS) -> list:
+    """
+    Funciones con más muestras de la página: 'Propio' cuenta las muestras en que la
+    función estaba ejecutando, 'Total' las que además incluyen lo que llamó.
+    """
+    with _lock:
+        stacks = Counter(_pages.get(app_mode, {}).get('stacks', {}))
+    total_samples = sum(stacks.values())
+    if not total_samples:
+        return []
+
+    own, inclusive = Counter(), Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        own[frames[-1]] += count
+        for label in set(frames):
+            inclusive[label] += count
+    ranked = sorted(inclusive, key=lambda label: (own[label], inclusive[label]), reverse=True)[:limit]
+    return [
+        {
+            'Función': label,
+            'Propio %': round(100 * own[label] / total_samples, 1),
+            'Total %': round(100 * inclusive[label] / total_samples, 1),
+            'Muestras': own[label],
+        }
+        for label in ranked
+    ]
+
+
+def reset():
+    """Descarta lo acumulado en memoria (los archivos .folded se sobrescriben en el próximo rerun)."""
+    with _lock:
+        _pages.clear()
+
+
+def render_diagnostics_page():
+    """Página de Admin: activa el perfilado y muestra las funciones más costosas por página."""
+    import pandas as pd
+    import streamlit as st
+    import auth
+
+    if auth.get_user_role() != 'Admin':
+        st.error("Acceso denegado. Solo los administradores pueden ver el diagnóstico.")
+        return
+
+    st.header("🩺 Diagnóstico de Rendimiento")
+    active = st.toggle("Perfilar cada ejecución de página", value=enabled(),
+                       help="Afecta a todas las sesiones de este proceso. Desactívelo al terminar.")
+    if active != enabled():
+        set_enabled(active)
+        st.rerun()
+    st.caption(
+        f"Muestreo cada {SAMPLE_INTERVAL_MS:g} ms. Pilas acumuladas por página en `{PROFILE_DIR}/` "
+        "(formato plegado para flamegraph.pl o speedscope)."
+    )
+
+    pages = get_pages()
+    if not pages:
+        st.info("Aún no hay ejecuciones perfiladas. Active el perfilado y navegue por las páginas.")
+        return
+
+    if st.button("Reiniciar mediciones"):
+        reset()
+        st.rerun()
+
+    for mode, summary in sorted(pages.items(), key=lambda item: item[1]['mean_ms'], reverse=True):
+        with st.expander(f"{mode} · {summary['mean_ms']:.0f} ms de media · {summary['reruns']} ejecuciones"):
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Ejecuciones", summary['reruns'])
+            col2.metric("Última (ms)", f"{summary['last_ms']:.0f}")
+            col3.metric("Muestras", summary['samples'])
+            rows = hot_functions(mode)
+            if rows:
+                st.dataframe(pd.DataFrame(rows), width='stretch', hide_index=True)
+            path = profile_path(mode)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    st.download_button("Descargar pilas (.folded)", data=f, file_name=os.path.basename(path),
+                                       mime="text/plain", key=f"folded_{page_slug(mode)}")
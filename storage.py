@@ -0,0 +1,105 @@
+# storage.py
+"""
+Interfaz de almacenamiento usada por db_service, auth y user_service.
+
+Las operaciones hablan el mismo dialecto de filtros que PostgREST (la app ya
+lo usaba en todas sus URLs): `filters` es una lista de pares
+(columna, 'operador.valor'), p. ej. [('is_redeemed', 'eq.true'),
+('or', '(name.ilike.*centro*,address.ilike.*centro*)')], y `select` acepta
+embeds como 'id,roles(role_name),issuer:issuers(issuer_name)'.
+
+Implementaciones (variable de entorno STORAGE_BACKEND):
+
+- 'postgrest' (por defecto): Supabase vía http_client (storage_postgrest.py).
+- 'sqlite': base embebida en un archivo local (storage_sqlite.py), para
+  desarrollo, pruebas o una sucursal sin internet estable.
+"""
+import threading
+from urllib.parse import parse_qsl
+
+from db_config import SQLITE_DB_PATH, STORAGE_BACKEND
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+class StorageError(Exception):
+    """Error del backend con un mensaje apto para mostrar y el estado HTTP equivalente."""
+
+    def __init__(self, message: str, status: int = None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class StorageBackend:
+    """Operaciones que la app necesita del almacenamiento. `token` es el JWT de la sesión (si aplica)."""
+
+    name = None
+
+    # --- Tablas ---
+
+    def select(self, table: str, select: str = '*', filters: list = (), order: str = None,
+               limit: int = None, offset: int = 0, count: bool = False, token: str = None, cache: bool = False):
+        """
+        Retorna (filas, total). total es None si count=False.
+        Con cache=True el backend puede revalidar una respuesta anterior (ETag) y
+        devolver el mismo resultado ya parseado: el llamador no debe modificarlo.
+        """
+        raise NotImplementedError
+
+    def insert(self, table: str, rows: list, on_conflict: str = None, resolution: str = None, token: str = None):
+        """
+        Inserta filas. Con on_conflict, resolution='merge-duplicates' actualiza las
+        existentes y 'ignore-duplicates' las deja intactas; sin resolution un
+        duplicado lanza StorageError (409).
+        """
+        raise NotImplementedError
+
+    def update(self, table: str, filters: list, payload: dict, token: str = None):
+        raise NotImplementedError
+
+    def delete(self, table: str, filters: list, token: str = None):
+        raise NotImplementedError
+
+    def rpc(self, function_name: str, params: dict, token: str = None, idempotent: bool = False):
+        """
+        Funciones de base de datos (migrations/), p. ej. batch_void.
+        idempotent=True solo si repetir la llamada no cambia el resultado (se puede reintentar).
+        """
+        raise NotImplementedError
+
+    # --- Autenticación ---
+
+    def sign_in(self, email: str, password: str):
+        """Retorna {'access_token', 'user': {'id', 'email'}} o lanza StorageError."""
+        raise NotImplementedError
+
+    def sign_up(self, email: str, password: str):
+        """Registra un usuario y retorna {'id', 'email'}; lanza StorageError si ya existe."""
+        raise NotImplementedError
+
+
+def parse_filters(query: str):
+    """'a=eq.1&b=gte.2' -> [('a', 'eq.1'), ('b', 'gte.2')] (filtros heredados en forma de query string)."""
+    return parse_qsl(query, keep_blank_values=True) if query else []
+
+
+def backend_name() -> str:
+    return STORAGE_BACKEND
+
+
+def get_backend() -> StorageBackend:
+    """Instancia única del backend configurado (se importa solo el módulo que se usa)."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if STORAGE_BACKEND == 'sqlite':
+                from storage_sqlite import SqliteBackend
+                _backend = SqliteBackend(SQLITE_DB_PATH)
+            elif STORAGE_BACKEND == 'postgrest':
+                from storage_postgrest import PostgrestBackend
+                _backend = PostgrestBackend()
+            else:
+                raise StorageError(f"STORAGE_BACKEND desconocido: {STORAGE_BACKEND}")
+        return _backend
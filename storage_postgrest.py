@@ -0,0 +1,119 @@
+# storage_postgrest.py
+"""Backend de almacenamiento sobre Supabase (PostgREST + Auth), vía http_client."""
+import json
+from urllib.parse import quote, urlencode
+
+import requests
+
+import http_cache
+import http_client
+from db_config import AUTH_ENDPOINT, POSTGREST_ENDPOINT, build_headers
+from storage import StorageBackend, StorageError
+
+# Caracteres que PostgREST acepta sin codificar en filtros, select y or=(...)
+_SAFE = '*,.()!:'
+
+
+def _error_message(response) -> str:
+    try:
+        data = response.json()
+        return data.get('message') or data.get('msg') or data.get('error_description') or response.text
+    except ValueError:
+        return response.text or f"HTTP {response.status_code}"
+
+
+def _check(response):
+    if not response.ok:
+        raise StorageError(_error_message(response), response.status_code)
+    return response
+
+
+def _query(params: list) -> str:
+    return urlencode(params, safe=_SAFE, quote_via=quote)
+
+
+class PostgrestBackend(StorageBackend):
+    name = 'postgrest'
+
+    def _call(self, method: str, url: str, token: str = None, prefer: str = None, body=None, extra_headers: dict = None,
+              **kwargs):
+        headers = build_headers(token)
+        if prefer:
+            headers['Prefer'] = prefer
+        headers.update(extra_headers or {})
+        data = json.dumps(body, default=str) if body is not None else None
+        try:
+            return http_client.request(method, url, headers=headers, data=data, **kwargs)
+        except requests.exceptions.RequestException as e:
+            raise StorageError(f"Sin conexión con Supabase: {e}") from e
+
+    # --- Tablas ---
+
+    def select(self, table, select='*', filters=(), order=None, limit=None, offset=0, count=False, token=None,
+               cache=False):
+        params = [('select', select), *filters]
+        if order:
+            params.append(('order', order))
+        if limit is not None:
+            params.append(('limit', limit))
+        if offset:
+            params.append(('offset', offset))
+        url = f"{POSTGREST_ENDPOINT}/{table}?{_query(params)}"
+        cache = cache and http_cache.enabled()
+        cache_key = (url, token, count)
+        cached = http_cache.lookup(cache_key) if cache else None
+        response = self._call('GET', url, token, prefer='count=exact' if count else None,
+                              extra_headers=http_cache.conditional_headers(cached))
+        if response.status_code == 304 and cached is not None:
+            result = http_cache.value(cache_key)  # Sin cambios: se reutiliza el resultado ya parseado
+            if result is not None:
+                http_cache.record(hit=True)
+                return result
+            # El presupuesto de memoria lo descartó entre la consulta y la respuesta: lectura completa
+            response = self._call('GET', url, token, prefer='count=exact' if count else None)
+        if cache:
+            http_cache.record(hit=False)
+
+        total_text = response.headers.get('Content-Range', '*/*').split('/')[-1]
+        if response.status_code == 416:  # Página fuera de rango (p. ej. tras borrar filas)
+            return [], int(total_text) if total_text.isdigit() else 0
+        rows = _check(response).json()
+        result = (rows, None) if not count else (rows, int(total_text) if total_text.isdigit() else offset + len(rows))
+        if cache:
+            http_cache.store(cache_key, response, result, owner=token)
+        return result
+
+    def insert(self, table, rows, on_conflict=None, resolution=None, token=None):
+        url = f"{POSTGREST_ENDPOINT}/{table}"
+        prefer = 'return=minimal'
+        if on_conflict:
+            url += f"?on_conflict={on_conflict}"
+        if resolution:
+            prefer = f'resolution={resolution},return=minimal'
+        # Un upsert con on_conflict es idempotente: se puede reintentar sin duplicar filas
+        _check(self._call('POST', url, token, prefer=prefer, body=rows, idempotent=bool(on_conflict and resolution)))
+
+    def update(self, table, filters, payload, token=None):
+        _check(self._call('PATCH', f"{POSTGREST_ENDPOINT}/{table}?{_query(filters)}", token, body=payload))
+
+    def delete(self, table, filters, token=None):
+        _check(self._call('DELETE', f"{POSTGREST_ENDPOINT}/{table}?{_query(filters)}", token))
+
+    def rpc(self, function_name, params, token=None, idempotent=False):
+        # Solo se reintentan las funciones convergentes: create_coupon_batch, por ejemplo,
+        # crearía otro lote con otro rango de consecutivos en cada reintento
+        response = self._call('POST', f"{POSTGREST_ENDPOINT}/rpc/{quote(function_name)}", token, body=params,
+                              idempotent=idempotent)
+        return _check(response).json()
+
+    # --- Autenticación ---
+
+    def sign_in(self, email, password):
+        response = self._call('POST', f"{AUTH_ENDPOINT}/token?grant_type=password", body={"email": email, "password": password})
+        return _check(response).json()
+
+    def sign_up(self, email, password):
+        # /signup usa la clave anónima (sin token de sesión)
+        response = self._call('POST', f"{AUTH_ENDPOINT}/signup", body={"email": email, "password": password})
+        data = _check(response).json()
+        return data.get('user', data)
@@ -0,0 +1,711 @@
+# storage_sqlite.py
+"""
+Backend de almacenamiento embebido en SQLite (STORAGE_BACKEND=sqlite).
+
+Reproduce el esquema de Supabase en un archivo local (SQLITE_DB_PATH) y
+traduce el dialecto de filtros de PostgREST a SQL, así db_service, auth y
+user_service funcionan igual sin conexión. Los embeds del select se
+resuelven con las llaves foráneas declaradas en el esquema (una consulta
+IN por relación, no una por fila).
+
+Inicializar una base con su primer administrador:
+
+    python storage_sqlite.py --db novillo.sqlite3 --admin-email admin@novillo.cr --admin-password <clave>
+
+No hay RLS: cualquier sesión autenticada ve todas las filas, como el rol
+Admin en Supabase. Pensado para desarrollo, pruebas y sucursales sin
+internet estable, no para varias instancias sobre el mismo archivo en red.
+"""
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import coupon_codes
+from storage import StorageBackend, StorageError
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS roles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    role_name TEXT NOT NULL UNIQUE
+);
+INSERT OR IGNORE INTO roles (role_name) VALUES ('Admin'), ('Creator'), ('Cashier');
+
+CREATE TABLE IF NOT EXISTS branches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    address TEXT
+);
+CREATE TABLE IF NOT EXISTS issuers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    issuer_name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS promos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    type_name TEXT NOT NULL UNIQUE,
+    is_percentage BOOLEAN NOT NULL DEFAULT 0,
+    is_cash_value BOOLEAN NOT NULL DEFAULT 0,
+    is_product BOOLEAN NOT NULL DEFAULT 0,
+    value REAL,
+    description TEXT
+);
+CREATE TABLE IF NOT EXISTS auth_users (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    password_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS profiles (
+    id TEXT PRIMARY KEY REFERENCES auth_users (id),
+    email TEXT,
+    username TEXT,
+    role_id INTEGER REFERENCES roles (id),
+    branch_id INTEGER REFERENCES branches (id),
+    phone_number TEXT
+);
+CREATE TABLE IF NOT EXISTS batches (
+    id TEXT PRIMARY KEY,
+    batch_name TEXT,
+    json_qrs JSON,
+    consecutive_start INTEGER,
+    consecutive_end INTEGER,
+    branch_ids JSON,
+    expiration_date TEXT,
+    issuer_id INTEGER REFERENCES issuers (id),
+    created_by_user_id TEXT REFERENCES profiles (id),
+    creation_date TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+    is_void BOOLEAN NOT NULL DEFAULT 0,
+    promo_type_id INTEGER REFERENCES promos (id),
+    base_value_colones REAL,
+    base_value_dolares REAL
+);
+CREATE TABLE IF NOT EXISTS coupons (
+    id TEXT PRIMARY KEY,
+    code TEXT UNIQUE,
+    batch_id TEXT REFERENCES batches (id),
+    consecutive INTEGER,
+    promo_type_id INTEGER REFERENCES promos (id),
+    branch_permissions JSON,
+    base_value_colones REAL,
+    base_value_dolares REAL,
+    expiration_date TEXT,
+    is_redeemed BOOLEAN NOT NULL DEFAULT 0,
+    redemption_date TEXT,
+    invoice_number TEXT,
+    redemption_branch_id INTEGER REFERENCES branches (id),
+    redeemed_by_user_id TEXT REFERENCES profiles (id),
+    creation_date TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+    is_void BOOLEAN NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'active'
+);
+-- migrations/008_coupon_archive.sql: canjeados y vencidos de hace tiempo (mismas columnas + archived_at)
+CREATE TABLE IF NOT EXISTS coupons_archive (
+    id TEXT PRIMARY KEY,
+    code TEXT UNIQUE,
+    batch_id TEXT REFERENCES batches (id),
+    consecutive INTEGER,
+    promo_type_id INTEGER REFERENCES promos (id),
+    branch_permissions JSON,
+    base_value_colones REAL,
+    base_value_dolares REAL,
+    expiration_date TEXT,
+    is_redeemed BOOLEAN NOT NULL DEFAULT 0,
+    redemption_date TEXT,
+    invoice_number TEXT,
+    redemption_branch_id INTEGER REFERENCES branches (id),
+    redeemed_by_user_id TEXT REFERENCES profiles (id),
+    creation_date TEXT NOT NULL,
+    is_void BOOLEAN NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    archived_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+CREATE INDEX IF NOT EXISTS coupons_archive_batch_id_consecutive_idx ON coupons_archive (batch_id, consecutive);
+CREATE INDEX IF NOT EXISTS coupons_archive_consecutive_idx ON coupons_archive (consecutive);
+CREATE INDEX IF NOT EXISTS coupons_archive_invoice_number_idx ON coupons_archive (invoice_number);
+CREATE INDEX IF NOT EXISTS coupons_archive_creation_date_idx ON coupons_archive (creation_date);
+CREATE INDEX IF NOT EXISTS coupons_batch_id_consecutive_idx ON coupons (batch_id, consecutive);
+CREATE INDEX IF NOT EXISTS coupons_consecutive_idx ON coupons (consecutive);
+CREATE INDEX IF NOT EXISTS coupons_invoice_number_idx ON coupons (invoice_number);
+CREATE INDEX IF NOT EXISTS coupons_creation_date_idx ON coupons (creation_date);
+CREATE INDEX IF NOT EXISTS batches_creation_date_idx ON batches (creation_date);
+"""
+
+# Columnas agregadas después de crear la primera versión del archivo: (tabla, columna, definición, relleno)
+UPGRADES = [
+    ('coupons', 'status', "TEXT NOT NULL DEFAULT 'active'",
+     "UPDATE coupons SET status = CASE WHEN is_void THEN 'void' WHEN is_redeemed THEN 'redeemed' "
+     "WHEN expiration_date < date('now', 'localtime') THEN 'expired' ELSE 'active' END"),
+    # migrations/007_batch_attributes.sql: atributos del lote en BATCHES (del primer cupón del lote)
+    ('batches', 'promo_type_id', 'INTEGER REFERENCES promos (id)',
+     "UPDATE batches SET promo_type_id = (SELECT promo_type_id FROM coupons WHERE batch_id = batches.id "
+     "ORDER BY consecutive LIMIT 1)"),
+    ('batches', 'base_value_colones', 'REAL',
+     "UPDATE batches SET base_value_colones = (SELECT base_value_colones FROM coupons WHERE batch_id = batches.id "
+     "ORDER BY consecutive LIMIT 1)"),
+    ('batches', 'base_value_dolares', 'REAL',
+     "UPDATE batches SET base_value_dolares = (SELECT base_value_dolares FROM coupons WHERE batch_id = batches.id "
+     "ORDER BY consecutive LIMIT 1)"),
+]
+
+# Equivalente de normalize_coupon_rows() (007): deja en NULL los atributos del
+# cupón que coinciden con los del lote. Corre una vez, al agregar las columnas.
+NORMALIZE_COUPONS = """
+UPDATE coupons SET
+    promo_type_id = CASE WHEN promo_type_id IS (SELECT promo_type_id FROM batches WHERE id = coupons.batch_id) THEN NULL ELSE promo_type_id END,
+    branch_permissions = CASE WHEN branch_permissions IS (SELECT branch_ids FROM batches WHERE id = coupons.batch_id) THEN NULL ELSE branch_permissions END,
+    base_value_colones = CASE WHEN base_value_colones IS (SELECT base_value_colones FROM batches WHERE id = coupons.batch_id) THEN NULL ELSE base_value_colones END,
+    base_value_dolares = CASE WHEN base_value_dolares IS (SELECT base_value_dolares FROM batches WHERE id = coupons.batch_id) THEN NULL ELSE base_value_dolares END,
+    expiration_date = CASE WHEN expiration_date IS (SELECT expiration_date FROM batches WHERE id = coupons.batch_id) THEN NULL ELSE expiration_date END;
+"""
+
+# Equivalente de migrations/005_coupon_status.sql (con el vencimiento heredado del
+# lote de 007): el trigger mantiene status al día con is_void / is_redeemed /
+# expiration_date ('expired' lo pone el barrido).
+_RESOLVED_EXPIRATION = "coalesce({row}.expiration_date, (SELECT expiration_date FROM batches WHERE id = {row}.batch_id))"
+_STATUS_EXPR = (
+    "CASE WHEN NEW.is_void THEN 'void' WHEN NEW.is_redeemed THEN 'redeemed' "
+    f"WHEN NEW.status = 'expired' AND {_RESOLVED_EXPIRATION.format(row='NEW')} < date('now', 'localtime') "
+    "THEN 'expired' ELSE 'active' END"
+)
+STATUS_SCHEMA = f"""
+CREATE INDEX IF NOT EXISTS coupons_status_creation_date_idx ON coupons (status, creation_date DESC);
+CREATE INDEX IF NOT EXISTS coupons_active_expiration_idx ON coupons (expiration_date) WHERE status = 'active';
+DROP TRIGGER IF EXISTS coupons_status_after_insert;
+CREATE TRIGGER coupons_status_after_insert AFTER INSERT ON coupons BEGIN
+    UPDATE coupons SET status = {_STATUS_EXPR} WHERE id = NEW.id AND status IS NOT {_STATUS_EXPR};
+END;
+DROP TRIGGER IF EXISTS coupons_status_after_update;
+CREATE TRIGGER coupons_status_after_update
+AFTER UPDATE OF is_void, is_redeemed, expiration_date, status ON coupons BEGIN
+    UPDATE coupons SET status = {_STATUS_EXPR} WHERE id = NEW.id AND status IS NOT {_STATUS_EXPR};
+END;
+"""
+
+# Tablas que la app puede consultar (auth_users solo se usa desde sign_in/sign_up)
+PUBLIC_TABLES = ('roles', 'branches', 'issuers', 'promos', 'profiles', 'batches', 'coupons', 'coupons_archive')
+PASSWORD_ITERATIONS = 200_000
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+_COMPARISONS = {'eq': '=', 'neq': '<>', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+
+def _split_top_level(text: str):
+    """Divide por comas ignorando las que están dentro de paréntesis o comillas."""
+    parts, depth, current, quoted = [], 0, [], False
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == '(':
+            depth += 1
+        elif not quoted and ch == ')':
+            depth -= 1
+        if ch == ',' and depth == 0 and not quoted:
+            parts.append(''.join(current))
+            current = []
+        else:
+            current.append(ch)
+    parts.append(''.join(current))
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _unquote(raw: str) -> str:
+    if len(raw) >= 2 and raw[0] == raw[-1] == '"':
+        return raw[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+    return raw
+
+
+def _like_to_glob(pattern: str) -> str:
+    """Patrón like de PostgREST (* o %, _) -> GLOB de SQLite (sensible a mayúsculas, usa índices)."""
+    out = []
+    for ch in pattern:
+        if ch in '*%':
+            out.append('*')
+        elif ch == '_':
+            out.append('?')
+        elif ch in '[]?':
+            out.append(f'[{ch}]')
+        else:
+            out.append(ch)
+    return ''.join(out)
+
+
+def hash_password(password: str, salt: bytes = None) -> str:
+    salt = salt or secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, PASSWORD_ITERATIONS)
+    return f"pbkdf2_sha256${PASSWORD_ITERATIONS}${salt.hex()}${digest.hex()}"
+
+
+def verify_password(password: str, stored: str) -> bool:
+    try:
+        _, iterations, salt_hex, digest_hex = stored.split('$')
+    except ValueError:
+        return False
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), bytes.fromhex(salt_hex), int(iterations))
+    return hmac.compare_digest(digest.hex(), digest_hex)
+
+
+class SqliteBackend(StorageBackend):
+    name = 'sqlite'
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._meta = {}
+        self._meta_lock = threading.Lock()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+            added = set()
+            for table, column, definition, backfill in UPGRADES:
+                if column not in {r['name'] for r in conn.execute(f'PRAGMA table_info({table})')}:
+                    conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+                    conn.execute(backfill)
+                    added.add((table, column))
+            conn.executescript(STATUS_SCHEMA)
+            if ('batches', 'promo_type_id') in added:
+                conn.execute(NORMALIZE_COUPONS)  # Con el trigger nuevo: el vencimiento heredado ya cuenta
+
+    # --- Conexión y metadatos ---
+
+    def _connection(self):
+        """Una conexión por hilo (sqlite3 no comparte conexiones entre hilos)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return conn
+
+    def _table(self, table: str):
+        """{'columns': {nombre: tipo}, 'fks': {columna: tabla}, 'pk': columna}."""
+        if table not in PUBLIC_TABLES:
+            raise StorageError(f'relation "public.{table}" does not exist', 404)
+        with self._meta_lock:
+            if table not in self._meta:
+                conn = self._connection()
+                info = conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+                self._meta[table] = {
+                    'columns': {r['name']: (r['type'] or '').upper() for r in info},
+                    'pk': next(r['name'] for r in info if r['pk']),
+                    'fks': {r['from']: r['table'] for r in conn.execute(f'PRAGMA foreign_key_list("{table}")')},
+                }
+            return self._meta[table]
+
+    def _column(self, table: str, column: str) -> str:
+        if not _IDENTIFIER.match(column) or column not in self._table(table)['columns']:
+            raise StorageError(f"column {table}.{column} does not exist", 400)
+        return f'"{column}"'
+
+    def _to_db(self, table: str, column: str, value):
+        kind = self._table(table)['columns'].get(column, '')
+        if value is None:
+            return None
+        if kind == 'JSON':
+            return json.dumps(value, default=str)
+        if kind == 'BOOLEAN':
+            return 1 if value else 0
+        return value
+
+    def _from_db(self, table: str, row) -> dict:
+        columns = self._table(table)['columns']
+        result = dict(row)
+        for column, value in result.items():
+            if value is None:
+                continue
+            if columns.get(column) == 'JSON':
+                result[column] = json.loads(value)
+            elif columns.get(column) == 'BOOLEAN':
+                result[column] = bool(value)
+        return result
+
+    def _coerce(self, table: str, column: str, raw: str):
+        """Valor textual de un filtro -> tipo de la columna."""
+        raw = _unquote(raw)
+        kind = self._table(table)['columns'].get(column, '')
+        if raw == 'null':
+            return None
+        if kind == 'BOOLEAN':
+            return 1 if raw.lower() == 'true' else 0
+        try:
+            if kind == 'INTEGER':
+                return int(raw)
+            if kind == 'REAL':
+                return float(raw)
+        except ValueError:
+            raise StorageError(f'invalid input syntax for type {kind.lower()}: "{raw}"', 400)
+        return raw
+
+    # --- Traducción de filtros ---
+
+    def _condition(self, table: str, column: str, expression: str, params: list) -> str:
+        negate = expression.startswith('not.')
+        if negate:
+            expression = expression[4:]
+        op, _, raw = expression.partition('.')
+        col = self._column(table, column)
+
+        if op in _COMPARISONS:
+            params.append(self._coerce(table, column, raw))
+            sql = f'{col} {_COMPARISONS[op]} ?'
+        elif op == 'like':
+            params.append(_like_to_glob(_unquote(raw)))
+            sql = f'{col} GLOB ?'
+        elif op == 'ilike':
+            params.append(_unquote(raw).replace('*', '%'))
+            sql = f'{col} LIKE ?'
+        elif op == 'in':
+            values = [self._coerce(table, column, v) for v in _split_top_level(raw.strip()[1:-1])]
+            params.extend(values)
+            sql = f"{col} IN ({','.join('?' * len(values))})" if values else '0'
+        elif op == 'is':
+            sql = f'{col} IS NULL' if raw == 'null' else f"{col} = {1 if raw.lower() == 'true' else 0}"
+        else:
+            raise StorageError(f'operador no soportado: {op}', 400)
+        return f'NOT ({sql})' if negate else sql
+
+    def _logic(self, table: str, expression: str, joiner: str, params: list) -> str:
+        """'(cond,cond,and(...))' -> (cond OR cond OR (...)) con joiner OR/AND."""
+        parts = []
+        for item in _split_top_level(expression.strip()[1:-1]):
+            if item.startswith('and('):
+                parts.append(self._logic(table, item[3:], 'AND', params))
+            elif item.startswith('or('):
+                parts.append(self._logic(table, item[2:], 'OR', params))
+            else:
+                column, _, rest = item.partition('.')
+                parts.append(self._condition(table, column, rest, params))
+        return '(' + f' {joiner} '.join(parts) + ')' if parts else '1'
+
+    def _where(self, table: str, filters) -> tuple:
+        clauses, params = [], []
+        for column, expression in filters:
+            if column in ('or', 'and'):
+                clauses.append(self._logic(table, expression, column.upper(), params))
+            else:
+                clauses.append(self._condition(table, column, expression, params))
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def _order(self, table: str, order: str) -> str:
+        terms = []
+        for term in _split_top_level(order):
+            column, *modifiers = term.split('.')
+            sql = f"{self._column(table, column)} {'DESC' if 'desc' in modifiers else 'ASC'}"
+            if 'nullsfirst' in modifiers:
+                sql += ' NULLS FIRST'
+            elif 'nullslast' in modifiers:
+                sql += ' NULLS LAST'
+            else:
+                sql += ' NULLS FIRST' if 'desc' in modifiers else ' NULLS LAST'  # Mismo orden por defecto que Postgres
+            terms.append(sql)
+        return ' ORDER BY ' + ', '.join(terms)
+
+    # --- Embeds ---
+
+    def _relation(self, table: str, name: str):
+        """Retorna (tabla_destino, columna_local, columna_remota, es_lista)."""
+        name, _, hint = name.partition('!')
+        fks = self._table(table)['fks']
+        if name in fks:
+            return fks[name], name, self._table(fks[name])['pk'], False
+        if hint and fks.get(hint) == name:
+            return name, hint, self._table(name)['pk'], False
+        for column, target in fks.items():
+            if target == name:
+                return target, column, self._table(target)['pk'], False
+        if name in PUBLIC_TABLES:
+            for column, target in self._table(name)['fks'].items():
+                if target == table:
+                    return name, self._table(table)['pk'], column, True
+        raise StorageError(f"Could not find a relationship between '{table}' and '{name}' in the schema cache", 400)
+
+    def _project(self, table: str, rows: list, select: str) -> list:
+        results = [{} for _ in rows]
+        for item in _split_top_level(select.replace(' ', '')):
+            alias, head = None, item
+            if ':' in item.split('(')[0]:
+                alias, head = item.split(':', 1)
+            if '(' in head:
+                name, inner = head.split('(', 1)
+                target, local_col, remote_col, many = self._relation(table, name)
+                keys = list({r[local_col] for r in rows if r.get(local_col) is not None})
+                related = {}
+                if keys:
+                    fetched = self._fetch(target, [(remote_col, f"in.({','.join(json.dumps(k) for k in keys)})")])
+                    for source, projected in zip(fetched, self._project(target, fetched, inner[:-1])):
+                        related.setdefault(source[remote_col], []).append(projected)
+                key = alias or name.split('!')[0]
+                for row, result in zip(rows, results):
+                    matches = related.get(row.get(local_col), [])
+                    result[key] = matches if many else (matches[0] if matches else None)
+            elif head == '*':
+                for row, result in zip(rows, results):
+                    result.update(row)
+            else:
+                column = head.split('::')[0]
+                self._column(table, column)
+                for row, result in zip(rows, results):
+                    result[alias or column] = row.get(column)
+        return results
+
+    def _fetch(self, table: str, filters, order: str = None, limit: int = None, offset: int = 0) -> list:
+        where, params = self._where(table, filters)
+        sql = f'SELECT * FROM "{table}"{where}'
+        if order:
+            sql += self._order(table, order)
+        if limit is not None or offset:
+            sql += ' LIMIT ? OFFSET ?'
+            params += [-1 if limit is None else limit, offset]
+        return [self._from_db(table, r) for r in self._connection().execute(sql, params)]
+
+    # --- Tablas ---
+
+    def select(self, table, select='*', filters=(), order=None, limit=None, offset=0, count=False, token=None,
+               cache=False):
+        # cache se ignora: la base es local y leerla cuesta menos que revalidar
+        self._table(table)
+        filters = [(k, v) for k, v in filters if k not in ('select', 'order', 'limit', 'offset')]
+        rows = self._fetch(table, filters, order, limit, offset)
+        total = None
+        if count:
+            where, params = self._where(table, filters)
+            total = self._connection().execute(f'SELECT count(*) FROM "{table}"{where}', params).fetchone()[0]
+        return self._project(table, rows, select or '*'), total
+
+    def insert(self, table, rows, on_conflict=None, resolution=None, token=None):
+        meta = self._table(table)
+        conn = self._connection()
+        try:
+            with conn:
+                for row in rows:
+                    row = dict(row)
+                    if row.get(meta['pk']) is None and meta['columns'][meta['pk']] == 'TEXT':
+                        row[meta['pk']] = str(uuid.uuid4())
+                    elif row.get(meta['pk']) is None:
+                        row.pop(meta['pk'], None)  # INTEGER PRIMARY KEY: autoincremental
+                    columns = [self._column(table, c) for c in row]
+                    sql = f'INSERT INTO "{table}" ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})'
+                    if resolution:
+                        target = f' ({", ".join(self._column(table, c) for c in on_conflict.split(","))})' if on_conflict else ''
+                        updates = [f'{c} = excluded.{c}' for c, name in zip(columns, row) if name not in (on_conflict or '').split(',')]
+                        if resolution == 'merge-duplicates' and updates:
+                            sql += f' ON CONFLICT{target} DO UPDATE SET {", ".join(updates)}'
+                        else:
+                            sql += f' ON CONFLICT{target} DO NOTHING'
+                    conn.execute(sql, [self._to_db(table, c, v) for c, v in row.items()])
+        except sqlite3.IntegrityError as e:
+            raise StorageError(f'duplicate key value violates unique constraint ({e})', 409) from e
+        except sqlite3.OperationalError as e:
+            raise StorageError(str(e), 400) from e
+
+    def update(self, table, filters, payload, token=None):
+        if not filters:
+            raise StorageError('UPDATE requires a WHERE clause', 400)
+        where, params = self._where(table, filters)
+        assignments = [f'{self._column(table, c)} = ?' for c in payload]
+        values = [self._to_db(table, c, v) for c, v in payload.items()]
+        conn = self._connection()
+        try:
+            with conn:
+                conn.execute(f'UPDATE "{table}" SET {", ".join(assignments)}{where}', values + params)
+        except sqlite3.IntegrityError as e:
+            raise StorageError(str(e), 409) from e
+
+    def delete(self, table, filters, token=None):
+        if not filters:
+            raise StorageError('DELETE requires a WHERE clause', 400)
+        where, params = self._where(table, filters)
+        conn = self._connection()
+        try:
+            with conn:
+                conn.execute(f'DELETE FROM "{table}"{where}', params)
+        except sqlite3.IntegrityError as e:
+            raise StorageError(f'No se puede eliminar: la fila está en uso ({e})', 409) from e
+
+    # --- Funciones (equivalentes a migrations/003, 005, 006, 007 y 008) ---
+
+    def rpc(self, function_name, params, token=None, idempotent=False):
+        handler = getattr(self, f'_rpc_{function_name}', None)
+        if handler is None:
+            raise StorageError(f'Could not find the function public.{function_name}', 404)
+        with self._connection():
+            return handler(**params)
+
+    def _batch_update(self, op: str, p_batch_id, coupon_sets: dict, batch_sets: dict,
+                      p_consecutive_from=None, p_consecutive_to=None, inherited: bool = False, **log):
+        """
+        inherited=True: los cambios son atributos del lote (007). Sobre el lote completo
+        solo cambia BATCHES; los pendientes vuelven a heredar y los canjeados o anulados
+        conservan el valor anterior.
+        """
+        conn = self._connection()
+        whole_batch = p_consecutive_from is None and p_consecutive_to is None
+        if whole_batch and inherited:
+            for coupon_column, batch_column in zip(coupon_sets, batch_sets):
+                conn.execute(
+                    f'UPDATE coupons SET "{coupon_column}" = (SELECT "{batch_column}" FROM batches WHERE id = ?) '
+                    f'WHERE batch_id = ? AND (is_redeemed OR is_void) AND "{coupon_column}" IS NULL',
+                    (p_batch_id, p_batch_id),
+                )
+            coupon_sets = dict.fromkeys(coupon_sets)
+        if whole_batch:
+            assignments = ', '.join(f'{self._column("batches", c)} = ?' for c in batch_sets)
+            values = [self._to_db('batches', c, v) for c, v in batch_sets.items()]
+            conn.execute(f'UPDATE batches SET {assignments} WHERE id = ?', values + [p_batch_id])
+
+        where = 'batch_id = ? AND NOT is_redeemed AND NOT is_void'
+        params = [p_batch_id]
+        if p_consecutive_from is not None:
+            where += ' AND consecutive >= ?'
+            params.append(p_consecutive_from)
+        if p_consecutive_to is not None:
+            where += ' AND consecutive <= ?'
+            params.append(p_consecutive_to)
+        assignments = ', '.join(f'{self._column("coupons", c)} = ?' for c in coupon_sets)
+        values = [self._to_db('coupons', c, v) for c, v in coupon_sets.items()]
+        affected = conn.execute(f'UPDATE coupons SET {assignments} WHERE {where}', values + params).rowcount
+
+        row = conn.execute('SELECT json_qrs FROM batches WHERE id = ?', (p_batch_id,)).fetchone()
+        if row is not None:
+            info = json.loads(row['json_qrs']) if row['json_qrs'] else {}
+            info['operations'] = info.get('operations', []) + [{
+                'op': op, 'from': p_consecutive_from, 'to': p_consecutive_to, 'coupons': affected,
+                'at': datetime.now().isoformat(), **log,
+            }]
+            conn.execute('UPDATE batches SET json_qrs = ? WHERE id = ?', (json.dumps(info), p_batch_id))
+        return affected
+
+    def _rpc_batch_void(self, p_batch_id, p_consecutive_from=None, p_consecutive_to=None):
+        return self._batch_update('void', p_batch_id, {'is_void': True}, {'is_void': True},
+                                  p_consecutive_from, p_consecutive_to)
+
+    def _move_coupons(self, source: str, target: str, where: str, params) -> int:
+        """Mueve filas entre coupons y coupons_archive (columnas en común, por nombre)."""
+        conn = self._connection()
+        target_columns = {r['name'] for r in conn.execute(f'PRAGMA table_info("{target}")')}
+        columns = ', '.join(f'"{r["name"]}"' for r in conn.execute(f'PRAGMA table_info("{source}")')
+                            if r['name'] in target_columns)
+        conn.execute(f'INSERT INTO "{target}" ({columns}) SELECT {columns} FROM "{source}" WHERE {where}', params)
+        return conn.execute(f'DELETE FROM "{source}" WHERE {where}', params).rowcount
+
+    def _rpc_archive_coupons(self, p_after_days=180, p_limit=5000):
+        """Equivalente a archive_coupons() de migrations/008: mueve hasta p_limit cupones al archivo."""
+        cutoff = datetime.now() - timedelta(days=p_after_days)
+        conn = self._connection()
+        ids = [r[0] for r in conn.execute(
+            f"SELECT id FROM coupons WHERE (status = 'redeemed' AND redemption_date < ?) "
+            f"OR (status = 'expired' AND {_RESOLVED_EXPIRATION.format(row='coupons')} < ?) LIMIT ?",
+            (cutoff.isoformat(), cutoff.date().isoformat(), p_limit),
+        )]
+        if not ids:
+            return 0
+        return self._move_coupons('coupons', 'coupons_archive', f"id IN ({','.join('?' * len(ids))})", ids)
+
+    def _rpc_restore_archived_coupons(self, p_batch_id, p_consecutive_from=None, p_consecutive_to=None):
+        where = 'batch_id = ? AND NOT is_redeemed AND NOT is_void AND consecutive BETWEEN ? AND ?'
+        params = (p_batch_id, -1 if p_consecutive_from is None else p_consecutive_from,
+                  2 ** 62 if p_consecutive_to is None else p_consecutive_to)
+        return self._move_coupons('coupons_archive', 'coupons', where, params)
+
+    def _rpc_batch_extend(self, p_batch_id, p_expiration_date, p_consecutive_from=None, p_consecutive_to=None):
+        self._rpc_restore_archived_coupons(p_batch_id, p_consecutive_from, p_consecutive_to)
+        return self._batch_update('extend', p_batch_id, {'expiration_date': p_expiration_date},
+                                  {'expiration_date': p_expiration_date}, p_consecutive_from, p_consecutive_to,
+                                  inherited=True, expiration_date=p_expiration_date)
+
+    def _rpc_batch_set_branches(self, p_batch_id, p_branch_ids, p_consecutive_from=None, p_consecutive_to=None):
+        branch_ids = [int(b) for b in p_branch_ids]
+        return self._batch_update('branches', p_batch_id, {'branch_permissions': branch_ids},
+                                  {'branch_ids': branch_ids}, p_consecutive_from, p_consecutive_to,
+                                  inherited=True, branch_ids=branch_ids)
+
+    def _rpc_sweep_expired_coupons(self, p_today=None):
+        today = p_today or datetime.now().date().isoformat()
+        return self._connection().execute(
+            f"UPDATE coupons SET status = 'expired' WHERE status = 'active' "
+            f"AND {_RESOLVED_EXPIRATION.format(row='coupons')} < ?", (today,),
+        ).rowcount
+
+    def _rpc_create_coupon_batch(self, p_count, p_promo_id, p_issuer_id, p_branch_ids, p_value_colones,
+                                 p_value_dolares, p_expiration_date, p_batch_name_prefix, p_description,
+                                 p_created_by=None):
+        """Equivalente a create_coupon_batch() de migrations/008: lote y cupones en una transacción."""
+        if not p_count or p_count < 1:
+            raise StorageError('La cantidad de cupones debe ser mayor que cero', 400)
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')  # Reserva la escritura antes de leer el último consecutivo
+        start = conn.execute(
+            'SELECT max(coalesce((SELECT max(consecutive) FROM coupons), 0), '
+            'coalesce((SELECT max(consecutive) FROM coupons_archive), 0)) + 1'
+        ).fetchone()[0]
+        batch_id = str(uuid.uuid4())
+        batch_name = f"{p_batch_name_prefix}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{batch_id[:4]}"
+        branch_ids = json.dumps([int(b) for b in p_branch_ids or []])
+        conn.execute(
+            'INSERT INTO batches (id, batch_name, json_qrs, consecutive_start, consecutive_end, branch_ids, '
+            'expiration_date, issuer_id, created_by_user_id, promo_type_id, base_value_colones, base_value_dolares) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (batch_id, batch_name, json.dumps({'count': p_count, 'promo_description': p_description}), start,
+             start + p_count - 1, branch_ids, p_expiration_date, p_issuer_id, p_created_by, p_promo_id,
+             p_value_colones, p_value_dolares),
+        )
+        ids = [str(uuid.uuid4()) for _ in range(p_count)]
+        conn.executemany(
+            'INSERT INTO coupons (id, code, batch_id, consecutive) VALUES (?, ?, ?, ?)',
+            ((coupon_id, coupon_codes.encode_coupon_id(coupon_id), batch_id, start + i) for i, coupon_id in enumerate(ids)),
+        )
+        return {'batch_id': batch_id, 'batch_name': batch_name, 'consecutive_start': start, 'ids': ids}
+
+    # --- Autenticación ---
+
+    def sign_in(self, email, password):
+        row = self._connection().execute(
+            'SELECT id, email, password_hash FROM auth_users WHERE email = ?', (email.strip().lower(),),
+        ).fetchone()
+        if row is None or not verify_password(password, row['password_hash']):
+            raise StorageError('Invalid login credentials', 400)
+        # Sin RLS local: el token solo identifica la sesión
+        return {
+            'access_token': secrets.token_urlsafe(32), 'token_type': 'bearer', 'expires_in': 3600,
+            'user': {'id': row['id'], 'email': row['email']},
+        }
+
+    def sign_up(self, email, password):
+        email = email.strip().lower()
+        user_id = str(uuid.uuid4())
+        conn = self._connection()
+        try:
+            with conn:
+                conn.execute('INSERT INTO auth_users (id, email, password_hash) VALUES (?, ?, ?)',
+                             (user_id, email, hash_password(password)))
+        except sqlite3.IntegrityError as e:
+            raise StorageError('User already registered: email address is already taken', 422) from e
+        return {'id': user_id, 'email': email}
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Crea (o actualiza) la base SQLite local y su primer administrador.')
+    parser.add_argument('--db', default=os.environ.get('SQLITE_DB_PATH', 'novillo.sqlite3'))
+    parser.add_argument('--admin-email', required=True)
+    parser.add_argument('--admin-password', required=True)
+    parser.add_argument('--admin-name', default='Administrador')
+    args = parser.parse_args()
+
+    backend = SqliteBackend(args.db)
+    user = backend.sign_up(args.admin_email, args.admin_password)
+    roles, _ = backend.select('roles', filters=[('role_name', 'eq.Admin')])
+    backend.insert('profiles', [{
+        'id': user['id'], 'email': user['email'], 'username': args.admin_name, 'role_id': roles[0]['id'],
+    }])
+    print(f"Base {args.db} lista. Inicie con STORAGE_BACKEND=sqlite SQLITE_DB_PATH={args.db} streamlit run app.py")
+
+
+if __name__ == '__main__':
+    main()
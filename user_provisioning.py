@@ -0,0 +1,226 @@
+# user_provisioning.py
+"""
+Alta masiva de usuarios desde CSV.
+
+1. Valida todo el archivo (correo, nombre, contraseña, rol y sucursal).
+2. Omite los correos que ya tienen perfil, sin distinguir mayúsculas
+   (re-ejecutar el mismo CSV es seguro).
+3. Registra en Auth en paralelo con account_service.sign_up_or_resume (backend
+   configurado y http_client: reintentos, Retry-After y circuit breaker), con
+   un límite de peticiones por segundo. Si el correo ya estaba registrado (una
+   corrida anterior falló antes del perfil), recupera el ID iniciando sesión
+   con la contraseña del CSV.
+4. Inserta todos los perfiles en una sola petición (ignore-duplicates).
+
+Las tareas en hilos no tocan st.session_state: el registro usa la clave
+anónima y el token del Admin solo se usa en el hilo principal.
+"""
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+import account_service
+import db_service
+from bulk_import import map_headers, read_csv
+from request_context import RateLimited, ServiceError, from_session
+
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+MIN_PASSWORD_LENGTH = 6  # Mínimo por defecto de Supabase Auth
+MAX_RETRIES = 5
+
+USER_SPEC = {
+    'columns': {
+        'email': ('correo', 'correo electronico'),
+        'username': ('nombre', 'nombre completo'),
+        'password': ('contrasena', 'clave'),
+        'role': ('rol',),
+        'branch': ('sucursal',),
+        'phone_number': ('telefono',),
+    },
+}
+
+
+class RateLimiter:
+    """Token bucket seguro entre hilos: como máximo `rate` peticiones por segundo (ráfaga `burst`)."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Vacía el bucket para que todos los hilos esperen (p. ej. tras un 429)."""
+        with self.lock:
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
+            self.updated = time.monotonic()
+
+
+def validate_users(records: list, role_options: dict, branch_options: dict):
+    """Retorna (usuarios_válidos, errores). Cada usuario válido incluye su número de fila."""
+    header_map = map_headers(list(records[0].keys()) if records else [], USER_SPEC)
+    valid, errors, seen = [], [], {}
+    roles_ci = {name.lower(): role_id for name, role_id in role_options.items()}
+    branches_ci = {name.lower(): branch_id for name, branch_id in branch_options.items()}
+
+    for line, record in enumerate(records, start=2):
+        values = {header_map[h]: (v or '').strip() for h, v in record.items() if h in header_map and isinstance(v, str)}
+        email = values.get('email', '').lower()
+        problems = []
+        if not EMAIL_RE.match(email):
+            problems.append("correo inválido")
+        if not values.get('username'):
+            problems.append("falta el nombre")
+        if len(values.get('password', '')) < MIN_PASSWORD_LENGTH:
+            problems.append(f"contraseña de menos de {MIN_PASSWORD_LENGTH} caracteres")
+        role_id = roles_ci.get(values.get('role', '').lower())
+        if role_id is None:
+            problems.append(f"rol desconocido '{values.get('role', '')}'")
+        branch_id = None
+        if values.get('branch'):
+            branch_id = branches_ci.get(values['branch'].lower())
+            if branch_id is None:
+                problems.append(f"sucursal desconocida '{values['branch']}'")
+        if email in seen:
+            problems.append(f"correo duplicado en el archivo (ver fila {seen[email]})")
+
+        if problems:
+            errors.append({'Fila': line, 'Correo': email, 'Resultado': 'Error', 'Detalle': '; '.join(problems)})
+            continue
+        seen[email] = line
+        valid.append({
+            'line': line, 'email': email, 'username': values['username'], 'password': values['password'],
+            'role_id': role_id, 'branch_id': branch_id, 'phone_number': values.get('phone_number') or None,
+        })
+    return valid, errors
+
+
+def signup_user(user: dict, limiter: RateLimiter):
+    """Registra un usuario en Auth. Retorna (user_id, detalle) o (None, error)."""
+    for attempt in range(MAX_RETRIES):
+        try:
+            user_id, resumed = account_service.sign_up_or_resume(user['email'], user['password'], throttle=limiter.acquire)
+            return user_id, 'Ya registrado en Auth (reanudado)' if resumed else 'Registrado'
+        except RateLimited as e:
+            # http_client ya esperó los Retry-After de esta petición; se frena también a los demás hilos
+            limiter.pause(min(30.0, 2 ** attempt))
+            error = e.message
+        except ServiceError as e:
+            return None, e.message
+    return None, error
+
+
+def provision_users(users: list, rate_per_second: float = 2.0, max_workers: int = 4, progress=None):
+    """
+    Ejecuta el alta completa y retorna el reporte por usuario (llamar desde el hilo de Streamlit).
+    Lanza ServiceError si no se pueden consultar los perfiles existentes.
+    """
+    report = []
+    existing = account_service.profile_emails(from_session())
+    pending = []
+    for user in users:
+        if user['email'] in existing:
+            report.append({'Fila': user['line'], 'Correo': user['email'], 'Resultado': 'Omitido', 'Detalle': 'Ya tiene perfil.'})
+        else:
+            pending.append(user)
+
+    limiter = RateLimiter(rate_per_second, burst=max_workers)
+    signed_up = []
+    done = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [(user, pool.submit(signup_user, user, limiter)) for user in pending]
+        for user, future in futures:
+            try:
+                user_id, detail = future.result()
+            except Exception as e:
+                user_id, detail = None, str(e)
+            if user_id:
+                signed_up.append((user, user_id, detail))
+            else:
+                report.append({'Fila': user['line'], 'Correo': user['email'], 'Resultado': 'Error', 'Detalle': detail})
+            done += 1
+            if progress:
+                progress(done / max(len(pending), 1))
+
+    if signed_up:
+        profiles = [
+            {
+                'id': user_id, 'email': user['email'], 'username': user['username'], 'role_id': user['role_id'],
+                'branch_id': user['branch_id'], 'phone_number': user['phone_number'],
+            }
+            for user, user_id, _ in signed_up
+        ]
+        ok, message = db_service.upsert_entries('profiles', profiles, on_conflict='id', resolution='ignore-duplicates')
+        for user, _, detail in signed_up:
+            if ok:
+                report.append({'Fila': user['line'], 'Correo': user['email'], 'Resultado': 'Creado', 'Detalle': detail})
+            else:
+                report.append({
+                    'Fila': user['line'], 'Correo': user['email'], 'Resultado': 'Error',
+                    'Detalle': f"Perfil no creado ({message}). Re-ejecute la importación para reanudar.",
+                })
+    return sorted(report, key=lambda r: r['Fila'])
+
+
+def render_bulk_user_import(role_options: dict, branch_options: dict):
+    """Pestaña de alta masiva dentro de Gestión de Usuarios (Solo Admin)."""
+    import pandas as pd
+
+    st.subheader("Alta Masiva de Usuarios (CSV)")
+    st.caption(
+        "Columnas: email, username, password, role, branch (opcional), phone_number (opcional). "
+        "Puede re-ejecutar el mismo archivo: los usuarios ya creados se omiten."
+    )
+    st.download_button(
+        "Descargar plantilla CSV",
+        data="email,username,password,role,branch,phone_number\ncajero@ejemplo.com,Ana Mora,Cambiar123,Cashier,Sucursal Centro,\n",
+        file_name="plantilla_usuarios.csv", mime="text/csv", key="bulk_users_template",
+    )
+
+    col1, col2 = st.columns(2)
+    with col1:
+        rate = st.number_input("Registros por segundo (límite de Auth)", min_value=0.1, max_value=50.0, value=2.0, step=0.5)
+    with col2:
+        workers = st.number_input("Registros en paralelo", min_value=1, max_value=16, value=4)
+
+    uploaded = st.file_uploader("Archivo CSV de usuarios", type=["csv"], key="bulk_users_file")
+    if uploaded is None:
+        return
+
+    records = read_csv(uploaded.getvalue())
+    valid, errors = validate_users(records, role_options, branch_options)
+    st.info(f"{len(records)} filas leídas: {len(valid)} válidas, {len(errors)} con errores.")
+    if errors:
+        st.dataframe(pd.DataFrame(errors), width='stretch')
+
+    if valid and st.button(f"Crear {len(valid)} usuarios", type="primary", key="bulk_users_run"):
+        progress_bar = st.progress(0.0)
+        try:
+            report = provision_users(valid, rate_per_second=rate, max_workers=int(workers), progress=progress_bar.progress)
+        except ServiceError as e:
+            st.error(e.message)
+            return
+        report = sorted(report + errors, key=lambda r: r['Fila'])
+        summary = pd.DataFrame(report)['Resultado'].value_counts().to_dict()
+        st.success("Alta masiva finalizada: " + ", ".join(f"{k}: {v}" for k, v in summary.items()))
+        st.dataframe(pd.DataFrame(report), width='stretch')
+        st.download_button(
+            "Descargar reporte", data=pd.DataFrame(report).to_csv(index=False),
+            file_name="reporte_alta_usuarios.csv", mime="text/csv", key="bulk_users_report",
+        )
@@ -1,104 +1,66 @@
 # user_service.py
-import requests 
 import streamlit as st
-import pandas as pd
-import uuid
+import account_service
 import db_service # Necesario para obtener listas de roles/sucursales
-import json
-from db_config import AUTH_ENDPOINT, POSTGREST_ENDPOINT, get_headers, SUPABASE_KEY 
+from request_context import ServiceError, from_session
 import auth # Necesario para obtener el token del admin logueado
 
 # --- Funciones de Lectura y Conversión ---
 
 def get_all_users_with_branches():
-    """Obtiene todos los usuarios con sus roles y sucursales asignadas usando PostgREST."""
-    
-    # Debe usar el token de la sesión del Admin para la autorización
-    token = st.session_state.get('token')
-    
-    # Consulta: Obtener profile, role_name, y branch_name a través de JOINs
-    url = f"{POSTGREST_ENDPOINT}/profiles?select=id,username,email,phone_number,roles(role_name),branches(name)"
-    
+    """Obtiene todos los usuarios con sus roles y sucursales asignadas (embeds del backend)."""
+    import pandas as pd  # Diferido: solo la gestión de usuarios lo necesita
+
     try:
-        response = requests.get(url, headers=get_headers(token))
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        if data:
-            df = pd.DataFrame(data)
-            # Aplanar los datos de relación (porque Supabase devuelve objetos anidados)
-            df['role_name'] = df['roles'].apply(lambda x: x['role_name'] if isinstance(x, dict) and x else None)
-            df['branch_name'] = df['branches'].apply(lambda x: x['name'] if isinstance(x, dict) and x else 'N/A')
-            return df[['id', 'username', 'email', 'role_name', 'branch_name', 'phone_number']]
-        return pd.DataFrame()
-        
-    except Exception as e:
-        # En el caso de "No API key found" u otro error
-        st.error(f"Error al obtener usuarios. Asegúrese de tener el perfil Admin configurado. Error: {e}")
+        # Debe usar el token de la sesión del Admin para la autorización
+        rows = account_service.list_users(from_session())
+    except ServiceError as e:
+        st.error(e.message)
         return pd.DataFrame()
+    return pd.DataFrame(rows, columns=account_service.USER_COLUMNS) if rows else pd.DataFrame()
+
+
+def get_users_page(search: str = None, page: int = 1, page_size: int = db_service.PAGE_SIZE):
+    """
+    Obtiene una página de usuarios (búsqueda ilike por nombre o correo en el servidor).
+    Retorna (DataFrame, total).
+    """
+    import pandas as pd  # Diferido: solo la gestión de usuarios lo necesita
+
+    rows, total = db_service.get_data_page(
+        'profiles',
+        select_params=account_service.USER_SELECT,
+        search=search,
+        search_columns=('username', 'email'),
+        page=page,
+        page_size=page_size,
+        order='username.asc',
+    )
+    if not rows:
+        return pd.DataFrame(), total
+
+    users = [account_service.flatten_user(row) for row in rows]
+    return pd.DataFrame(users, columns=account_service.USER_COLUMNS), total
 
 
 # --- Funciones de Creación de Usuarios ---
 
 def create_user_profile(email: str, username: str, password: str, role_id: int, branch_id: int = None, phone_number: str = None):
     """
-    Crea un usuario en Supabase Auth usando la contraseña manual y su perfil correspondiente.
+    Crea un usuario en Auth (Supabase o SQLite local) usando la contraseña manual y su perfil correspondiente.
     """
-    token = st.session_state.get('token')
-    if not token:
-        st.error("Se requiere autenticación para esta acción.")
-        return False
-
     try:
-        # 1. Registrar usuario en Auth con la contraseña proporcionada
-        auth_url = f"{AUTH_ENDPOINT}/signup"
-        auth_payload = {"email": email, "password": password}
-        
-        # Llamada a /signup debe usar la clave anónima (get_headers() sin token)
-        auth_response = requests.post(auth_url, headers=get_headers(), json=auth_payload)
-        auth_response.raise_for_status()
-        
-        auth_data = auth_response.json()
-        user_data = auth_data.get('user', auth_data) 
-        user_id = user_data.get('id') # ID del usuario recién creado
-        
-        if not user_id:
-            raise Exception("No se pudo obtener el ID del usuario recién creado.")
-
-        # 2. Crear el perfil en la tabla 'profiles' (usando el token del Admin)
-        profile_url = f"{POSTGREST_ENDPOINT}/profiles"
-        profile_payload = {
-            'id': user_id,
-            'email': email,
-            'username': username,
-            'role_id': role_id,
-            'branch_id': branch_id
-        }
-        
-        # Esta llamada usa el token del Admin (get_headers(token))
-        profile_response = requests.post(
-            profile_url, 
-            headers=get_headers(token), 
-            data=json.dumps(profile_payload)
-        )
-        profile_response.raise_for_status()
-
-        st.success(f"Usuario **{username}** ({email}) creado exitosamente con la contraseña proporcionada.")
-        return True
-
-    except requests.exceptions.HTTPError as err:
-        error_data = err.response.json()
-        error_msg = error_data.get('msg', error_data.get('message', str(err)))
-        if 'email address is already taken' in error_msg:
-             st.error("Error: Este correo electrónico ya está registrado.")
-        else:
-            st.error(f"Error al crear usuario: {error_msg}")
+        account_service.create_user(from_session(), email, username, password, role_id, branch_id, phone_number)
+    except ServiceError as e:
+        st.error(e.message)
         return False
     except Exception as e:
         st.error(f"Error inesperado al crear usuario: {e}")
         return False
 
+    st.success(f"Usuario **{username}** ({email}) creado exitosamente con la contraseña proporcionada.")
+    return True
+
 
 # --- Renderización del Módulo de Streamlit ---
 
@@ -119,7 +81,7 @@ def render_user_management():
     role_options = {r['role_name']: r['id'] for r in roles}
     branch_options = {b['name']: b['id'] for b in branches}
 
-    tab1, tab2 = st.tabs(["Crear Nuevo Usuario", "Ver Todos los Usuarios"])
+    tab1, tab2, tab3 = st.tabs(["Crear Nuevo Usuario", "Ver Todos los Usuarios", "Carga Masiva (CSV)"])
 
     with tab1:
         st.subheader("Crear Nuevo Usuario")
@@ -156,9 +118,15 @@ def render_user_management():
 
     with tab2:
         st.subheader("Lista de Usuarios del Sistema")
-        df_users = get_all_users_with_branches()
+        search, page = db_service.render_search_box("users", "Nombre o correo")
+        df_users, users_total = get_users_page(search, page)
         if not df_users.empty:
             # Uso la sintaxis corregida para evitar advertencias de Streamlit
             st.dataframe(df_users, width='stretch')
         else:
             st.info("No hay usuarios registrados o el perfil Admin no tiene permisos.")
+        db_service.render_pager("users", users_total)
+
+    with tab3:
+        import user_provisioning
+        user_provisioning.render_bulk_user_import(role_options, branch_options)
@@ -0,0 +1,509 @@
+# warm_pool.py
+"""
+Reserva de tarjetas listas para emisión inmediata (Creador de QRs → ⚡ Emisión Inmediata).
+
+Para entregar una tarjeta suelta en el mostrador (p. ej. una cortesía por un
+reclamo) no hace falta esperar el lote, el renderizado y el PDF: por cada par
+promoción/emisor configurado se mantienen `target` cupones ya creados con
+coupon_service.create_coupon_batch y sus tarjetas ya renderizadas en disco.
+
+- Emitir (claim) toma la tarjeta más antigua de la reserva en una transacción
+  local, confirma en la base que el cupón sigue pendiente (un GET) y finaliza
+  sus datos: la vigencia se recalcula desde el día de emisión (un PATCH, y se
+  vuelve a dibujar la tarjeta solo si la fecha cambió).
+- La reserva se repone en un hilo de fondo (refill_async) con el token de quien
+  emitió o abrió la pestaña; también con `python warm_pool.py --email ... --password ...`.
+
+El estado (configuración, tarjetas disponibles y emitidas) vive en un SQLite
+local (WARM_POOL_PATH) y las imágenes en WARM_POOL_DIR, así que sobrevive a
+reinicios y varios procesos de la app en el mismo servidor comparten la reserva.
+Los cupones de la reserva son cupones normales de un lote POOL_<promoción>; su
+QR solo existe en el servidor hasta que se emiten.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+from card_render import DEFAULT_EXPORT_PROFILE, card_filename, compose_card, get_export_profile, make_qr_image, save_card
+
+POOL_PATH = os.environ.get('WARM_POOL_PATH', 'warm_pool.sqlite3')
+POOL_DIR = os.environ.get('WARM_POOL_DIR', 'warm_pool')
+REFILL_CHUNK = int(os.environ.get('WARM_POOL_REFILL_CHUNK', 50))  # cupones por lote de reposición
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pools (
+    promo_id INTEGER NOT NULL,
+    issuer_id INTEGER NOT NULL,
+    target INTEGER NOT NULL,
+    valid_days INTEGER NOT NULL,
+    branch_names TEXT NOT NULL DEFAULT '[]',
+    profile TEXT NOT NULL,
+    signed INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (promo_id, issuer_id)
+);
+CREATE TABLE IF NOT EXISTS cards (
+    coupon_id TEXT PRIMARY KEY,
+    promo_id INTEGER NOT NULL,
+    issuer_id INTEGER NOT NULL,
+    batch_id TEXT NOT NULL,
+    consecutive INTEGER NOT NULL,
+    code TEXT NOT NULL,
+    description TEXT NOT NULL,
+    expiration_date TEXT NOT NULL,
+    valid_days INTEGER NOT NULL,
+    profile TEXT NOT NULL,
+    signed INTEGER NOT NULL DEFAULT 0,
+    image_path TEXT NOT NULL,          -- '' mientras la tarjeta no se ha renderizado
+    created_at REAL NOT NULL,
+    claimed_at REAL,
+    claimed_by TEXT
+);
+CREATE INDEX IF NOT EXISTS cards_available ON cards (promo_id, issuer_id, claimed_at, consecutive);
+"""
+
+_init_lock = threading.Lock()
+_initialized = False
+_refill_lock = threading.Lock()
+_last_refill = {'at': None, 'created': 0, 'error': None}
+
+
+def _connect():
+    global _initialized
+    conn = sqlite3.connect(POOL_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    if not _initialized:
+        with _init_lock:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+            _initialized = True
+    return conn
+
+
+# --- Configuración ---
+
+def set_pool(promo_id: int, issuer_id: int, target: int, valid_days: int = 30, branch_names: list = (),
+             profile: str = DEFAULT_EXPORT_PROFILE, signed: bool = False):
+    """Crea o cambia la reserva de una promoción/emisor (target=0 deja de reponerla)."""
+    get_export_profile(profile)  # Falla aquí si el perfil no existe
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO pools (promo_id, issuer_id, target, valid_days, branch_names, profile, signed) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (promo_id, issuer_id) DO UPDATE SET "
+            "target = excluded.target, valid_days = excluded.valid_days, branch_names = excluded.branch_names, "
+            "profile = excluded.profile, signed = excluded.signed",
+            (promo_id, issuer_id, max(0, int(target)), int(valid_days), json.dumps(list(branch_names)), profile, int(signed)),
+        )
+
+
+def get_pools() -> list:
+    """
+    Configuración de cada reserva con 'available' (listas para emitir), 'unrendered'
+    (cupones creados cuya tarjeta falta dibujar) e 'issued' (ya emitidas).
+    """
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT p.*, "
+            "  (SELECT count(*) FROM cards c WHERE c.promo_id = p.promo_id AND c.issuer_id = p.issuer_id "
+            "     AND c.claimed_at IS NULL AND c.image_path != '') AS available, "
+            "  (SELECT count(*) FROM cards c WHERE c.promo_id = p.promo_id AND c.issuer_id = p.issuer_id "
+            "     AND c.claimed_at IS NULL AND c.image_path = '') AS unrendered, "
+            "  (SELECT count(*) FROM cards c WHERE c.promo_id = p.promo_id AND c.issuer_id = p.issuer_id "
+            "     AND c.claimed_at IS NOT NULL) AS issued "
+            "FROM pools p ORDER BY p.promo_id, p.issuer_id"
+        ).fetchall()
+    pools = []
+    for row in rows:
+        pool = dict(row)
+        pool['branch_names'] = json.loads(pool['branch_names'])
+        pool['signed'] = bool(pool['signed'])
+        pools.append(pool)
+    return pools
+
+
+def needs_refill() -> bool:
+    return any(pool['available'] < pool['target'] for pool in get_pools())
+
+
+# --- Reposición ---
+
+def _render(card: dict) -> str:
+    """Dibuja y guarda la tarjeta en POOL_DIR; retorna la ruta."""
+    import qr_signing
+
+    qr_data = card['code']
+    if card['signed']:
+        qr_data = qr_signing.sign_payload(card['coupon_id'], card['batch_id'], card['expiration_date'])
+    settings = get_export_profile(card['profile'])
+    card_img = compose_card(make_qr_image(qr_data), card['description'], card['expiration_date'],
+                            str(card['consecutive']).zfill(4), dpi=settings['dpi'])
+    path = os.path.join(POOL_DIR, card_filename(card['coupon_id'], card['profile']))
+    return save_card(card_img, path, settings)
+
+
+def _render_pending(pool: dict) -> int:
+    """Dibuja las tarjetas de la reserva que quedaron sin imagen; retorna cuántas."""
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT * FROM cards WHERE promo_id = ? AND issuer_id = ? AND claimed_at IS NULL AND image_path = '' "
+            "ORDER BY consecutive", (pool['promo_id'], pool['issuer_id']),
+        ).fetchall()
+    for row in rows:
+        image_path = _render(dict(row))
+        with _connect() as conn:
+            conn.execute("UPDATE cards SET image_path = ? WHERE coupon_id = ?", (image_path, row['coupon_id']))
+    return len(rows)
+
+
+def _refill_pool(ctx, pool: dict, promo: dict) -> int:
+    """Crea y renderiza lo que le falta a una reserva, en lotes de REFILL_CHUNK; retorna cuántas agregó."""
+    import coupon_service
+
+    # Primero lo que una reposición anterior dejó sin dibujar: esos cupones ya existen
+    created = _render_pending(pool)
+    missing = pool['target'] - pool['available'] - created
+    while missing > 0:
+        count = min(missing, REFILL_CHUNK)
+        # Mismos valores por defecto que el formulario del Creador (₡590 por dólar)
+        entries = coupon_service.create_coupon_batch(
+            ctx,
+            count=count,
+            description=promo['description'],
+            promo_id=promo['id'],
+            value_crc=promo['value'] or 0,
+            value_usd=round((promo['value'] or 0) / 590, 2),
+            issuer_id=pool['issuer_id'],
+            valid_days=pool['valid_days'],
+            branch_names=pool['branch_names'],
+            batch_name_prefix=f"POOL_{promo['type_name']}",
+        )
+        # Las filas se guardan antes de dibujar: si el render falla, los cupones siguen en la
+        # reserva (sin imagen) y la próxima reposición los termina en vez de crear otro lote
+        now = time.time()
+        cards = [{
+            'coupon_id': entry['id'], 'promo_id': pool['promo_id'], 'issuer_id': pool['issuer_id'],
+            'batch_id': entry['batch_id'], 'consecutive': entry['consecutive'], 'code': entry['code'],
+            'description': promo['description'], 'expiration_date': str(entry['expiration_date'])[:10],
+            'valid_days': pool['valid_days'], 'profile': pool['profile'], 'signed': int(pool['signed']),
+            'image_path': '', 'created_at': now,
+        } for entry in entries]
+        with _connect() as conn:
+            conn.executemany(
+                f"INSERT INTO cards ({', '.join(cards[0])}) VALUES ({', '.join('?' * len(cards[0]))})",
+                [tuple(card.values()) for card in cards],
+            )
+        created += _render_pending(pool)
+        missing -= len(cards)
+    return created
+
+
+def refill(ctx) -> int:
+    """
+    Completa todas las reservas por debajo de su objetivo; retorna las tarjetas agregadas.
+    Una sola reposición a la vez por proceso (lanza ServiceError si falla el lote).
+    """
+    import coupon_service
+
+    ctx.require_role('Admin', 'Creator')
+    with _refill_lock:
+        created, error = 0, None
+        try:
+            pending = [pool for pool in get_pools() if pool['available'] < pool['target']]
+            if pending:
+                os.makedirs(POOL_DIR, exist_ok=True)
+                promos = {p['id']: p for p in coupon_service.list_table(ctx, 'promos')}
+                for pool in pending:
+                    if pool['promo_id'] in promos:  # Una promoción eliminada deja de reponerse
+                        created += _refill_pool(ctx, pool, promos[pool['promo_id']])
+        except Exception as e:
+            error = getattr(e, 'message', str(e))
+            raise
+        finally:
+            _last_refill.update(at=time.time(), created=created, error=error)
+    return created
+
+
+def refill_async(ctx) -> bool:
+    """Repone en un hilo de fondo si hace falta y no hay otra reposición en curso; retorna si la inició."""
+    if ctx.role not in ('Admin', 'Creator') or _refill_lock.locked() or not needs_refill():
+        return False
+
+    def run():
+        try:
+            refill(ctx)
+        except Exception:
+            pass  # Queda en last_refill(); la próxima emisión o visita lo reintenta
+
+    threading.Thread(target=run, name='warm-pool-refill', daemon=True).start()
+    return True
+
+
+def refilling() -> bool:
+    return _refill_lock.locked()
+
+
+def last_refill() -> dict:
+    """{'at': epoch o None, 'created': tarjetas agregadas, 'error': mensaje o None}."""
+    return dict(_last_refill)
+
+
+# --- Emisión ---
+
+def _take(promo_id: int, issuer_id: int, user_id: str):
+    """Marca como emitida la tarjeta disponible más antigua (atómico entre procesos); retorna la fila o None."""
+    conn = _connect()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute(
+            "SELECT * FROM cards WHERE promo_id = ? AND issuer_id = ? AND claimed_at IS NULL AND image_path != '' "
+            "ORDER BY consecutive LIMIT 1", (promo_id, issuer_id),
+        ).fetchone()
+        if row is None:
+            conn.commit()
+            return None
+        card = dict(row, claimed_at=time.time(), claimed_by=user_id)
+        conn.execute("UPDATE cards SET claimed_at = ?, claimed_by = ? WHERE coupon_id = ?",
+                     (card['claimed_at'], user_id, card['coupon_id']))
+        conn.commit()
+        return card
+    finally:
+        conn.close()
+
+
+def _finalize(ctx, card: dict) -> bool:
+    """
+    Revisa el cupón en la base y cuenta la vigencia desde hoy. Retorna False si la
+    tarjeta ya no sirve: el cupón se anuló (p. ej. el lote POOL_ completo), se canjeó
+    o pasó al archivo desde que se renderizó.
+    """
+    import coupon_service
+
+    coupon = coupon_service.get_coupon(ctx, card['coupon_id'], 'id,status')
+    if coupon is None or coupon['status'] in ('void', 'redeemed'):
+        return False
+    expiration_date = (date.today() + timedelta(days=card['valid_days'])).isoformat()
+    if card['expiration_date'] == expiration_date:
+        return coupon['status'] == 'active'
+    # La fila del lote conserva la fecha de reposición; la del cupón es la que vale al canjear
+    # (también reactiva un cupón que el barrido marcó como vencido)
+    coupon_service.update_entry(ctx, 'coupons', card['coupon_id'], {'expiration_date': expiration_date})
+    card['expiration_date'] = expiration_date
+    card['image_path'] = _render(card)
+    with _connect() as conn:
+        conn.execute("UPDATE cards SET expiration_date = ?, image_path = ? WHERE coupon_id = ?",
+                     (expiration_date, card['image_path'], card['coupon_id']))
+    return True
+
+
+def _drop(card: dict):
+    """Saca de la reserva una tarjeta cuyo cupón ya no es válido."""
+    with _connect() as conn:
+        conn.execute("DELETE FROM cards WHERE coupon_id = ?", (card['coupon_id'],))
+    try:
+        os.remove(card['image_path'])
+    except OSError:
+        pass
+
+
+def claim(ctx, promo_id: int, issuer_id: int):
+    """
+    Emite una tarjeta de la reserva: retorna el dict de la tarjeta (coupon_id, code,
+    consecutive, expiration_date, image_path, ...) o None si la reserva está vacía.
+    Antes de entregarla se confirma en la base que el cupón sigue pendiente (las
+    tarjetas muertas se descartan y se prueba la siguiente). La vigencia se cuenta
+    desde hoy; si la tarjeta se renderizó otro día se actualiza el cupón y se vuelve
+    a dibujar. Lanza ServiceError si no se pudo finalizar (la tarjeta vuelve a la reserva).
+    """
+    ctx.require_role('Admin', 'Creator')
+    while True:
+        card = _take(promo_id, issuer_id, ctx.user_id)
+        if card is None:
+            break
+        try:
+            usable = _finalize(ctx, card)
+        except Exception:
+            with _connect() as conn:
+                conn.execute("UPDATE cards SET claimed_at = NULL, claimed_by = NULL WHERE coupon_id = ?",
+                             (card['coupon_id'],))
+            raise
+        if usable:
+            break
+        _drop(card)
+    refill_async(ctx)
+    return card
+
+
+def discard(ctx, promo_id: int, issuer_id: int) -> int:
+    """
+    Anula en la base los cupones aún no emitidos de una reserva y los saca de ella
+    (p. ej. tras cambiar vigencia o sucursales); retorna cuántos. No repone.
+    """
+    import coupon_service
+
+    ctx.require_role('Admin')
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT batch_id, consecutive, coupon_id, image_path FROM cards "
+            "WHERE promo_id = ? AND issuer_id = ? AND claimed_at IS NULL ORDER BY batch_id, consecutive",
+            (promo_id, issuer_id),
+        ).fetchall()
+    # Tramos contiguos por lote: las tarjetas ya emitidas entre ellos no se tocan
+    runs = []
+    for row in rows:
+        if runs and runs[-1][0] == row['batch_id'] and runs[-1][2] == row['consecutive'] - 1:
+            runs[-1][2] = row['consecutive']
+        else:
+            runs.append([row['batch_id'], row['consecutive'], row['consecutive']])
+    for batch_id, consecutive_from, consecutive_to in runs:
+        coupon_service.void_batch(ctx, batch_id, consecutive_from, consecutive_to)
+    with _connect() as conn:
+        conn.executemany("DELETE FROM cards WHERE coupon_id = ? AND claimed_at IS NULL",
+                         [(row['coupon_id'],) for row in rows])
+    for row in rows:
+        try:
+            os.remove(row['image_path'])
+        except OSError:
+            pass
+    return len(rows)
+
+
+def card_pdf(card: dict) -> str:
+    """PDF de una sola página con la tarjeta emitida (mismo formato que el lote)."""
+    from card_render import generate_pdf_from_images
+
+    return generate_pdf_from_images([card['image_path']], os.path.join(POOL_DIR, f"tarjeta_{card['consecutive']}.pdf"),
+                                    card['profile'])
+
+
+# --- Interfaz (pestaña del Creador de QRs) ---
+
+def render_instant_issue_tab(promos: list, issuers: list, branch_options: list):
+    """Emisión de una tarjeta de la reserva y, para Admin, configuración de las reservas."""
+    import pandas as pd
+    import streamlit as st
+    import auth
+    import memory_budget
+    import qr_signing
+    from card_render import EXPORT_PROFILES
+    from request_context import ServiceError, from_session
+
+    ctx = from_session()
+    st.header("⚡ Emisión Inmediata")
+    st.caption("Tarjetas ya creadas y renderizadas: emitir una no espera el lote ni el PDF. "
+               "La reserva se repone en segundo plano.")
+
+    promo_names = {p['id']: p['type_name'] for p in promos}
+    issuer_names = {i['id']: i['issuer_name'] for i in issuers}
+    pools = [pool for pool in get_pools() if pool['promo_id'] in promo_names and pool['issuer_id'] in issuer_names]
+    refill_async(ctx)
+
+    if not pools:
+        st.info("No hay reservas configuradas." + (" Cree una abajo." if auth.get_user_role() == 'Admin' else ""))
+    else:
+        labels = {f"{promo_names[p['promo_id']]} · {issuer_names[p['issuer_id']]}": p for p in pools}
+        selected = labels[st.selectbox("Reserva", options=list(labels.keys()))]
+        col1, col2 = st.columns(2)
+        col1.metric("Disponibles", f"{selected['available']} / {selected['target']}")
+        col2.metric("Emitidas", selected['issued'])
+
+        if st.button("🎁 Emitir tarjeta", type="primary", disabled=not selected['available']):
+            try:
+                card = claim(ctx, selected['promo_id'], selected['issuer_id'])
+            except ServiceError as e:
+                st.error(e.message)
+                card = None
+            if card:
+                st.session_state['warm_pool_card'] = card
+            elif card is None and selected['available']:
+                st.warning("La reserva se vació mientras tanto. Intente de nuevo en unos segundos.")
+
+        card = st.session_state.get('warm_pool_card')
+        if card and card['promo_id'] == selected['promo_id'] and card['issuer_id'] == selected['issuer_id']:
+            st.success(f"Tarjeta emitida: consecutivo {str(card['consecutive']).zfill(4)}, válida hasta {card['expiration_date']}.")
+            st.image(card['image_path'], width=450)
+            st.download_button("Descargar PDF de la tarjeta", data=memory_budget.file_data(card_pdf(card)),
+                               file_name=f"tarjeta_{str(card['consecutive']).zfill(4)}.pdf", mime="application/pdf")
+
+        if refilling():
+            st.caption("🔄 Reponiendo la reserva...")
+        elif last_refill()['error']:
+            st.warning(f"La última reposición falló: {last_refill()['error']}")
+
+    if auth.get_user_role() != 'Admin':
+        return
+
+    st.divider()
+    st.subheader("Configurar reservas")
+    if pools:
+        st.dataframe(pd.DataFrame([{
+            'Promoción': promo_names[p['promo_id']], 'Emisor': issuer_names[p['issuer_id']],
+            'Objetivo': p['target'], 'Disponibles': p['available'], 'Sin dibujar': p['unrendered'], 'Emitidas': p['issued'],
+            'Vigencia (días)': p['valid_days'], 'Sucursales': ', '.join(p['branch_names']) or 'Todas',
+            'Perfil': EXPORT_PROFILES[p['profile']]['label'],
+        } for p in pools]), width='stretch', hide_index=True)
+
+    promo_options = {p['type_name']: p['id'] for p in promos}
+    issuer_options = {i['issuer_name']: i['id'] for i in issuers}
+    with st.form("warm_pool_form"):
+        col1, col2 = st.columns(2)
+        with col1:
+            promo_name = st.selectbox("Promoción", options=list(promo_options.keys()))
+            issuer_name = st.selectbox("Emisor/Campaña", options=list(issuer_options.keys()))
+            target = st.number_input("Tarjetas en reserva", min_value=0, max_value=500, value=10,
+                                     help="0 deja de reponer la reserva (las disponibles se pueden seguir emitiendo).")
+        with col2:
+            valid_days = st.number_input("Días de vigencia (desde la emisión)", min_value=1, max_value=365, value=30)
+            allowed_branches = st.multiselect("Sucursales permitidas (vacío = todas)", options=branch_options)
+            profile = st.selectbox("Perfil de exportación", options=list(EXPORT_PROFILES.keys()),
+                                   index=list(EXPORT_PROFILES.keys()).index(DEFAULT_EXPORT_PROFILE),
+                                   format_func=lambda key: EXPORT_PROFILES[key]['label'])
+            signed = False
+            if qr_signing.signing_enabled():
+                signed = st.checkbox("Firmar QRs", value=True)
+        if st.form_submit_button("Guardar reserva"):
+            set_pool(promo_options[promo_name], issuer_options[issuer_name], target, valid_days, allowed_branches,
+                     profile, signed)
+            st.success("Reserva guardada. Se repone en segundo plano.")
+            refill_async(ctx)
+            st.rerun()
+
+    if pools:
+        discard_label = st.selectbox("Vaciar reserva", options=list(labels.keys()),
+                                     help="Anula los cupones no emitidos (p. ej. tras cambiar vigencia o sucursales).")
+        if st.button("🗑️ Anular tarjetas no emitidas"):
+            pool = labels[discard_label]
+            try:
+                voided = discard(ctx, pool['promo_id'], pool['issuer_id'])
+                st.success(f"{voided} cupón(es) anulados y retirados de la reserva.")
+            except ServiceError as e:
+                st.error(e.message)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Repone las reservas de emisión inmediata (una ejecución).')
+    parser.add_argument('--email', default=os.environ.get('BATCH_EMAIL'), help='Usuario Admin o Creator (o BATCH_EMAIL)')
+    parser.add_argument('--password', default=os.environ.get('BATCH_PASSWORD'), help='Contraseña (o BATCH_PASSWORD)')
+    args = parser.parse_args()
+    if not args.email or not args.password:
+        parser.error('Se requieren --email y --password (o BATCH_EMAIL / BATCH_PASSWORD).')
+
+    import account_service
+    from request_context import ServiceError
+
+    try:
+        created = refill(account_service.sign_in(args.email, args.password))
+    except ServiceError as e:
+        print(f'Error al reponer: {e.message}', file=sys.stderr)
+        return 1
+    for pool in get_pools():
+        print(f"promo {pool['promo_id']} / emisor {pool['issuer_id']}: {pool['available']}/{pool['target']} disponibles")
+    print(f'{created} tarjeta(s) agregadas.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
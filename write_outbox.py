@@ -0,0 +1,417 @@
+# write_outbox.py
+"""
+Cola local y durable de escrituras (opcional), respaldada en SQLite.
+
+Con WRITE_OUTBOX=1, create_entry, update_entry, delete_entry y la inserción
+de cupones de create_coupon_batch no llaman a PostgREST: guardan la escritura en
+outbox.sqlite3 (WRITE_OUTBOX_PATH) y retornan de inmediato. Un hilo de fondo
+la envía después:
+
+- En el orden en que se registró (seq), así se respetan el orden por tabla y
+  las llaves foráneas (el lote antes que sus cupones).
+- Agrupando filas consecutivas de la misma tabla en un solo POST de hasta
+  FLUSH_BATCH_SIZE filas: el throughput no depende de la latencia por petición.
+- Cada escritura registrada es una fila propia de la cola (llave única por
+  escritura), y la inserción se envía como upsert ignore-duplicates sobre su
+  llave natural (id de lotes y cupones, nombre en los datos maestros): así un
+  reenvío tras un corte no duplica filas en el servidor. En los datos maestros
+  un nombre que ya existía no se crea: la escritura queda como fallida.
+
+Si el backend no responde (5xx, red, circuito abierto) la cola se detiene y
+se reintenta más tarde. Un rechazo definitivo (4xx) se marca como fallido y
+no bloquea el resto; el Admin lo revisa en "Cola de Escritura".
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+OUTBOX_PATH = os.environ.get('WRITE_OUTBOX_PATH', 'outbox.sqlite3')
+FLUSH_BATCH_SIZE = 500
+FLUSH_INTERVAL = 2.0        # segundos entre ciclos sin trabajo nuevo
+MAX_IDLE_BACKOFF = 60.0     # espera máxima tras fallos seguidos del backend
+SENT_RETENTION = 24 * 3600  # las filas enviadas se conservan un día para auditoría
+
+# Llave natural por tabla para el upsert idempotente en el servidor (ver migrations/002).
+CONFLICT_COLUMNS = {
+    'batches': 'id',
+    'coupons': 'id',
+    'profiles': 'id',
+    'branches': 'name',
+    'issuers': 'issuer_name',
+    'promos': 'type_name',
+}
+# En los datos maestros la llave es el nombre que escribe el usuario: un duplicado
+# es un error (como en el camino directo), no un reenvío que se pueda ignorar.
+NATURAL_KEY_TABLES = {t for t, column in CONFLICT_COLUMNS.items() if column != 'id'}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,  -- una por escritura registrada
+    table_name TEXT NOT NULL,
+    method TEXT NOT NULL,              -- POST (upsert idempotente), PATCH o DELETE
+    filter TEXT,                       -- PATCH y DELETE: p. ej. 'id=eq.5'
+    on_conflict TEXT,
+    payload TEXT NOT NULL,
+    token TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',  -- pending | failed | sent
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_status_seq ON outbox (status, seq);
+"""
+
+_flush_lock = threading.Lock()
+_wakeup = threading.Event()
+_flusher = None
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def enabled() -> bool:
+    """Solo aplica al backend PostgREST: con el backend SQLite las escrituras ya son locales."""
+    from db_config import STORAGE_BACKEND
+    return os.environ.get('WRITE_OUTBOX', '').lower() in ('1', 'true', 'yes') and STORAGE_BACKEND == 'postgrest'
+
+
+def _connect():
+    global _initialized
+    conn = sqlite3.connect(OUTBOX_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    if not _initialized:
+        with _init_lock:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+            _initialized = True
+    return conn
+
+
+# --- Registro de escrituras ---
+
+def enqueue_insert(table_name: str, rows: list, token: str):
+    """Registra inserciones (una fila de la cola por registro). Retorna cuántas se agregaron."""
+    key_column = CONFLICT_COLUMNS.get(table_name)
+    now = time.time()
+    records = []
+    for row in rows:
+        # La llave de la cola identifica esta escritura, no el registro: borrar y volver a
+        # crear un registro con el mismo nombre es otra escritura y se vuelve a enviar.
+        on_conflict = key_column if key_column and row.get(key_column) is not None else None
+        records.append((f"{table_name}:{uuid.uuid4()}", table_name, 'POST', None, on_conflict,
+                        json.dumps(row, default=str), token, now))
+
+    with _connect() as conn:
+        conn.executemany(
+            "INSERT INTO outbox (idempotency_key, table_name, method, filter, on_conflict, payload, token, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", records,
+        )
+    start_flusher()
+    _wakeup.set()
+    return len(records)
+
+
+def enqueue_update(table_name: str, filter_text: str, payload: dict, token: str):
+    """Registra un PATCH (p. ej. filter_text='id=eq.5')."""
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO outbox (idempotency_key, table_name, method, filter, payload, token, created_at) "
+            "VALUES (?, ?, 'PATCH', ?, ?, ?, ?)",
+            (f"{table_name}:patch:{uuid.uuid4()}", table_name, filter_text, json.dumps(payload, default=str), token, time.time()),
+        )
+    start_flusher()
+    _wakeup.set()
+
+
+def enqueue_delete(table_name: str, filter_text: str, token: str):
+    """Registra un DELETE (p. ej. filter_text='id=eq.5'), en orden con las demás escrituras."""
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO outbox (idempotency_key, table_name, method, filter, payload, token, created_at) "
+            "VALUES (?, ?, 'DELETE', ?, '{}', ?, ?)",
+            (f"{table_name}:delete:{uuid.uuid4()}", table_name, filter_text, token, time.time()),
+        )
+    start_flusher()
+    _wakeup.set()
+
+
+def pending_max(table_name: str, column: str):
+    """Máximo de `column` entre las inserciones aún no enviadas (p. ej. el último consecutivo)."""
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT max(json_extract(payload, ?)) FROM outbox WHERE table_name = ? AND method = 'POST' AND status != 'sent'",
+            (f'$.{column}', table_name),
+        ).fetchone()
+    return row[0]
+
+
+def is_pending(table_name: str, column: str, value) -> bool:
+    """True si hay una inserción sin enviar en `table_name` con ese valor en `column`."""
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT 1 FROM outbox WHERE table_name = ? AND method = 'POST' AND status = 'pending' "
+            "AND json_extract(payload, ?) = ? LIMIT 1",
+            (table_name, f'$.{column}', value),
+        ).fetchone()
+    return row is not None
+
+
+def has_pending_delete(table_name: str) -> bool:
+    """True si `table_name` tiene eliminaciones sin enviar (el servidor aún muestra esas filas)."""
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT 1 FROM outbox WHERE table_name = ? AND method = 'DELETE' AND status = 'pending' LIMIT 1",
+            (table_name,),
+        ).fetchone()
+    return row is not None
+
+
+# --- Envío ---
+
+def _runs(rows: list):
+    """Agrupa filas consecutivas que pueden ir en un mismo POST (misma tabla, columnas, llave y token)."""
+    run, run_key = [], None
+    for row in rows:
+        if row['method'] != 'POST':
+            if run:
+                yield run
+            run, run_key = [], None
+            yield [row]
+            continue
+        key = (row['table_name'], row['on_conflict'], row['token'], tuple(sorted(json.loads(row['payload']))))
+        if run and (key != run_key or len(run) >= FLUSH_BATCH_SIZE):
+            yield run
+            run = []
+        run_key = key
+        run.append(row)
+    if run:
+        yield run
+
+
+def _send(run: list):
+    """Envía un grupo. Retorna la respuesta HTTP (o lanza el error de red)."""
+    import http_client
+    from db_config import POSTGREST_ENDPOINT, build_headers
+
+    first = run[0]
+    headers = build_headers(first['token'])
+    if first['method'] == 'PATCH':
+        url = f"{POSTGREST_ENDPOINT}/{first['table_name']}?{first['filter']}"
+        return http_client.patch(url, headers=headers, data=first['payload'])
+    if first['method'] == 'DELETE':
+        url = f"{POSTGREST_ENDPOINT}/{first['table_name']}?{first['filter']}"
+        return http_client.delete(url, headers=headers)
+
+    url = f"{POSTGREST_ENDPOINT}/{first['table_name']}"
+    headers['Prefer'] = 'return=minimal'
+    if first['on_conflict']:
+        url += f"?on_conflict={first['on_conflict']}"
+        # En los datos maestros se pide lo insertado para detectar las filas que ya existían
+        returning = 'representation' if first['table_name'] in NATURAL_KEY_TABLES else 'minimal'
+        headers['Prefer'] = f'resolution=ignore-duplicates,return={returning}'
+    body = '[' + ','.join(row['payload'] for row in run) + ']'
+    return http_client.post(url, headers=headers, data=body, idempotent=bool(first['on_conflict']))
+
+
+def _error_text(response) -> str:
+    try:
+        return response.json().get('message') or response.text
+    except ValueError:
+        return response.text or f"HTTP {response.status_code}"
+
+
+def _is_rejection(response) -> bool:
+    """4xx definitivo: reenviar no va a funcionar (a diferencia de 408/429)."""
+    return 400 <= response.status_code < 500 and response.status_code not in (408, 429)
+
+
+def _duplicates(run: list, response) -> list:
+    """Filas de datos maestros que el servidor ignoró porque su llave natural ya existía."""
+    first = run[0]
+    if first['method'] != 'POST' or first['table_name'] not in NATURAL_KEY_TABLES or not first['on_conflict']:
+        return []
+    column = first['on_conflict']
+    created = {str(row.get(column)) for row in response.json()}
+    return [row for row in run if str(json.loads(row['payload']).get(column)) not in created]
+
+
+def _mark_sent(conn, run: list, response):
+    """Marca un grupo aceptado; los duplicados de datos maestros quedan fallidos. Retorna (enviadas, fallidas)."""
+    duplicates = _duplicates(run, response)
+    if duplicates:
+        column = run[0]['on_conflict']
+        for row in duplicates:
+            value = json.loads(row['payload']).get(column)
+            _mark(conn, [row], 'failed', f"Ya existe un registro con {column} '{value}'; no se creó.")
+        run = [row for row in run if row not in duplicates]
+    _mark(conn, run, 'sent')
+    return len(run), len(duplicates)
+
+
+def _mark(conn, run: list, status: str, error: str = None):
+    seqs = [(status, error, time.time() if status == 'sent' else None, row['seq']) for row in run]
+    conn.executemany(
+        "UPDATE outbox SET status = ?, last_error = ?, sent_at = ?, attempts = attempts + 1 WHERE seq = ?", seqs,
+    )
+
+
+def flush(limit: int = 20 * FLUSH_BATCH_SIZE):
+    """
+    Envía las escrituras pendientes en orden. Retorna (enviadas, fallidas, detenida)
+    donde detenida=True indica que el backend no respondió y quedan pendientes.
+    """
+    if not _flush_lock.acquire(blocking=False):
+        return 0, 0, False  # Otro hilo ya está enviando
+    sent = failed = 0
+    try:
+        with _connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM outbox WHERE status = 'pending' ORDER BY seq LIMIT ?", (limit,),
+            ).fetchall()
+            for run in _runs(rows):
+                try:
+                    response = _send(run)
+                except Exception as e:
+                    _mark(conn, run, 'pending', str(e))
+                    return sent, failed, True
+                if response.ok:
+                    ok, duplicated = _mark_sent(conn, run, response)
+                    sent, failed = sent + ok, failed + duplicated
+                elif _is_rejection(response) and len(run) > 1:
+                    # Aislar la fila rechazada enviando el grupo de a una
+                    for row in run:
+                        try:
+                            single = _send([row])
+                        except Exception as e:
+                            _mark(conn, [row], 'pending', str(e))
+                            return sent, failed, True
+                        if single.ok:
+                            ok, duplicated = _mark_sent(conn, [row], single)
+                            sent, failed = sent + ok, failed + duplicated
+                        elif _is_rejection(single):
+                            _mark(conn, [row], 'failed', _error_text(single))
+                            failed += 1
+                        else:
+                            _mark(conn, [row], 'pending', _error_text(single))
+                            return sent, failed, True
+                elif _is_rejection(response):
+                    _mark(conn, run, 'failed', _error_text(response))
+                    failed += len(run)
+                else:
+                    _mark(conn, run, 'pending', _error_text(response))
+                    return sent, failed, True
+                conn.commit()
+            conn.execute("DELETE FROM outbox WHERE status = 'sent' AND sent_at < ?", (time.time() - SENT_RETENTION,))
+        return sent, failed, False
+    finally:
+        _flush_lock.release()
+
+
+def _flush_loop():
+    idle_wait = FLUSH_INTERVAL
+    while True:
+        _wakeup.wait(idle_wait)
+        _wakeup.clear()
+        try:
+            sent, _, stalled = flush()
+        except Exception:
+            sent, stalled = 0, True
+        if stalled:
+            idle_wait = min(MAX_IDLE_BACKOFF, idle_wait * 2)
+        else:
+            idle_wait = FLUSH_INTERVAL
+            if sent:
+                _wakeup.set()  # Puede quedar más trabajo: seguir sin esperar
+
+
+def start_flusher():
+    """Inicia (una vez por proceso) el hilo que vacía la cola en segundo plano."""
+    global _flusher
+    with _init_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flush_loop, name='write-outbox', daemon=True)
+            _flusher.start()
+
+
+# --- Consulta y administración ---
+
+def get_backlog():
+    """Conteo por tabla y estado, y antigüedad (s) de la escritura pendiente más vieja."""
+    with _connect() as conn:
+        counts = [dict(r) for r in conn.execute(
+            "SELECT table_name, status, count(*) AS n FROM outbox GROUP BY table_name, status ORDER BY table_name, status"
+        )]
+        oldest = conn.execute("SELECT min(created_at) FROM outbox WHERE status = 'pending'").fetchone()[0]
+    return counts, (time.time() - oldest) if oldest else 0.0
+
+
+def get_entries(status: str, limit: int = 200):
+    with _connect() as conn:
+        return [dict(r) for r in conn.execute(
+            "SELECT seq, table_name, method, filter, payload, attempts, last_error, created_at "
+            "FROM outbox WHERE status = ? ORDER BY seq LIMIT ?", (status, limit),
+        )]
+
+
+def retry_failed(token: str = None):
+    """Devuelve las fallidas a la cola; con `token` se reemplaza el del autor (p. ej. si expiró)."""
+    with _connect() as conn:
+        changed = conn.execute(
+            "UPDATE outbox SET status = 'pending', last_error = NULL, token = coalesce(?, token) WHERE status = 'failed'", (token,),
+        ).rowcount
+    _wakeup.set()
+    return changed
+
+
+def discard_failed():
+    with _connect() as conn:
+        return conn.execute("DELETE FROM outbox WHERE status = 'failed'").rowcount
+
+
+def render_outbox_page():
+    """Página de Admin con el estado de la cola de escritura."""
+    import pandas as pd
+    import streamlit as st
+    import auth
+
+    if auth.get_user_role() != 'Admin':
+        st.error("Acceso denegado. Solo los administradores pueden ver la cola de escritura.")
+        return
+
+    st.header("🗃️ Cola de Escritura Local")
+    if not enabled():
+        st.info("La cola está desactivada: las escrituras van directo a Supabase. Active WRITE_OUTBOX=1 para usarla.")
+        return
+
+    counts, oldest_age = get_backlog()
+    totals = {status: sum(c['n'] for c in counts if c['status'] == status) for status in ('pending', 'failed', 'sent')}
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Pendientes", totals['pending'])
+    col2.metric("Fallidas", totals['failed'])
+    col3.metric("Enviadas (24 h)", totals['sent'])
+    col4.metric("Pendiente más antigua", f"{oldest_age:.0f} s")
+
+    if counts:
+        st.dataframe(pd.DataFrame(counts).pivot(index='table_name', columns='status', values='n').fillna(0).astype(int), width='stretch')
+
+    col_flush, col_retry, col_discard = st.columns(3)
+    with col_flush:
+        if st.button("Sincronizar ahora", key="outbox_flush"):
+            sent, failed, stalled = flush()
+            st.success(f"Enviadas: {sent}, fallidas: {failed}." + (" El servidor no respondió; se reintentará." if stalled else ""))
+    with col_retry:
+        if st.button("Reintentar fallidas", key="outbox_retry", disabled=not totals['failed']):
+            st.success(f"{retry_failed(st.session_state.get('token'))} escrituras vuelven a la cola.")
+    with col_discard:
+        if st.button("Descartar fallidas", key="outbox_discard", disabled=not totals['failed']):
+            st.warning(f"{discard_failed()} escrituras descartadas.")
+
+    for status, title in (('failed', "Escrituras rechazadas"), ('pending', "Próximas a enviar")):
+        entries = get_entries(status, limit=100)
+        if entries:
+            st.subheader(title)
+            st.dataframe(pd.DataFrame(entries), width='stretch')